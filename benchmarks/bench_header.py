@@ -0,0 +1,53 @@
+"""
+Compare get_http_authorization_header with its signing alone, and with the
+way it built headers before timestamps and header prefixes were cached.
+
+    python benchmarks/bench_header.py [count]
+"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import byu_ws_sdk as sdk
+
+API_KEY = "YF4i2Qdx2WuSj-G8583M"
+SHARED_SECRET = "98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9"
+URL = "https://ws.byu.edu/example/v1/person/123456789?fields=name,email"
+
+
+def uncached_header(apiKey, sharedSecret, keyType, encodingType, url, actor=""):
+    # the URL path as it was: strftime, a list scan and %-formatting per call
+    current_timestamp = time.strftime(sdk.TIMESTAMP_FORMAT)
+    if keyType not in sdk.VALID_KEY_TYPES:
+        raise Exception("keyType must be one of %s" % " or ".join(sdk.VALID_KEY_TYPES))
+    digest = sdk.url_encode(sharedSecret, current_timestamp, url).decode("utf-8")
+    actor_value = "," + actor if actor else ""
+    return "%s-Encoded-%s-Key %s,%s,%s%s" % (encodingType, keyType, apiKey, digest, current_timestamp, actor_value)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    timestamp = time.strftime(sdk.TIMESTAMP_FORMAT)
+    cases = [
+        ("url_encode alone", lambda: sdk.url_encode(SHARED_SECRET, timestamp, URL)),
+        ("header, uncached timestamp and prefix",
+         lambda: uncached_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL, URL)),
+        ("get_http_authorization_header",
+         lambda: sdk.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL,
+                                                   URL)),
+    ]
+    # rounds of the cases take turns so that noise from other processes is shared
+    best = dict((name, None) for name, _ in cases)
+    for _ in range(7):
+        for name, func in cases:
+            elapsed = timeit.timeit(func, number=count)
+            best[name] = elapsed if best[name] is None else min(best[name], elapsed)
+    for name, _ in cases:
+        print("%-44s %8.2f us/op" % (name, best[name] / count * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the cold start cost of importing byu_ws_sdk with `python -X importtime`.
+
+Each round starts a fresh interpreter, so nothing is cached in sys.modules.
+The signing case only imports the package and signs a header, the way a
+short-lived worker does; the client case also touches WsClient, which loads
+requests.
+
+    python benchmarks/bench_import.py [rounds] [--top N]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CASES = [
+    ("import + sign", "import byu_ws_sdk as sdk; "
+                      "sdk.get_http_authorization_header('k', 's', sdk.KEY_TYPE_API, sdk.ENCODING_URL, 'http://x/')"),
+    ("import + WsClient", "import byu_ws_sdk as sdk; sdk.WsClient"),
+]
+
+
+def importtime(code):
+    """
+    Returns {module: (self us, cumulative us)} for one fresh interpreter
+    running code.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, check=True,
+                            stderr=subprocess.PIPE, universal_newlines=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main():
+    args = sys.argv[1:]
+    top = 10
+    if "--top" in args:
+        index = args.index("--top")
+        top = int(args[index + 1])
+        del args[index:index + 2]
+    rounds = int(args[0]) if args else 10
+    for name, code in CASES:
+        best = None
+        for _ in range(rounds):
+            times = importtime(code)
+            total = sum(own for own, _ in times.values())
+            if best is None or total < best[0]:
+                best = (total, times)
+        total, times = best
+        sdk_modules = [m for m in times if m == "byu_ws_sdk" or m.startswith("byu_ws_sdk.")]
+        print("%-20s %8.1f ms in all imports, %8.1f ms in byu_ws_sdk itself, %d modules" % (
+            name, total / 1000.0, sum(times[m][0] for m in sdk_modules) / 1000.0, len(times)))
+        for module, (own, _) in sorted(times.items(), key=lambda item: -item[1][0])[:top]:
+            print("    %-40s %8.2f ms" % (module, own / 1000.0))
+        print("    requests loaded: %s" % ("requests" in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Compare a precomputed Signer against the signing functions in core.
+
+    python benchmarks/bench_signer.py [count]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import byu_ws_sdk as sdk
+
+API_KEY = "YF4i2Qdx2WuSj-G8583M"
+SHARED_SECRET = "98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9"
+TIMESTAMP = "2016-01-01 12:00:00"
+URL = "https://ws.byu.edu/example/v1/person/123456789?fields=name,email"
+NONCE = {"nonceKey": "57921",
+         "nonceValue": "G4qPJr5L3xI3KjXPw0g1mgWY8bzInQts7uctUfTAINm5ov3WCbXqRrTlFyECiiY/8rKGIqGUNDMxI9HlFvDEKg=="}
+
+
+def report(name, func, count):
+    best = min(timeit.repeat(func, number=count, repeat=3))
+    print("%-36s %8.2f us/op" % (name, best / count * 1e6))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    signer = sdk.Signer(API_KEY, SHARED_SECRET)
+    report("core.url_encode", lambda: sdk.url_encode(SHARED_SECRET, TIMESTAMP, URL), count)
+    report("Signer.url_encode", lambda: signer.url_encode(TIMESTAMP, URL), count)
+    report("core.nonce_encode", lambda: sdk.nonce_encode(SHARED_SECRET, NONCE["nonceValue"]), count)
+    report("Signer.nonce_encode", lambda: signer.nonce_encode(NONCE["nonceValue"]), count)
+    report("get_http_authorization_header (URL)",
+           lambda: sdk.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL,
+                                                     URL), count)
+    report("Signer.url_header", lambda: signer.url_header(URL), count)
+    report("Signer.nonce_header", lambda: signer.nonce_header(NONCE), count)
+
+
+if __name__ == "__main__":
+    main()
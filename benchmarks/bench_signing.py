@@ -0,0 +1,58 @@
+"""
+Compare sign_many against calling get_http_authorization_header in a loop.
+
+    python benchmarks/bench_signing.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import byu_ws_sdk as sdk
+
+API_KEY = "YF4i2Qdx2WuSj-G8583M"
+SHARED_SECRET = "98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9"
+
+
+def make_requests(count):
+    requests = []
+    for i in range(count):
+        if i % 3 == 0:
+            requests.append(("https://ws.byu.edu/example/v1/person/%d" % i, None, None, "GET", "pd123"))
+        elif i % 3 == 1:
+            requests.append(("https://ws.byu.edu/example/v1/person", '{"id": %d}' % i, "application/json", "PUT"))
+        else:
+            requests.append(("https://ws.byu.edu/example/v1/form", "b=%d&a=1&a=2" % i,
+                             "application/x-www-form-urlencoded", "POST"))
+    return requests
+
+
+def per_call(requests):
+    for url, body, ct, method, actor in [(r + (None,))[:5] for r in requests]:
+        sdk.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL, url, body,
+                                          actor, ct, method)
+
+
+def batch(requests, processes=None):
+    for _ in sdk.sign_many(requests, API_KEY, SHARED_SECRET, processes=processes):
+        pass
+
+
+def report(name, func, requests, *args):
+    started = time.time()
+    func(requests, *args)
+    elapsed = time.time() - started
+    print("%-28s %10.0f headers/sec" % (name, len(requests) / elapsed))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    requests = make_requests(count)
+    report("get_http_authorization_header", per_call, requests)
+    report("sign_many", batch, requests)
+    report("sign_many (processes=%d)" % (os.cpu_count() or 1), batch, requests, os.cpu_count() or 1)
+
+
+if __name__ == "__main__":
+    main()
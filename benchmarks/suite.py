@@ -0,0 +1,251 @@
+"""
+Benchmark suite for signing, header generation and end-to-end calls.
+
+The end-to-end cases run against the local stub of the nonce, session and
+validate services, with a configurable latency per response.
+
+    python benchmarks/suite.py                       # run everything, print a table
+    python benchmarks/suite.py -k sign --quick       # only cases matching "sign", fewer rounds
+    python benchmarks/suite.py --latency 0.005       # stub answers after 5ms
+    python benchmarks/suite.py --save baseline.json  # keep the results
+    python benchmarks/suite.py --compare baseline.json --threshold 0.2
+                                                     # exit 1 if any case is 20% slower
+
+Every case reports the best time per operation over several rounds, the
+peak memory traced while running one round, and for the concurrent cases
+the throughput in operations per second.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import byu_ws_sdk as sdk
+from byu_ws_sdk.core import _sort_params, _sort_params_stream
+from byu_ws_sdk.stub import StubServer
+
+API_KEY = "YF4i2Qdx2WuSj-G8583M"
+SHARED_SECRET = "98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9"
+TIMESTAMP = "2016-01-01 12:00:00"
+URL = "https://ws.byu.edu/example/v1/person/123456789?fields=name,email"
+NONCE_VALUE = "G4qPJr5L3xI3KjXPw0g1mgWY8bzInQts7uctUfTAINm5ov3WCbXqRrTlFyECiiY/8rKGIqGUNDMxI9HlFvDEKg=="
+FORM_CT = "application/x-www-form-urlencoded"
+
+CASES = []
+
+
+def case(name, ops, concurrency=1, network=False):
+    """
+    Register a benchmark. The decorated function gets the run context and
+    returns a callable doing one operation.
+    """
+    def register(setup):
+        CASES.append({"name": name, "ops": ops, "concurrency": concurrency, "network": network, "setup": setup})
+        return setup
+    return register
+
+
+def form_body(params, repeats=1):
+    return "&".join("p%d=%d" % (i % (params // repeats or 1), i) for i in range(params))
+
+
+@case("url_encode", 20000)
+def bench_url_encode(ctx):
+    return lambda: sdk.url_encode(SHARED_SECRET, TIMESTAMP, URL)
+
+
+@case("url_encode form body (1k params)", 500)
+def bench_url_encode_form(ctx):
+    body = form_body(1000)
+    return lambda: sdk.url_encode(SHARED_SECRET, TIMESTAMP, URL, body, FORM_CT, "POST")
+
+
+@case("nonce_encode", 20000)
+def bench_nonce_encode(ctx):
+    return lambda: sdk.nonce_encode(SHARED_SECRET, NONCE_VALUE)
+
+
+@case("_sort_params (10k params)", 50)
+def bench_sort_params(ctx):
+    body = form_body(10000)
+    return lambda: _sort_params(body)
+
+
+@case("_sort_params (10k values, 10 keys)", 50)
+def bench_sort_params_repeated(ctx):
+    body = form_body(10000, repeats=1000)
+    return lambda: _sort_params(body)
+
+
+@case("_sort_params (10k values, 1 key)", 50)
+def bench_sort_params_one_key(ctx):
+    body = form_body(10000, repeats=10000)
+    return lambda: _sort_params(body)
+
+
+@case("_sort_params_stream (10k params, 4KiB chunks)", 50)
+def bench_sort_params_stream(ctx):
+    body = form_body(10000)
+    chunks = [body[i:i + 4096] for i in range(0, len(body), 4096)]
+    return lambda: _sort_params_stream(chunks)
+
+
+@case("_sort_params_stream (1 param of 16MiB)", 5)
+def bench_sort_params_stream_one_value(ctx):
+    body = "v=" + "x" * (16 * 1024 * 1024)
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+    return lambda: _sort_params_stream(chunks)
+
+
+@case("get_http_authorization_header URL", 20000)
+def bench_header_url(ctx):
+    return lambda: sdk.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL,
+                                                     URL)
+
+
+@case("CredentialRegistry header URL", 20000)
+def bench_registry_header(ctx):
+    registry = sdk.CredentialRegistry(ctx["client"])
+    registry.add_api_key("app", API_KEY, SHARED_SECRET)
+    return lambda: registry.get_http_authorization_header("app", sdk.ENCODING_URL, URL)
+
+
+@case("get_http_authorization_header Nonce", 200, network=True)
+def bench_header_nonce(ctx):
+    client = ctx["client"]
+    return lambda: client.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API,
+                                                        sdk.ENCODING_NONCE)
+
+
+def _authorize(ctx):
+    client = ctx["client"]
+    header = sdk.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL, URL)
+    return lambda: client.authorize_request(URL, header, API_KEY, SHARED_SECRET)
+
+
+case("authorize_request", 200, network=True)(_authorize)
+case("authorize_request x8 threads", 800, concurrency=8, network=True)(_authorize)
+
+
+def _send(ctx):
+    client = ctx["client"]
+    url = ctx["stub"].url + "/example/v1/person"
+
+    def send():
+        header = client.get_http_authorization_header(API_KEY, SHARED_SECRET, sdk.KEY_TYPE_API, sdk.ENCODING_URL,
+                                                      url)
+        client.send_ws_request(url, sdk.HTTP_METHOD_GET, headers={"Authorization": header})
+    return send
+
+
+case("sign + send_ws_request", 200, network=True)(_send)
+case("sign + send_ws_request x8 threads", 800, concurrency=8, network=True)(_send)
+
+
+def _send_many(ctx):
+    client = ctx["client"]
+    urls = [ctx["stub"].url + "/example/v1/person/%d" % i for i in range(50)]
+
+    def send():
+        for result in client.send_many(urls, API_KEY, SHARED_SECRET, concurrency=16):
+            result.content
+    return send
+
+
+case("send_many 50 requests x16", 10, network=True)(_send_many)
+
+
+def run_case(bench, ctx, rounds):
+    op = bench["setup"](ctx)
+    ops = max(1, int(bench["ops"] * ctx["scale"]))
+    op()  # warm up connections and caches
+
+    def run_round():
+        if bench["concurrency"] == 1:
+            for _ in range(ops):
+                op()
+            return
+        with ThreadPoolExecutor(bench["concurrency"]) as executor:
+            for future in [executor.submit(op) for _ in range(ops)]:
+                future.result()
+
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        run_round()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    run_round()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us_per_op": best / ops * 1e6, "ops_per_sec": ops / best, "peak_kib": peak / 1024.0,
+            "concurrency": bench["concurrency"]}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print("")
+    print("%-40s %12s %12s %8s" % ("case", "baseline us", "now us", "change"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["us_per_op"]
+        change = (result["us_per_op"] - before) / before
+        flag = " SLOWER" if change > threshold else ""
+        print("%-40s %12.2f %12.2f %+7.1f%%%s" % (name, before, result["us_per_op"], change * 100, flag))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="keyword", help="only run cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the operations and one round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub waits before answering")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with results saved earlier with --save")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    cases = [bench for bench in CASES if not args.keyword or args.keyword in bench["name"]]
+    stub = StubServer(personId="123456789", delay=args.latency)
+    if any(bench["network"] for bench in cases):
+        stub.start()
+    client = sdk.WsClient(authBaseUrl=stub.authBaseUrl, poolMaxSize=16)
+    ctx = {"stub": stub, "client": client, "scale": 0.1 if args.quick else 1.0}
+    rounds = 1 if args.quick else args.rounds
+
+    results = {}
+    print("%-40s %12s %12s %10s" % ("case", "us/op", "ops/sec", "peak KiB"))
+    try:
+        for bench in cases:
+            result = results[bench["name"]] = run_case(bench, ctx, rounds)
+            print("%-40s %12.2f %12.0f %10.1f" % (bench["name"], result["us_per_op"], result["ops_per_sec"],
+                                                  result["peak_kib"]))
+    finally:
+        client.close()
+        if stub._thread is not None:
+            stub.stop()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
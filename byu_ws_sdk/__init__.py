@@ -1 +1,48 @@
+"""
+Importing byu_ws_sdk only loads what signing needs. The clients, transports
+and middleware, and with them requests, simplejson and asyncio, are imported
+the first time one of their names is used.
+"""
+import importlib as _importlib
+
 from .core import *
+from .noncepool import NoncePool, NoncePools
+from .validation import ValidationCache, LocalVerifier
+from .session import WsSessionManager
+from .credentials import CredentialRegistry, Credential
+from .signing import Signer, sign_many
+from .fanout import send_many, WsRequest, WsResult
+from .streaming import FileBody, open_body, as_body
+from .singleflight import SingleFlight, AsyncSingleFlight
+from .instrument import add_hook, remove_hook, HistogramCollector, Instrumentation
+
+# name -> the module that defines it, imported on first use
+_LAZY = {
+    "WsClient": ".client", "get_default_client": ".client", "set_default_client": ".client",
+    "WsResponse": ".response",
+    "ResponseCache": ".httpcache", "MemoryCache": ".httpcache", "DiskCache": ".httpcache",
+    "SharedStore": ".sharedcache", "SharedValidationCache": ".sharedcache", "SharedWsSession": ".sharedcache",
+    "Transport": ".transport", "RetryPolicy": ".transport", "CircuitBreaker": ".transport",
+    "WebServiceError": ".transport", "CircuitOpenError": ".transport",
+    "AsyncWsClient": ".aio", "AsyncioTransport": ".aio", "AiohttpTransport": ".aio",
+    "WsgiAuthMiddleware": ".middleware", "AsgiAuthMiddleware": ".middleware", "PERSON_ID_KEY": ".middleware",
+}
+
+# modules core used to import eagerly, and so were reachable from the package
+_MODULES = {"requests": "requests", "simplejson": "simplejson", "xml": "xml.dom.minidom"}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(_importlib.import_module(_LAZY[name], __name__), name)
+    elif name in _MODULES:
+        _importlib.import_module(_MODULES[name])
+        value = _importlib.import_module(name)
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | set(_MODULES))
@@ -0,0 +1,462 @@
+"""
+An asyncio version of WsClient.
+
+AsyncWsClient mirrors the network functions in core as coroutines. Signing
+goes through the same functions in core as the sync path, so the headers are
+byte-identical; only the HTTP calls differ. The HTTP layer is a pluggable
+transport: AsyncioTransport needs nothing but the standard library, and
+AiohttpTransport is used when aiohttp is installed and asked for.
+"""
+import asyncio
+import json
+import ssl
+
+from urllib.parse import urlencode, urlsplit
+
+from . import core
+from . import fanout
+from . import instrument
+from .signing import Signer
+from .singleflight import AsyncSingleFlight
+from .validation import validation_key
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DEFAULT_TIMEOUT = 30  # seconds for a whole call, about what WsClient allows a response to take
+_NO_BODY_STATUSES = (204, 304)
+
+
+class AsyncResponse(object):
+    """
+    A fully read HTTP response returned by the async transports.
+    """
+
+    def __init__(self, status_code, reason, headers, content, url):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise Exception("%s %s for url: %s" % (self.status_code, self.reason, self.url))
+
+
+class _Headers(dict):
+    """
+    Response headers with case-insensitive lookup.
+    """
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key.lower())
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key.lower(), value)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key.lower())
+
+    def get(self, key, default=None):
+        return dict.get(self, key.lower(), default)
+
+
+def _encode_body(data, headers):
+    if data is None:
+        return b""
+    if isinstance(data, dict):
+        headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        data = urlencode(data)
+    if not isinstance(data, bytes):
+        data = data.encode("utf-8")
+    return data
+
+
+class AsyncioTransport(object):
+    """
+    A small HTTP/1.1 client on asyncio streams that keeps idle connections
+    open per host.
+
+    Arguments:
+        limit        -- maximum number of requests in flight at once (default 100)
+        poolMaxSize  -- maximum idle connections kept per host (default 10)
+        sslContext   -- ssl.SSLContext for https urls (default ssl.create_default_context())
+    """
+
+    def __init__(self, limit=100, poolMaxSize=10, sslContext=None):
+        self.poolMaxSize = poolMaxSize
+        self.sslContext = sslContext
+        self._limit = limit
+        self._semaphore = None
+        self._idle = {}
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._limit)
+        async with self._semaphore:
+            if timeout is None:
+                return await self._request(method, url, headers, data)
+            return await asyncio.wait_for(self._request(method, url, headers, data), timeout)
+
+    async def _request(self, method, url, headers, data):
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        headers = dict(headers or {})
+        body = _encode_body(data, headers)
+        lines = ["%s %s HTTP/1.1" % (method.upper(), target),
+                 "Host: %s" % parts.netloc,
+                 "Content-Length: %d" % len(body)]
+        lines.extend("%s: %s" % item for item in headers.items())
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        while True:
+            reader, writer, reused = await self._connect(key, secure)
+            try:
+                writer.write(message)
+                await writer.drain()
+                response, keep = await self._read_response(reader, url, method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue  # the server closed an idle connection, try a fresh one
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            self._release(key, reader, writer, keep)
+            return response
+
+    async def _connect(self, key, secure):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        ctx = None
+        if secure:
+            ctx = self.sslContext or ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(key[1], key[2], ssl=ctx)
+        return reader, writer, False
+
+    def _release(self, key, reader, writer, keep):
+        idle = self._idle.setdefault(key, [])
+        if keep and len(idle) < self.poolMaxSize:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _read_response(self, reader, url, method):
+        status_line = await reader.readuntil(b"\r\n")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        headers = _Headers()
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip()] = value.strip()
+        keep = version == "HTTP/1.1" and headers.get("Connection", "").lower() != "close"
+        code = int(status)
+        if method.upper() == "HEAD" or code < 200 or code in _NO_BODY_STATUSES:
+            content = b""  # these never have a body, whatever their headers say
+        elif headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+                if not size:
+                    while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                        pass  # skip trailers
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b"".join(chunks)
+        elif "Content-Length" in headers:
+            content = await reader.readexactly(int(headers["Content-Length"]))
+        else:
+            content = await reader.read()
+            keep = False
+        return AsyncResponse(code, reason, headers, content, url), keep
+
+    async def close(self):
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+
+
+class AiohttpTransport(object):
+    """
+    A transport on an aiohttp.ClientSession, for when aiohttp is installed.
+
+    Arguments:
+        limit        -- maximum number of connections in total (default 100)
+        limitPerHost -- maximum number of connections per host (default 10)
+    """
+
+    def __init__(self, limit=100, limitPerHost=10):
+        if aiohttp is None:
+            raise Exception("AiohttpTransport requires the aiohttp package")
+        self.limit = limit
+        self.limitPerHost = limitPerHost
+        self._session = None
+
+    async def request(self, method, url, headers=None, data=None, timeout=None):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limitPerHost)
+            self._session = aiohttp.ClientSession(connector=connector)
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with self._session.request(method.upper(), url, headers=headers, data=data,
+                                         timeout=client_timeout) as response:
+            content = await response.read()
+            headers = _Headers()
+            for name, value in response.headers.items():
+                headers[name] = value
+            return AsyncResponse(response.status, response.reason or "", headers, content, url)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncWsClient(object):
+    """
+    The coroutine counterpart of WsClient.
+
+    Arguments:
+        transport       -- object with `async request(method, url, headers, data, timeout)` and
+                           `async close()` (default AsyncioTransport())
+        timeout         -- default timeout in seconds for each call, None for none (default DEFAULT_TIMEOUT)
+        authBaseUrl     -- base url of the authentication services (default core.AUTH_BASE_URL)
+        validationCache -- a validation.ValidationCache for authorize_request results (default None)
+        localVerifier   -- a validation.LocalVerifier for headers it knows (default None)
+        coalesce        -- let identical concurrent WsSession and validate calls share one
+                           request, see singleflight (default True)
+        instrumentation -- an instrument.Instrumentation to report calls and signing to
+                           (default instrument.default)
+    """
+
+    def __init__(self, transport=None, timeout=DEFAULT_TIMEOUT, authBaseUrl=core.AUTH_BASE_URL, validationCache=None,
+                 localVerifier=None, coalesce=True, instrumentation=None):
+        self.transport = transport or AsyncioTransport()
+        self.instrumentation = instrumentation or instrument.default
+        self.timeout = timeout
+        self.authBaseUrl = authBaseUrl.rstrip("/")
+        self.validationCache = validationCache
+        self.localVerifier = localVerifier
+        self.singleFlight = AsyncSingleFlight() if coalesce else None
+
+    async def close(self):
+        await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, method, url, headers=None, data=None, timeout=None, event=instrument.EVENT_REQUEST):
+        timeout = self.timeout if timeout is None else timeout
+        instrumentation = self.instrumentation
+        if not instrumentation.hooks:
+            return await self.transport.request(method, url, headers=headers, data=data, timeout=timeout)
+        started = instrument.clock()
+        try:
+            response = await self.transport.request(method, url, headers=headers, data=data, timeout=timeout)
+        except Exception as e:
+            instrumentation.emit(instrument.Event(event, instrument.clock() - started, error=e,
+                                                  bytesSent=instrument.body_size(data), method=method, url=url))
+            raise
+        instrumentation.emit(instrument.Event(event, instrument.clock() - started, response.status_code,
+                                              bytesSent=instrument.body_size(data),
+                                              bytesReceived=len(response.content), method=method, url=url,
+                                              response=response))
+        return response
+
+    async def _coalesced(self, key, fn, *args):
+        # key None, or coalescing turned off, runs fn on its own
+        if key is None or self.singleFlight is None:
+            return await fn(*args)
+        return await self.singleFlight.do(key, fn, *args)
+
+    async def get_ws_session(self, casNetId, casPassword, casTimeout=1, headers=None, timeout=None):
+        """
+        get a wsSession key pair (apiKey/wsId and sharedSecret)
+
+        See core.get_ws_session.
+        """
+        cas_user_dict = {"timeout": casTimeout, "username": casNetId, "password": casPassword}
+        data = "timeout=%(timeout)s&password=%(password)s&netId=%(username)s" % cas_user_dict
+        coalesceKey = None if headers else ("session", casNetId, casPassword, casTimeout)
+        headers = dict(headers or {})
+        headers["Content-Type"] = "application/x-www-form-urlencoded; charset=UTF-8"
+        response = await self._coalesced(coalesceKey, self._request, "POST", self.authBaseUrl + "/ws/session",
+                                         headers, data, timeout, instrument.EVENT_SESSION_FETCH)
+        response.raise_for_status()
+        if not response.content:
+            raise Exception("The WsSession-granting web service did not provide a WsSession."
+                            "  Perhaps the username and password supplied are not valid?")
+        return response.json()
+
+    async def get_nonce(self, apiKey, actor="", headers=None, timeout=None):
+        """
+        get a nonce key and value from the api-key
+
+        See core.get_nonce.
+        """
+        nonce_url = self.authBaseUrl + "/hmac/nonce/{0}{1}"
+        actor = "/" + actor if actor else ""
+        response = await self._request("POST", nonce_url.format(apiKey, actor), headers, None, timeout,
+                                       instrument.EVENT_NONCE_FETCH)
+        if response.status_code >= 400:
+            from .transport import WebServiceError
+            raise WebServiceError("The nonce service returned %s: %r" % (response.status_code, response.content[:200]),
+                                  response.status_code, response.content)
+        try:
+            return response.json()
+        except ValueError:
+            from .transport import WebServiceError
+            raise WebServiceError("The nonce service returned a body that is not JSON: %r" % response.content[:200],
+                                  response.status_code, response.content)
+
+    async def get_http_authorization_header(self, apiKey, sharedSecret, keyType, encodingType, url="",
+                                            requestBody=None, actor="", contentType=None, httpMethod=None,
+                                            demo=False, actorInHash=False):
+        """
+        Encode the request to get the Authorization header value.
+
+        See core.get_http_authorization_header.
+        """
+        nonce = None
+        if encodingType == core.ENCODING_NONCE and core.valid_key_type(keyType):
+            nonce = await self.get_nonce(apiKey, actor)
+        return core._build_authorization_header(apiKey, sharedSecret, keyType, encodingType, url, requestBody,
+                                                actor, contentType, httpMethod, demo, actorInHash,
+                                                lambda apiKey, actor: nonce, self.instrumentation)
+
+    async def send_ws_request(self, url, httpMethod, requestBody=None, headers=None, timeout=None, sign=None):
+        """
+        Send a request to a web service.
+
+        sign, when given, is a coroutine function sign(url, httpMethod)
+        returning the Authorization header, awaited just before the request
+        is sent.
+
+        Returns (content, status_code, headers, response)
+        """
+        if not core.valid_http_method(httpMethod):
+            raise Exception(
+                "The httpMethod passed in (%s) is not one of '%s'" % (httpMethod, "','".join(core.VALID_HTTP_METHODS)))
+        if sign is not None:
+            headers = dict(headers or {})
+            headers["Authorization"] = await sign(url, httpMethod)
+        response = await self._request(httpMethod, url, headers, requestBody, timeout)
+        return response.content, response.status_code, response.headers, response
+
+    async def authorize_request(self, requestedUrl, authHeader, apiKey, sharedSecret, actor='', requestBody=None,
+                                contentType=None, httpMethod=None, headers=None, timeout=None):
+        """
+        Returns the personId of a valid BYU authenticated request or None.
+
+        See WsClient.authorize_request.
+        """
+        if not authHeader:
+            return None
+        if self.localVerifier is not None and self.localVerifier.knows(authHeader):
+            return self.localVerifier.verify(requestedUrl, authHeader, requestBody, contentType, httpMethod)
+        wsId, messageDigest, timestamp = authHeader.split(',')
+        wsId = wsId.split(' ')[1]
+        cache = self.validationCache
+        cache_key = validation_key(wsId, messageDigest, timestamp, requestedUrl)
+        if cache is not None:
+            cached, personId = cache.lookup(cache_key)
+            if cached:
+                return personId
+        # the same header for the same url validates the same way, so concurrent checks share one nonce and call
+        coalesceKey = None if headers else ("validate", cache_key, apiKey, actor)
+        response = await self._coalesced(coalesceKey, self._validate, wsId, messageDigest, timestamp, requestedUrl,
+                                         apiKey, sharedSecret, actor, headers, timeout)
+        personId = None
+        if response.status_code == 200:
+            personId = response.json()['personId']
+        if cache is not None and response.status_code < 500:
+            cache.store(cache_key, personId, timestamp)
+        return personId
+
+    async def _validate(self, wsId, messageDigest, timestamp, requestedUrl, apiKey, sharedSecret, actor, headers,
+                        timeout):
+        nonce = await self.get_nonce(apiKey, actor, timeout=timeout)
+        data = {
+            'wsId': wsId,
+            'messageDigest': messageDigest,
+            'timestamp': timestamp,
+            'message': requestedUrl,
+        }
+        nonceDigest = core.nonce_encode(sharedSecret, nonce['nonceValue']).decode("utf-8")
+        headers = dict(headers or {})
+        headers['Authorization'] = 'Nonce-Encoded-API-Key {0},{1},{2}'.format(apiKey, nonce['nonceKey'],
+                                                                             nonceDigest)
+        return await self._request("POST", self.authBaseUrl + '/provider/URL-Encoded-API-Key/validate',
+                                   headers, data, timeout, instrument.EVENT_VALIDATE)
+
+    async def send_many(self, requests, apiKey, sharedSecret, keyType=core.KEY_TYPE_API,
+                        encodingType=core.ENCODING_URL, concurrency=10, perHost=None, actorInHash=False,
+                        timeout=None):
+        """
+        Sign and send many requests as tasks, yielding a fanout.WsResult for
+        each as it completes. Use with `async for`.
+
+        See fanout.send_many; response bodies are always read.
+        """
+        signer = Signer(apiKey, sharedSecret, keyType)
+        scheduler = fanout._Scheduler(requests, concurrency, perHost)
+        pending = {}
+        try:
+            while True:
+                for index, request, host in scheduler.ready():
+                    task = asyncio.ensure_future(self._send_one(signer, encodingType, actorInHash, timeout,
+                                                                index, request))
+                    pending[task] = host
+                if scheduler.done:
+                    return
+                done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    scheduler.finished(pending.pop(task))
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(list(pending))
+
+    async def _send_one(self, signer, encodingType, actorInHash, timeout, index, request):
+        started = instrument.clock()
+
+        async def sign(url, httpMethod):
+            if encodingType == core.ENCODING_NONCE:
+                return signer.nonce_header(await self.get_nonce(signer.apiKey, request.actor))
+            return fanout._sign(signer, request, encodingType, actorInHash, None)
+        try:
+            content, status_code, headers, response = await self.send_ws_request(
+                request.url, request.httpMethod, request.requestBody, fanout._request_headers(request), timeout,
+                sign)
+        except Exception as e:
+            return fanout.WsResult(request, index, error=e, duration=instrument.clock() - started)
+        return fanout.WsResult(request, index, content, status_code, headers, response,
+                               duration=instrument.clock() - started)
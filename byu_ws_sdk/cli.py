@@ -0,0 +1,356 @@
+"""
+The byu-ws-sdk command.
+
+    byu-ws-sdk bench [options]   sign and send a mix of requests, report JSON
+    byu-ws-sdk stub [--port N]   run the local stub of the authentication services
+
+`bench` sends requests to a local stub (started for the run) unless it is
+given --url and --auth-base-url, so it never touches ws.byu.edu by itself.
+Each request in the mix picks an encoding (--mix url=3,nonce=1), a body size
+(--body-sizes 0,1024; a size of 0 sends a GET), a form or plain body
+(--form) and an actor (--actors). Requests run on --concurrency threads,
+as fast as they go or at --rate requests per second in total, for
+--requests requests or --duration seconds. --sign-only skips the network
+and measures signing alone, with a made-up nonce for Nonce encoding.
+
+The report gives throughput, latency percentiles in milliseconds for signing
+and for the whole request, and error counts, overall and per request kind.
+Save reports from two SDK versions against the same stub to compare them.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+from . import core
+
+DEMO_API_KEY = "YF4i2Qdx2WuSj-G8583M"
+DEMO_SHARED_SECRET = "98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9"
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _mix(spec):
+    """
+    Parse "url=3,nonce=1" into [(core.ENCODING_URL, 3), (core.ENCODING_NONCE, 1)].
+    """
+    encodings = {"url": core.ENCODING_URL, "nonce": core.ENCODING_NONCE}
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name.lower() not in encodings:
+            raise argparse.ArgumentTypeError("unknown encoding %r, use url or nonce" % name)
+        try:
+            mix.append((encodings[name.lower()], int(weight or 1)))
+        except ValueError:
+            raise argparse.ArgumentTypeError("the weight of %s must be a whole number" % name)
+    return mix
+
+
+def _sizes(spec):
+    try:
+        return [int(size) for size in spec.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("body sizes must be whole numbers of bytes")
+
+
+class RequestKind(object):
+    """
+    One kind of request in the mix.
+    """
+
+    def __init__(self, encodingType, bodySize, form, actor):
+        self.encodingType = encodingType
+        self.bodySize = bodySize
+        self.form = form and bodySize > 0
+        self.actor = actor
+        self.httpMethod = core.HTTP_METHOD_POST if bodySize else core.HTTP_METHOD_GET
+        self.contentType = core.FORM_CONTENT_TYPE if self.form else ("text/plain" if bodySize else None)
+        self.body = self._body() if bodySize else None
+        self.name = "%s/%s/%d%s" % (encodingType.lower(), actor or "-", bodySize, "/form" if self.form else "")
+
+    def _body(self):
+        if not self.form:
+            return "x" * self.bodySize
+        params = []
+        length = -1
+        i = 0
+        while length < self.bodySize:
+            param = "k%d=%s" % (i % 50, "v" * 16)
+            params.append(param)
+            length += len(param) + 1
+            i += 1
+        return "&".join(params)[:self.bodySize].rstrip("&")
+
+
+def request_kinds(mix, bodySizes, form, actors):
+    kinds = []
+    for encodingType, weight in mix:
+        for bodySize in bodySizes:
+            for actor in actors:
+                kinds.extend([RequestKind(encodingType, bodySize, form, actor)] * weight)
+    return kinds
+
+
+def _fake_nonce(apiKey, actor):
+    return {"nonceKey": "1", "nonceValue": base64.b64encode(os.urandom(64)).decode("ascii")}
+
+
+class Recorder(object):
+    """
+    Collects the outcome of every request, per kind and overall.
+    """
+
+    def __init__(self):
+        self.kinds = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, signSeconds, totalSeconds, status, error):
+        with self._lock:
+            stats = self.kinds.get(kind.name)
+            if stats is None:
+                stats = self.kinds[kind.name] = {"sign": [], "total": [], "errors": 0, "statuses": {},
+                                                 "exceptions": {}}
+            stats["sign"].append(signSeconds)
+            stats["total"].append(totalSeconds)
+            if status is not None:
+                stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+            if error is not None:
+                name = type(error).__name__
+                stats["exceptions"][name] = stats["exceptions"].get(name, 0) + 1
+            if error is not None or (status is not None and status >= 400):
+                stats["errors"] += 1
+
+    def report(self, elapsed):
+        overall = {"sign": [], "total": [], "errors": 0, "statuses": {}, "exceptions": {}}
+        kinds = {}
+        for name, stats in sorted(self.kinds.items()):
+            kinds[name] = _summary(stats, elapsed)
+            overall["sign"].extend(stats["sign"])
+            overall["total"].extend(stats["total"])
+            overall["errors"] += stats["errors"]
+            for field in ("statuses", "exceptions"):
+                for value, count in stats[field].items():
+                    overall[field][value] = overall[field].get(value, 0) + count
+        report = _summary(overall, elapsed)
+        report["kinds"] = kinds
+        return report
+
+
+def _latencies(seconds):
+    if not seconds:
+        return None
+    ordered = sorted(seconds)
+    latencies = dict(("p%g" % (q * 100), ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000.0)
+                     for q in PERCENTILES)
+    latencies["mean"] = sum(ordered) / len(ordered) * 1000.0
+    latencies["max"] = ordered[-1] * 1000.0
+    return latencies
+
+
+def _summary(stats, elapsed):
+    count = len(stats["total"])
+    return {"requests": count, "errors": stats["errors"],
+            "error_rate": float(stats["errors"]) / count if count else 0.0,
+            "throughput": count / elapsed if elapsed else None, "statuses": stats["statuses"],
+            "exceptions": stats["exceptions"],
+            "sign_ms": _latencies(stats["sign"]), "latency_ms": _latencies(stats["total"])}
+
+
+class Bench(object):
+    """
+    Runs the request mix with the settings of `byu-ws-sdk bench`.
+    """
+
+    def __init__(self, args, client, url):
+        self.args = args
+        self.client = client
+        self.url = url
+        self.kinds = request_kinds(args.mix, args.body_sizes, args.form, args.actors)
+        self.recorder = Recorder()
+        self._random = random.Random(args.seed)
+        self._next = 0
+        self._lock = threading.Lock()
+        self._started = None
+        self._deadline = None
+
+    def _take(self):
+        # returns (kind, time to start it at) or None when the run is over
+        with self._lock:
+            index = self._next
+            if self.args.requests is not None and index >= self.args.requests:
+                return None
+            self._next += 1
+            kind = self._random.choice(self.kinds)
+        startAt = self._started + index / self.args.rate if self.args.rate else None
+        if self._deadline is not None and (startAt or time.time()) >= self._deadline:
+            return None
+        return kind, startAt
+
+    def _one(self, kind):
+        args = self.args
+        started = time.perf_counter()
+        status = error = signed = None
+        try:
+            nonceGetter = _fake_nonce if args.sign_only else self.client.take_nonce
+            header = core._build_authorization_header(args.api_key, args.shared_secret, core.KEY_TYPE_API,
+                                                      kind.encodingType, self.url, kind.body, kind.actor,
+                                                      kind.contentType, kind.httpMethod, False, False,
+                                                      nonceGetter, self.client.instrumentation)
+            signed = time.perf_counter()
+            if not args.sign_only:
+                headers = {"Authorization": header}
+                if kind.contentType:
+                    headers["Content-Type"] = kind.contentType
+                _, status, _, _ = self.client.send_ws_request(self.url, kind.httpMethod, kind.body,
+                                                              headers=headers)
+        except Exception as e:
+            error = e
+        finished = time.perf_counter()
+        self.recorder.record(kind, (signed or finished) - started, finished - started, status, error)
+
+    def _work(self):
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            kind, startAt = taken
+            if startAt is not None:
+                delay = startAt - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            self._one(kind)
+
+    def run(self):
+        self._started = time.time()
+        if self.args.duration is not None:
+            self._deadline = self._started + self.args.duration
+        threads = [threading.Thread(target=self._work) for _ in range(self.args.concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.time() - self._started
+
+
+def _version():
+    try:
+        from importlib import metadata
+        return metadata.version("byu_ws_sdk")
+    except Exception:
+        return None
+
+
+def bench(args):
+    from .client import WsClient
+    from .stub import StubServer
+    stub = None
+    authBaseUrl = args.auth_base_url
+    url = args.url
+    if authBaseUrl is None or url is None:
+        stub = StubServer(personId="123456789", delay=args.latency, record=False).start()
+        authBaseUrl = authBaseUrl or stub.authBaseUrl
+        url = url or stub.url + "/example/v1/resource"
+    client = WsClient(authBaseUrl=authBaseUrl, poolConnections=args.concurrency, poolMaxSize=args.concurrency,
+                      maxRetries=0, noncePoolSize=args.nonce_pool)
+    try:
+        runner = Bench(args, client, url)
+        elapsed = runner.run()
+        report = runner.recorder.report(elapsed)
+    finally:
+        client.close()
+        if stub is not None:
+            stub.stop()
+    report["elapsed"] = elapsed
+    report["config"] = {
+        "url": url, "authBaseUrl": authBaseUrl, "stub": stub is not None, "mix": args.mix_spec,
+        "bodySizes": args.body_sizes, "form": args.form, "actors": args.actors, "concurrency": args.concurrency,
+        "rate": args.rate, "requests": args.requests, "duration": args.duration, "signOnly": args.sign_only,
+        "noncePool": args.nonce_pool, "latency": args.latency if stub is not None else None,
+    }
+    report["sdk"] = {"version": _version(), "python": platform.python_version()}
+    return report
+
+
+def stub(args):
+    from .stub import StubServer
+    server = StubServer(personId=args.person_id, delay=args.latency, host=args.host, port=args.port, record=False)
+    server.start()
+    print("stub listening at %s, authentication services at %s" % (server.url, server.authBaseUrl))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+def parser():
+    top = argparse.ArgumentParser(prog="byu-ws-sdk", description="Tools for the BYU web services SDK.")
+    commands = top.add_subparsers(dest="command")
+
+    b = commands.add_parser("bench", help="sign and send a mix of requests and report throughput as JSON",
+                            description=__doc__.strip().split("\n\n")[1])
+    b.add_argument("--url", help="the web service url to call (default: an echo url of the local stub)")
+    b.add_argument("--auth-base-url", help="base url of the nonce, session and validate services "
+                                           "(default: the local stub)")
+    b.add_argument("--api-key", default=DEMO_API_KEY)
+    b.add_argument("--shared-secret", default=DEMO_SHARED_SECRET)
+    b.add_argument("--mix", dest="mix_spec", default="url", help="encodings and weights, e.g. url=3,nonce=1")
+    b.add_argument("--body-sizes", type=_sizes, default=[0], help="comma separated body sizes in bytes, 0 for GET")
+    b.add_argument("--form", action="store_true", help="send bodies as %s" % core.FORM_CONTENT_TYPE)
+    b.add_argument("--actors", type=lambda s: s.split(","), default=[""], help="comma separated actors")
+    b.add_argument("--concurrency", type=int, default=8)
+    b.add_argument("--rate", type=float, help="target requests per second over all threads (default: no limit)")
+    b.add_argument("--requests", type=int, help="requests to send (default 1000 unless --duration is given)")
+    b.add_argument("--duration", type=float, help="seconds to run for")
+    b.add_argument("--sign-only", action="store_true", help="only sign, do not send anything")
+    b.add_argument("--nonce-pool", type=int, default=0, help="nonces to prefetch per actor")
+    b.add_argument("--latency", type=float, default=0.0, help="seconds the local stub waits before answering")
+    b.add_argument("--seed", type=int, default=0, help="seed for picking request kinds")
+    b.add_argument("--output", "-o", help="write the JSON report here instead of stdout")
+
+    s = commands.add_parser("stub", help="run the local stub of the authentication services")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=8080)
+    s.add_argument("--latency", type=float, default=0.0)
+    s.add_argument("--person-id", default="123456789", help="personId the validate service answers with")
+    return top
+
+
+def main(argv=None):
+    top = parser()
+    args = top.parse_args(argv)
+    if args.command == "stub":
+        return stub(args)
+    if args.command != "bench":
+        top.print_help()
+        return 2
+    try:
+        args.mix = _mix(args.mix_spec)
+    except argparse.ArgumentTypeError as e:
+        top.error(str(e))
+    if args.requests is None and args.duration is None:
+        args.requests = 1000
+    if args.concurrency < 1:
+        top.error("--concurrency must be at least 1")
+    report = bench(args)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["requests"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+A pooled, reusable client for calling BYU web services.
+
+Every WsClient owns a requests.Session, so calls made through the same client
+reuse their TCP/TLS connections to ws.byu.edu instead of opening new ones.
+The module level functions in core are thin wrappers over a default client.
+"""
+import threading
+
+import requests
+import simplejson
+from requests.adapters import HTTPAdapter
+
+from . import core
+from . import fanout
+from . import instrument
+from .noncepool import NoncePools
+from .response import WsResponse
+from .streaming import FileBody
+from .transport import DEFAULT_TIMEOUT, RetryPolicy, Transport, WebServiceError
+from .validation import parse_authorization_header, validation_key
+
+
+class WsClient(object):
+    """
+    Calls the BYU authentication services and secured web services over a
+    pooled requests.Session.
+
+    Arguments:
+        poolConnections -- number of per-host connection pools to cache (default 10)
+        poolMaxSize     -- maximum connections kept open per host (default 10)
+        keepAlive       -- reuse connections between calls (default True)
+        maxRetries      -- retries of idempotent operations after connection errors, timeouts
+                           and 502/503/504 responses (default 2)
+        backoffFactor   -- base of the jittered exponential delay between retries in seconds (default 0.1)
+        timeout         -- default timeout in seconds or a (connect, read) tuple
+                           (default transport.DEFAULT_TIMEOUT)
+        authBaseUrl     -- base url of the authentication services (default core.AUTH_BASE_URL)
+        session         -- an existing requests.Session to use instead of a new one
+        noncePoolSize   -- when set, prefetch this many nonces per (apiKey, actor) in the
+                           background for Nonce encoding and authorize_request, for the 64 most
+                           recently used pairs (default 0)
+        validationCache -- a validation.ValidationCache for authorize_request results (default None)
+        localVerifier   -- a validation.LocalVerifier that checks headers for the keys it knows
+                           without calling the validate service (default None)
+        breakerThreshold, breakerResetTimeout, hedgePercentile
+                        -- circuit breaker and hedging settings, see transport.Transport
+        instrumentation -- an instrument.Instrumentation to report calls and signing to
+                           (default instrument.default)
+        coalesce        -- let identical concurrent WsSession and validate calls share one
+                           request, see singleflight (default True)
+        responseCache   -- an httpcache.ResponseCache for GETs made with send_ws_request (default None)
+    """
+
+    def __init__(self, poolConnections=10, poolMaxSize=10, keepAlive=True, maxRetries=2,
+                 backoffFactor=0.1, timeout=DEFAULT_TIMEOUT, authBaseUrl=core.AUTH_BASE_URL, session=None,
+                 noncePoolSize=0, validationCache=None, localVerifier=None, breakerThreshold=5,
+                 breakerResetTimeout=30, hedgePercentile=None, instrumentation=None, coalesce=True,
+                 responseCache=None):
+        self.authBaseUrl = authBaseUrl.rstrip("/")
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolConnections, pool_maxsize=poolMaxSize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not keepAlive:
+            self.session.headers["Connection"] = "close"
+        self.validationCache = validationCache
+        self.localVerifier = localVerifier
+        self.responseCache = responseCache
+        self.noncePools = NoncePools(self.get_nonce, size=noncePoolSize) if noncePoolSize else None
+        self.instrumentation = instrumentation or instrument.default
+        self.transport = Transport(self.session, timeout, RetryPolicy(maxRetries, backoffFactor),
+                                   breakerThreshold, breakerResetTimeout, hedgePercentile,
+                                   instrumentation=self.instrumentation, coalesce=coalesce)
+
+    def close(self):
+        if self.noncePools is not None:
+            self.noncePools.close()
+        self.transport.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request(self, method, url, **kwargs):
+        return self.transport.request(method, url, **kwargs)
+
+    def get_ws_session(self, casNetId, casPassword, casTimeout=1, **kwargs):
+        """
+        get a wsSession key pair (apiKey/wsId and sharedSecret)
+
+        See core.get_ws_session.
+        """
+        cas_user_dict = {"timeout": casTimeout, "username": casNetId, "password": casPassword}
+        data = "timeout=%(timeout)s&password=%(password)s&netId=%(username)s" % cas_user_dict
+        content_type = "application/x-www-form-urlencoded; charset=UTF-8"
+        coalesceKey = None if kwargs else ("session", casNetId, casPassword, casTimeout)
+        if kwargs.get('headers'):
+            kwargs['headers']['Content-Type'] = content_type
+        else:
+            kwargs['headers'] = {'Content-Type': content_type}
+        response = self._request("POST", self.authBaseUrl + "/ws/session", idempotent=True,
+                                 event=instrument.EVENT_SESSION_FETCH, coalesceKey=coalesceKey, data=data,
+                                 **kwargs)
+        response.raise_for_status()
+        body = response.content
+        if not body:
+            raise Exception("The WsSession-granting web service did not provide a WsSession."
+                            "  Perhaps the username and password supplied are not valid?")
+        return simplejson.loads(body)
+
+    def get_nonce(self, apiKey, actor="", **kwargs):
+        """
+        get a nonce key and value from the api-key
+
+        See core.get_nonce.
+        """
+        nonce_url = self.authBaseUrl + "/hmac/nonce/{0}{1}"
+        if actor:
+            actor = "/" + actor
+        else:
+            actor = ""  # in cases when actor == None or 'None' will be added to the URL
+        # asking for another nonce is harmless, so nonce fetches are retried
+        response = self._request("POST", nonce_url.format(apiKey, actor), idempotent=True,
+                                 event=instrument.EVENT_NONCE_FETCH, **kwargs)
+        body = response.content
+        if response.status_code >= 400:
+            raise WebServiceError("The nonce service returned %s: %r" % (response.status_code, body[:200]),
+                                  response.status_code, body)
+        try:
+            return simplejson.loads(body)
+        except ValueError:
+            raise WebServiceError("The nonce service returned a body that is not JSON: %r" % body[:200],
+                                  response.status_code, body)
+
+    def take_nonce(self, apiKey, actor="", **kwargs):
+        """
+        Returns a nonce from the prefetch pool when the client has one,
+        otherwise fetches it with get_nonce.
+        """
+        if self.noncePools is not None:
+            return self.noncePools.take(apiKey, actor)
+        return self.get_nonce(apiKey, actor, **kwargs)
+
+    def get_http_authorization_header(self, apiKey, sharedSecret, keyType, encodingType, url="", requestBody=None,
+                                      actor="", contentType=None, httpMethod=None, demo=False, actorInHash=False):
+        """
+        Encode the request to get the Authorization header value.
+
+        Nonces for Nonce encoding are taken from this client's nonce pool or fetched through it.
+        See core.get_http_authorization_header.
+        """
+        return core._build_authorization_header(apiKey, sharedSecret, keyType, encodingType, url, requestBody,
+                                                actor, contentType, httpMethod, demo, actorInHash,
+                                                self.take_nonce, self.instrumentation)
+
+    def send_ws_request(self, url, httpMethod, requestBody=None, sign=None, actor=None, **kwargs):
+        """
+        Send a request to a web service over the pooled session.
+
+        A streaming.FileBody requestBody is rewound and streamed from its start.
+
+        With a responseCache, GETs without a body are answered from the cache
+        while they are fresh and revalidated with a conditional GET after.
+
+        Arguments:
+            sign  -- callable(url, httpMethod) returning the Authorization header value, called
+                     before every attempt, so retries and revalidations are signed afresh and
+                     cache hits are not signed at all (default None)
+            actor -- the actor the request is made for, which keeps cached responses apart
+                     (default the actor of a URL-encoded Authorization header, else '')
+
+        Returns (content, status_code, headers, response)
+        """
+        cache = self.responseCache
+        if cache is not None and httpMethod.upper() == core.HTTP_METHOD_GET and not requestBody:
+            if actor is None:
+                parsed = parse_authorization_header((kwargs.get("headers") or {}).get("Authorization"))
+                actor = parsed[5] if parsed else ""
+
+            def send(conditional):
+                request_kwargs = dict(kwargs)
+                request_kwargs["headers"] = dict(kwargs.get("headers") or {}, **conditional)
+                return self._send(url, httpMethod, None, sign, **request_kwargs)
+            response = cache.fetch(url, actor, kwargs.get("headers"), send)
+        else:
+            response = self._send(url, httpMethod, requestBody, sign, **kwargs)
+        return response.content, response.status_code, response.headers, response
+
+    def open_ws_request(self, url, httpMethod, requestBody=None, sign=None, **kwargs):
+        """
+        Send a request to a web service and return a response.WsResponse
+        once the headers have arrived, leaving the body unread.
+
+        Close the WsResponse when the body is not read to the end, so the
+        connection goes back to the pool. See send_ws_request for sign.
+        """
+        return WsResponse(self._send(url, httpMethod, requestBody, sign, stream=True, **kwargs))
+
+    def _send(self, url, httpMethod, requestBody=None, sign=None, **kwargs):
+        if not core.valid_http_method(httpMethod):
+            raise Exception(
+                "The httpMethod passed in (%s) is not one of '%s'" % (httpMethod, "','".join(core.VALID_HTTP_METHODS)))
+        if isinstance(requestBody, FileBody):
+            requestBody.rewind()
+            if not len(requestBody):
+                requestBody = b""  # requests would otherwise switch to chunked encoding
+        if sign is not None:
+            kwargs["headers"] = dict(kwargs.get("headers") or {})
+
+            def sign_attempt(request_kwargs):
+                request_kwargs["headers"]["Authorization"] = sign(url, httpMethod)
+            kwargs["beforeAttempt"] = sign_attempt
+        return self._request(httpMethod.upper(), url, data=requestBody, **kwargs)
+
+    def send_many(self, requests, apiKey, sharedSecret, keyType=core.KEY_TYPE_API, encodingType=core.ENCODING_URL,
+                  concurrency=10, perHost=None, actorInHash=False, stream=False, **kwargs):
+        """
+        Sign and send many requests concurrently over this client, yielding
+        a fanout.WsResult for each as it completes.
+
+        See fanout.send_many.
+        """
+        return fanout.send_many(requests, apiKey, sharedSecret, keyType, encodingType, concurrency, perHost,
+                                actorInHash, stream, client=self, **kwargs)
+
+    def authorize_request(self, requestedUrl, authHeader, apiKey, sharedSecret, actor='', requestBody=None,
+                          contentType=None, httpMethod=None, **kwargs):
+        """
+        Returns the personId of a valid BYU authenticated request or None.
+
+        Headers for keys known to localVerifier are checked locally, using
+        requestBody, contentType and httpMethod to rebuild the signed string.
+        Other results are looked up in and stored to validationCache when the
+        client has one. See core.authorize_request.
+        """
+        authUrl = self.authBaseUrl + '/provider/URL-Encoded-API-Key/validate'
+
+        if authHeader and self.localVerifier is not None and self.localVerifier.knows(authHeader):
+            return self.localVerifier.verify(requestedUrl, authHeader, requestBody, contentType, httpMethod)
+        if authHeader:
+            wsId, messageDigest, timestamp = authHeader.split(',')
+            wsId = wsId.split(' ')[1]
+            cache = self.validationCache
+            cache_key = validation_key(wsId, messageDigest, timestamp, requestedUrl)
+            if cache is not None:
+                cached, personId = cache.lookup(cache_key)
+                if cached:
+                    return personId
+            data = {
+                'wsId': wsId,
+                'messageDigest': messageDigest,
+                'timestamp': timestamp,
+                'message': requestedUrl,
+            }
+            nonce_kwargs = dict(kwargs)
+            if kwargs.get('headers'):
+                nonce_kwargs['headers'] = dict(kwargs['headers'])
+
+            def sign_with_nonce(request_kwargs):
+                # every attempt needs a fresh nonce, they can only be used once
+                nonce = self.take_nonce(apiKey, actor, **nonce_kwargs)
+                nonceDigest = core.nonce_encode(sharedSecret, nonce['nonceValue']).decode("utf-8")
+
+                auth = 'Nonce-Encoded-API-Key {0},{1},{2}'.format(apiKey,
+                                                                  nonce['nonceKey'],
+                                                                  nonceDigest)
+                if request_kwargs.get('headers'):
+                    request_kwargs['headers']['Authorization'] = auth
+                else:
+                    request_kwargs['headers'] = {'Authorization': auth}
+
+            # the same header for the same url validates the same way, so concurrent checks share one call
+            coalesceKey = None if kwargs else ("validate", cache_key, apiKey, actor)
+            response = self._request("POST", authUrl, idempotent=True, beforeAttempt=sign_with_nonce,
+                                     event=instrument.EVENT_VALIDATE, coalesceKey=coalesceKey, data=data, **kwargs)
+            personId = None
+            if response.status_code == 200:
+                personId = response.json()['personId']
+            if cache is not None and response.status_code < 500:
+                cache.store(cache_key, personId, timestamp)
+            return personId
+
+        return None
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Returns the shared WsClient used by the module level functions,
+    creating it on first use.
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = WsClient()
+    return _default_client
+
+
+def set_default_client(client):
+    """
+    Replace the shared WsClient used by the module level functions.
+
+    Returns the previous default client (or None).
+    """
+    global _default_client
+    with _default_client_lock:
+        previous, _default_client = _default_client, client
+    return previous
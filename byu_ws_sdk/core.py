@@ -3,14 +3,13 @@ The code that generates the Authorization HTTP header.
 """
 __author__ = 'paul_eden@byu.edu'
 import os
-import xml.dom.minidom
-import simplejson
 import hashlib
 import hmac
 import base64
-import sys
+import itertools
 import time
-import requests
+
+from . import instrument
 
 # Singletons for use in validation and conformity of arguments
 ENCODING_NONCE = "Nonce"
@@ -24,36 +23,101 @@ HTTP_METHOD_DELETE = "DELETE"
 VALID_HTTP_METHODS = [HTTP_METHOD_GET, HTTP_METHOD_PUT, HTTP_METHOD_POST, HTTP_METHOD_DELETE]
 VALID_KEY_TYPES = [KEY_TYPE_API, KEY_TYPE_WSSESSION]
 VALID_ENCODING_TYPES = [ENCODING_NONCE, ENCODING_URL]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+AUTH_BASE_URL = "https://ws.byu.edu/authentication/services/rest/v1"
 
 
 def valid_http_method(method):
     return method.upper() in VALID_HTTP_METHODS
 
 
+_KEY_TYPES = frozenset(VALID_KEY_TYPES)
+_ENCODING_TYPES = frozenset(VALID_ENCODING_TYPES)
+
+
 def valid_key_type(key_type):
-    return key_type in VALID_KEY_TYPES
+    return key_type in _KEY_TYPES
 
 
 def valid_encoding_types(encoding_type):
-    return encoding_type in VALID_ENCODING_TYPES
+    return encoding_type in _ENCODING_TYPES
+
+
+class TimestampCache(object):
+    """
+    Returns the current local time in TIMESTAMP_FORMAT, formatting it only
+    once per second.
+
+    Arguments:
+        clock -- returns seconds since the epoch (default time.time, looked up on every call)
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock
+        self._cached = (0, 0, None)  # (second, next second, timestamp), replaced whole so readers need no lock
+
+    def __call__(self):
+        now = self.clock() if self.clock is not None else time.time()
+        second, next_second, timestamp = self._cached
+        if second <= now < next_second:
+            return timestamp
+        second = int(now)
+        timestamp = time.strftime(TIMESTAMP_FORMAT, time.localtime(second))
+        self._cached = (second, second + 1, timestamp)
+        return timestamp
+
+
+# the timestamp source for every header the SDK signs; replace it, e.g. with
+# TimestampCache(clock=lambda: frozen), to sign at a fixed time in tests
+timestamps = TimestampCache()
+
+_header_prefixes = {}
+_MAX_HEADER_PREFIXES = 1024
+
+
+def _header_prefix(encodingType, keyType, apiKey):
+    """
+    Returns "<encodingType>-Encoded-<keyType>-Key <apiKey>," building and
+    checking it only the first time it is asked for.
+    """
+    key = (encodingType, keyType, apiKey)
+    prefix = _header_prefixes.get(key)
+    if prefix is None:
+        if keyType not in _KEY_TYPES:
+            raise Exception("keyType must be one of %s" % " or ".join(VALID_KEY_TYPES))
+        if encodingType not in _ENCODING_TYPES:
+            raise Exception("encodingType must be one of '%s'" % "' or '".join(VALID_ENCODING_TYPES))
+        if len(_header_prefixes) >= _MAX_HEADER_PREFIXES:
+            _header_prefixes.clear()
+        prefix = _header_prefixes[key] = "%s-Encoded-%s-Key %s," % (encodingType, keyType, apiKey)
+    return prefix
 
 
 def get_body_from_file(file_name):
     if file_name and os.path.exists(file_name):
-        return file(file_name, "rb").read().rstrip("\n")
+        # no newline translation or locale decoding, so it signs like streaming.open_body
+        with open(file_name, encoding="utf-8", newline="") as body_file:
+            return body_file.read().rstrip("\n")
     else:
         return ""
 
 
 def get_pretty_xml(xml_str):
+    import xml.dom.minidom  # only responses that are xml pay for importing it
     return xml.dom.minidom.parseString(xml_str).toprettyxml()
 
 
 def get_formatted_response(headers, response_str):
-    if headers["Content-Type"] in "text/xml application/xml".split(' '):
+    """
+    Returns response_str pretty-printed when the Content-Type is XML, or
+    unchanged when it is not or does not parse.
+    """
+    content_type = headers.get("Content-Type", "").split(";", 1)[0].strip()
+    if content_type in ("text/xml", "application/xml"):
         try:
             return get_pretty_xml(response_str)
-        finally:
+        except Exception:
             return response_str
     return response_str
 
@@ -72,20 +136,7 @@ def get_ws_session(casNetId, casPassword, casTimeout=1, **kwargs):
     'expireDate': '2011-07-07 19:12:43',
     'sharedSecret': 'gKLR8oDsNK4jyvKyWZtsFoiwuvLhwWpsBDTNJo_D'}
     """
-    cas_user_dict = {"timeout": casTimeout, "username": casNetId, "password": casPassword}
-    data = "timeout=%(timeout)s&password=%(password)s&netId=%(username)s" % cas_user_dict
-    content_type = "application/x-www-form-urlencoded; charset=UTF-8"
-    if kwargs.get('headers'):
-        kwargs['headers']['Content-Type'] = content_type
-    else:
-        kwargs['headers'] = {'Content-Type': content_type}
-    response = requests.post("https://ws.byu.edu/authentication/services/rest/v1/ws/session", data=data, **kwargs)
-    response.raise_for_status()
-    body = response.content
-    if not body:
-        raise Exception("The WsSession-granting web service did not provide a WsSession."
-                        "  Perhaps the username and password supplied are not valid?")
-    return simplejson.loads(body)
+    return _default_client().get_ws_session(casNetId, casPassword, casTimeout, **kwargs)
 
 
 def get_nonce(apiKey, actor="", **kwargs):
@@ -94,23 +145,13 @@ def get_nonce(apiKey, actor="", **kwargs):
 
     Note, that the nonce returned here, at least currently, has a 5 minute hard-coded expiration.
 
+    Raises transport.WebServiceError when the nonce service fails or does not answer with JSON.
+
     return value example is
     {'nonceKey': '57921',
      'nonceValue': 'G4qPJr5L3xI3KjXPw0g1mgWY8bzInQts7uctUfTAINm5ov3WCbXqRrTlFyECiiY/8rKGIqGUNDMxI9HlFvDEKg=='}
     """
-    nonce_url = "https://ws.byu.edu/authentication/services/rest/v1/hmac/nonce/{0}{1}"
-    if actor:
-        actor = "/" + actor
-    else:
-        actor = ""  # in cases when actor == None or 'None' will be added to the URL
-    response = requests.post(nonce_url.format(apiKey, actor), **kwargs)
-    body = response.content
-    try:
-        rvalue = simplejson.loads(body)
-    except:
-        print(body)
-        raise
-    return rvalue
+    return _default_client().get_nonce(apiKey, actor, **kwargs)
 
 # no need for a get_api_key method because that is not an automated process
 # and is done once and the apiKey is long lived.
@@ -153,46 +194,126 @@ def _sort_params(params_str):
     This function returns:
     a=9,0&p=1
     As required by the security code
+
+    Blank tokens (as in "a=1&&b=2" or a trailing "&") are skipped and a
+    token without "=" is a key with an empty value, as the server parses
+    them. A single parameter is returned unchanged.
     """
-    params = {}
-    # params_str is now p=1&a=9&a=0
-    tokens = params_str.split("&")
-    # tokens is now ["p=1", "a=9", "a=0"]
-    if len(tokens) == 1:
+    if "&" not in params_str:
         return params_str  # no '&' as in "a=1" or "" as the whole params
-    else:
-        # now sort and join
-        for token in tokens:
-            key, value = token.split("=", 1)
-            if not key in params.keys():
-                params[key] = value
+    return _canonical_params(params_str.split("&"))
+
+
+def _canonical_params(tokens):
+    params = {}
+    repeated = None  # key -> every value, only for keys seen more than once
+    for token in tokens:
+        if not token:
+            continue
+        key, _, value = token.partition("=")
+        if key not in params:
+            params[key] = value
+        elif repeated is None:
+            repeated = {key: [params[key], value]}
+        elif key in repeated:
+            repeated[key].append(value)
+        else:
+            repeated[key] = [params[key], value]
+    if repeated:
+        for key, values in repeated.items():
+            params[key] = ",".join(values)
+    return "&".join([key + "=" + params[key] for key in sorted(params)])
+
+
+def _sort_params_stream(chunks):
+    """
+    The streaming form of _sort_params: canonicalizes a form body given as
+    an iterable of str chunks, scanning each chunk in place instead of
+    splitting the whole body up front.
+    """
+    tokens = _param_tokens(chunks)
+    first = next(tokens)
+    if first is None:
+        return next(tokens)  # no '&', the whole body is a single parameter
+    return _canonical_params(itertools.chain([first], tokens))
+
+
+def _param_tokens(chunks):
+    # yields the "&"-separated tokens of the chunks, or None and then the
+    # whole body when it has no "&"; the pieces of a token that spans chunks
+    # are joined once at its end, so a long value costs linear time
+    pending = []
+    separated = False
+    for chunk in chunks:
+        start = 0
+        end = chunk.find("&")
+        while end >= 0:
+            separated = True
+            if pending:
+                pending.append(chunk[start:end])
+                yield "".join(pending)
+                pending = []
             else:
-                params[key] = params[key] + "," + value
-    return_value = "&".join(["%s=%s" % (key, params[key]) for key in sorted(params.keys())])
-    return return_value
+                yield chunk[start:end]
+            start = end + 1
+            end = chunk.find("&", start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    if not separated:
+        yield None
+    yield "".join(pending)
 
 
 def base64encode_string(string, demo=False):
-    if sys.version_info < (3,):
-        rvalue = base64.encodestring(string).strip().replace(" ", "").replace("\n", "").replace("\r", "")
-    else:
-        rvalue1 = base64.encodebytes(string)
-        rvalue = rvalue1.strip().decode('utf-8').replace('\n', '').replace('\r', '').encode('utf-8')
+    rvalue = base64.b64encode(string)
     if demo:
         print("// base64 encoding the hash to create (%s)" % rvalue)
     return rvalue
 
 
+def _is_stream(requestBody):
+    """
+    True for request bodies that are file objects, mmaps or iterables of
+    byte chunks rather than strings.
+    """
+    if requestBody is None or isinstance(requestBody, (str, bytes, bytearray, dict, list, tuple)):
+        return False
+    return hasattr(requestBody, "read") or hasattr(requestBody, "__iter__")
+
+
 def make_sha512_mac(sharedSecret, string, demo=False):
     if demo:
         print("// Making a sha512 hash of (%s) with my private key" % string)
-    if sys.version_info > (3,):  # if python 3 convert to binary bytes
-        sharedSecret = sharedSecret.encode("utf-8")
-        if not isinstance(string, bytes):
-            string = string.encode("utf-8")
-    return hmac.new(key=sharedSecret,
-                    msg=string,
-                    digestmod=hashlib.sha512).digest()
+    if not isinstance(string, bytes):
+        string = string.encode("utf-8")
+    return _hmac_sha512(sharedSecret.encode("utf-8"), string)
+
+
+def _hmac_sha512(key, msg):
+    # one call into C without an hmac object
+    return hmac.digest(key, msg, "sha512")
+
+
+def _form_message(url, http_method, sorted_params):
+    host, request_uri = _split_url(url)
+    return "%s\n%s\n%s\n%s" % (http_method.upper(), host, request_uri, sorted_params)
+
+
+def _url_encode_message(url, requestBody, contentType, http_method, actor, current_timestamp, actorInHash):
+    """
+    Returns the bytes signed by url_encode for a request.
+    """
+    end_str = current_timestamp
+    if actorInHash and actor:
+        end_str += actor
+    if requestBody:
+        if contentType == FORM_CONTENT_TYPE:
+            item_to_encode = _form_message(url, http_method, _sort_params(requestBody)) + end_str
+        else:
+            item_to_encode = requestBody + end_str
+    else:
+        item_to_encode = url + end_str
+    return str(item_to_encode).encode("ascii")
 
 
 def url_encode(sharedSecret, current_timestamp, url, requestBody="", contentType=None, http_method=None, actor=None,
@@ -200,30 +321,28 @@ def url_encode(sharedSecret, current_timestamp, url, requestBody="", contentType
     """
     URL encode the request
 
+    requestBody may also be a streaming.FileBody, a binary file object or an
+    mmap, which are signed chunk by chunk and rewound afterwards. Other
+    iterables raise TypeError; pass them through streaming.as_body first.
+
     Returns hmac
     """
-    end_str = current_timestamp
-    if actorInHash:
-        if actor:
-            end_str += actor
-    item_to_encode = url + end_str
-    exception_ct = "application/x-www-form-urlencoded"
-    if requestBody:
-        if contentType == exception_ct:
-            host, request_uri = _split_url(url)
-            item_to_encode = "%s\n%s\n%s\n%s" % (http_method.upper(),
-                                                 host, request_uri, _sort_params(requestBody)) + end_str
-            if demo:
-                print("// There is something in the request "
-                      "body and the content-type of the request is %s" % exception_ct)
-        else:
-            item_to_encode = requestBody + end_str
-            if demo:
-                print("// There is something in the request body")
+    if _is_stream(requestBody):
+        from .streaming import message_chunks
+        mac = hmac.new(key=sharedSecret.encode("utf-8"), digestmod=hashlib.sha512)
+        for chunk in message_chunks(url, requestBody, contentType, http_method, actor, current_timestamp,
+                                    actorInHash):
+            mac.update(chunk)
+        return base64encode_string(mac.digest(), demo)
+    message = _url_encode_message(url, requestBody, contentType, http_method, actor, current_timestamp, actorInHash)
     if demo:
-        print("// We are URL Encoding the following (%s)" % item_to_encode)
-    mac = make_sha512_mac(sharedSecret,
-                          str(item_to_encode).encode("ascii"), demo)
+        if requestBody and contentType == FORM_CONTENT_TYPE:
+            print("// There is something in the request "
+                  "body and the content-type of the request is %s" % FORM_CONTENT_TYPE)
+        elif requestBody:
+            print("// There is something in the request body")
+        print("// We are URL Encoding the following (%s)" % message.decode("ascii"))
+    mac = make_sha512_mac(sharedSecret, message, demo)
     return base64encode_string(mac, demo)
 
 
@@ -249,34 +368,43 @@ def get_http_authorization_header(apiKey, sharedSecret, keyType, encodingType, u
     An example return value type is (for wsSession keys (the ones that expire in less than a day))
     URL-Encoded-WsSession-Key Xh348rh4YbfYH9H9IMwv,2iJdLY/nY...MA...EM9V+/P229jBCcOUuw==,2011-08-19 09:02:30
     """
-    current_timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    nonceKey = ""
-    if not valid_key_type(keyType):
-        raise Exception("keyType must be one of %s" % " or ".join(VALID_KEY_TYPES))
-
-    if encodingType == ENCODING_URL:
-        base64encoded_hmac = url_encode(sharedSecret, current_timestamp, url, requestBody, contentType, httpMethod,
-                                        actor, demo, actorInHash)
-    elif encodingType == ENCODING_NONCE:
-        nonceDict = get_nonce(apiKey, actor)
-        base64encoded_hmac = nonce_encode(sharedSecret, nonceDict["nonceValue"])
-        nonceKey = nonceDict["nonceKey"]
-    else:
-        raise Exception("encodingType must be one of '%s'" % "' or '".join(VALID_ENCODING_TYPES))
+    return _build_authorization_header(apiKey, sharedSecret, keyType, encodingType, url, requestBody, actor,
+                                       contentType, httpMethod, demo, actorInHash, get_nonce)
 
-    if sys.version_info > (3,):  # if python 3 convert from bytes to string
-        base64encoded_hmac = base64encoded_hmac.decode("utf-8")
 
-    assert len(base64encoded_hmac) == 88
-    if encodingType == ENCODING_NONCE:
-        return "Nonce-Encoded-%s-Key %s,%s,%s" % (keyType, apiKey, nonceKey, base64encoded_hmac)
-    else:
+def _build_authorization_header(apiKey, sharedSecret, keyType, encodingType, url, requestBody, actor, contentType,
+                                httpMethod, demo, actorInHash, nonce_getter, instrumentation=instrument.default):
+    """
+    Build the Authorization header value, calling nonce_getter(apiKey, actor)
+    when a nonce is needed. The signing (not the nonce fetch) is reported to
+    instrumentation as an EVENT_SIGN.
+    """
+    prefix = _header_prefixes.get((encodingType, keyType, apiKey)) or _header_prefix(encodingType, keyType, apiKey)
+    hooks = instrumentation.hooks
+    if encodingType == ENCODING_URL:
+        started = instrument.clock() if hooks else 0
+        current_timestamp = timestamps()
+        if demo or _is_stream(requestBody):
+            base64encoded_hmac = url_encode(sharedSecret, current_timestamp, url, requestBody, contentType,
+                                            httpMethod, actor, demo, actorInHash).decode("ascii")
+        else:  # url_encode without its demo output and stream checks
+            message = _url_encode_message(url, requestBody, contentType, httpMethod, actor, current_timestamp,
+                                          actorInHash)
+            base64encoded_hmac = base64.b64encode(_hmac_sha512(sharedSecret.encode("utf-8"), message)).decode("ascii")
         if actor:
-            actor_value = "," + actor
+            header = prefix + base64encoded_hmac + "," + current_timestamp + "," + actor
         else:
-            actor_value = ""
-        return "%s-Encoded-%s-Key %s,%s,%s%s" % (
-            encodingType, keyType, apiKey, base64encoded_hmac, current_timestamp, actor_value)
+            header = prefix + base64encoded_hmac + "," + current_timestamp
+    else:
+        nonceDict = nonce_getter(apiKey, actor)
+        started = instrument.clock() if hooks else 0
+        base64encoded_hmac = nonce_encode(sharedSecret, nonceDict["nonceValue"]).decode("ascii")
+        header = prefix + nonceDict["nonceKey"] + "," + base64encoded_hmac
+    assert len(base64encoded_hmac) == 88
+    if hooks:
+        instrumentation.emit(instrument.Event(instrument.EVENT_SIGN, instrument.clock() - started,
+                                              bytesSent=instrument.body_size(requestBody), url=url))
+    return header
 
 
 def send_ws_request(url, httpMethod, requestBody=None, **kwargs):
@@ -284,11 +412,15 @@ def send_ws_request(url, httpMethod, requestBody=None, **kwargs):
     A simple example of how to call the web service once the
     the authorization_header_value is available.
     """
-    if not valid_http_method(httpMethod):
-        raise Exception(
-            "The httpMethod passed in (%s) is not one of '%s'" % (httpMethod, "','".join(VALID_HTTP_METHODS)))
-    response = getattr(requests, httpMethod.lower())(url, data=requestBody, **kwargs)
-    return response.content, response.status_code, response.headers, response
+    return _default_client().send_ws_request(url, httpMethod, requestBody, **kwargs)
+
+
+def open_ws_request(url, httpMethod, requestBody=None, **kwargs):
+    """
+    Like send_ws_request, but returns a response.WsResponse without reading
+    the body, so it can be streamed with iter_content or save.
+    """
+    return _default_client().open_ws_request(url, httpMethod, requestBody, **kwargs)
 
 
 def authorize_request(requestedUrl, authHeader, apiKey, sharedSecret,
@@ -305,40 +437,16 @@ def authorize_request(requestedUrl, authHeader, apiKey, sharedSecret,
 
     Keyword arguments:
         actor         -- the actor making this authorization request (default '')
+        requestBody, contentType, httpMethod -- the rest of the signed request, used
+                         when the default client has a LocalVerifier for the key
 
     Also accepts any number of other keyword arguments that are passed directly
     to the calls to get_nonce and request.post
     """
-    authUrl = ('https://ws.byu.edu/authentication/services/rest/'
-               'v1/provider/URL-Encoded-API-Key/validate')
-
-    if authHeader:
-        wsId, messageDigest, timestamp = authHeader.split(',')
-        wsId = wsId.split(' ')[1]
-        nonce = get_nonce(apiKey, actor, **kwargs)
-        data = {
-            'wsId': wsId,
-            'messageDigest': messageDigest,
-            'timestamp': timestamp,
-            'message': requestedUrl,
-        }
-
-        nonceDigest = nonce_encode(sharedSecret, nonce['nonceValue'])
-
-        if sys.version_info > (3,):  # if python 3 convert from bytes to string
-            nonceDigest = nonceDigest.decode("utf-8")
-
-        auth = 'Nonce-Encoded-API-Key {0},{1},{2}'.format(apiKey,
-                                                          nonce['nonceKey'],
-                                                          nonceDigest)
-        if kwargs.get('headers'):
-            kwargs['headers']['Authorization'] = auth
-        else:
-            kwargs['headers'] = {'Authorization': auth}
-        response = requests.post(authUrl,
-                                 data=data,
-                                 **kwargs)
-        if response.status_code == 200:
-            return response.json()['personId']
-
-    return None
+    return _default_client().authorize_request(requestedUrl, authHeader, apiKey, sharedSecret, actor, **kwargs)
+
+
+def _default_client():
+    # imported here because client depends on the signing functions in this module
+    from .client import get_default_client
+    return get_default_client()
@@ -0,0 +1,236 @@
+"""
+Signing on behalf of many apps and actors from one process.
+
+A CredentialRegistry maps a name to an API key pair or a WsSession login.
+Each credential in use gets its own precomputed Signer, nonce pools and, for
+WsSession logins, a WsSessionManager that keeps the keypair fresh. That live
+state is created on first use and dropped again for the least recently used
+credentials once more than `maxActive` are live; the credential itself stays
+registered and its state is rebuilt the next time it is used.
+
+Looking a credential up takes no lock: the live states sit in a dict that is
+replaced, never changed in place, and recency is a timestamp written on the
+state itself. Only creating and evicting states takes the registry lock.
+"""
+import threading
+import time
+
+from . import core
+from .noncepool import NoncePools
+from .session import WsSessionManager
+from .signing import Signer
+
+
+class Credential(object):
+    """
+    The live signing state of one registered credential.
+
+    Arguments:
+        name          -- the name it is registered under
+        keyType       -- core.KEY_TYPE_API or core.KEY_TYPE_WSSESSION
+        client        -- the WsClient used for nonces and WsSessions
+        apiKey        -- the api key, for KEY_TYPE_API
+        sharedSecret  -- the shared secret, for KEY_TYPE_API
+        session       -- a WsSessionManager, for KEY_TYPE_WSSESSION
+        noncePoolSize -- nonces to prefetch per actor for Nonce encoding, 0 fetches on demand (default 0)
+    """
+
+    def __init__(self, name, keyType, client, apiKey=None, sharedSecret=None, session=None, noncePoolSize=0):
+        self.name = name
+        self.keyType = keyType
+        self.client = client
+        self.session = session
+        self.lastUsed = 0
+        self.signs = 0
+        self.noncePools = NoncePools(client.get_nonce, size=noncePoolSize) if noncePoolSize else None
+        self._signer = Signer(apiKey, sharedSecret, keyType) if session is None else None
+
+    @property
+    def signer(self):
+        """
+        The Signer for the current keypair; for a WsSession it is replaced
+        whenever the session is renewed.
+        """
+        if self.session is None:
+            return self._signer
+        keypair = self.session.get()
+        signer = self._signer
+        if signer is None or signer.apiKey != keypair["apiKey"]:
+            signer = self._signer = Signer(keypair["apiKey"], keypair["sharedSecret"], self.keyType)
+        return signer
+
+    @property
+    def apiKey(self):
+        return self.signer.apiKey
+
+    def take_nonce(self, actor=""):
+        apiKey = self.apiKey
+        if self.noncePools is not None:
+            return self.noncePools.take(apiKey, actor)
+        return self.client.take_nonce(apiKey, actor)
+
+    def get_http_authorization_header(self, encodingType=core.ENCODING_URL, url="", requestBody=None, actor="",
+                                      contentType=None, httpMethod=None, actorInHash=False):
+        """
+        Sign a request with this credential.
+
+        See core.get_http_authorization_header.
+        """
+        self.signs += 1
+        signer = self.signer
+        if encodingType == core.ENCODING_URL:
+            return signer.url_header(url, requestBody, actor, contentType, httpMethod, actorInHash)
+        if encodingType == core.ENCODING_NONCE:
+            return signer.nonce_header(self.take_nonce(actor))
+        raise Exception("encodingType must be one of '%s'" % "' or '".join(core.VALID_ENCODING_TYPES))
+
+    def close(self):
+        if self.noncePools is not None:
+            self.noncePools.close()
+        if self.session is not None:
+            self.session.close()
+
+
+class CredentialRegistry(object):
+    """
+    Named credentials for signing on behalf of many apps and actors.
+
+    Arguments:
+        client        -- the WsClient used for nonces and WsSessions (default client.get_default_client())
+        maxActive     -- most credentials kept live at once; the least recently used beyond this
+                         are evicted (default 100)
+        noncePoolSize -- nonces each live credential prefetches per actor, 0 fetches on demand (default 0)
+    """
+
+    def __init__(self, client=None, maxActive=100, noncePoolSize=0, clock=time.time):
+        if client is None:
+            from .client import get_default_client
+            client = get_default_client()
+        self.client = client
+        self.maxActive = maxActive
+        self.noncePoolSize = noncePoolSize
+        self.clock = clock
+        self.created = 0
+        self.evictions = 0
+        self._definitions = {}
+        self._active = {}  # name -> Credential, copy on write so get never takes the lock
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __contains__(self, name):
+        return name in self._definitions
+
+    def add_api_key(self, name, apiKey, sharedSecret):
+        """
+        Register an API key pair under name, replacing anything registered
+        under it before.
+        """
+        if not apiKey or not sharedSecret:
+            raise Exception("An apiKey and a sharedSecret are required for %r" % (name,))
+        self._define(name, {"keyType": core.KEY_TYPE_API, "apiKey": apiKey, "sharedSecret": sharedSecret})
+
+    def add_ws_session(self, name, casNetId, casPassword, casTimeout=60, **sessionKwargs):
+        """
+        Register a WsSession login under name, replacing anything registered
+        under it before. The session is only requested when name is first
+        used; sessionKwargs are passed to WsSessionManager.
+        """
+        self._define(name, {"keyType": core.KEY_TYPE_WSSESSION, "casNetId": casNetId, "casPassword": casPassword,
+                            "casTimeout": casTimeout, "sessionKwargs": sessionKwargs})
+
+    def _define(self, name, definition):
+        with self._lock:
+            self._definitions[name] = definition
+            stale = self._active.get(name)
+            if stale is not None:
+                self._active = dict((n, c) for n, c in self._active.items() if n != name)
+        if stale is not None:
+            stale.close()
+
+    def remove(self, name):
+        """
+        Forget the credential registered under name and close its state.
+        """
+        with self._lock:
+            if self._definitions.pop(name, None) is None:
+                raise KeyError(name)
+            stale = self._active.get(name)
+            if stale is not None:
+                self._active = dict((n, c) for n, c in self._active.items() if n != name)
+        if stale is not None:
+            stale.close()
+
+    def get(self, name):
+        """
+        Returns the live Credential for name, creating it on first use.
+
+        Raises KeyError for names that are not registered.
+        """
+        credential = self._active.get(name)
+        if credential is None:
+            credential = self._activate(name)
+        credential.lastUsed = self.clock()
+        return credential
+
+    def _activate(self, name):
+        evicted = []
+        with self._lock:
+            credential = self._active.get(name)
+            if credential is not None:
+                return credential
+            definition = self._definitions[name]
+            credential = self._build(name, definition)
+            credential.lastUsed = self.clock()
+            active = dict(self._active)
+            active[name] = credential
+            if len(active) > self.maxActive:
+                idle = sorted(active.values(), key=lambda c: c.lastUsed)[:len(active) - self.maxActive]
+                for stale in idle:
+                    del active[stale.name]
+                evicted.extend(idle)
+                self.evictions += len(idle)
+            self._active = active
+            self.created += 1
+        for stale in evicted:
+            stale.close()
+        return credential
+
+    def _build(self, name, definition):
+        if definition["keyType"] == core.KEY_TYPE_API:
+            return Credential(name, core.KEY_TYPE_API, self.client, definition["apiKey"],
+                              definition["sharedSecret"], noncePoolSize=self.noncePoolSize)
+        session = WsSessionManager(definition["casNetId"], definition["casPassword"], definition["casTimeout"],
+                                   client=self.client, **definition["sessionKwargs"])
+        return Credential(name, core.KEY_TYPE_WSSESSION, self.client, session=session,
+                          noncePoolSize=self.noncePoolSize)
+
+    def get_http_authorization_header(self, name, encodingType=core.ENCODING_URL, url="", requestBody=None,
+                                      actor="", contentType=None, httpMethod=None, actorInHash=False):
+        """
+        Sign a request with the credential registered under name.
+
+        See core.get_http_authorization_header.
+        """
+        return self.get(name).get_http_authorization_header(encodingType, url, requestBody, actor, contentType,
+                                                            httpMethod, actorInHash)
+
+    @property
+    def stats(self):
+        active = self._active
+        return {"registered": len(self._definitions), "active": len(active), "created": self.created,
+                "evictions": self.evictions,
+                "signs": dict((name, credential.signs) for name, credential in active.items())}
+
+    def close(self):
+        with self._lock:
+            active, self._active = self._active, {}
+        for credential in active.values():
+            credential.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,244 @@
+"""
+Sending many web service requests concurrently.
+
+send_many signs each request just before it is sent, so timestamps stay
+fresh however long a run takes. It keeps at most `concurrency` requests in
+flight, and at most `perHost` against any one host, and yields a WsResult as
+each request completes. Requests are pulled from the iterable only as slots
+free up and results are not kept once yielded, so a run of any length holds
+a bounded window of responses in memory.
+"""
+import collections
+from urllib.parse import urlsplit
+
+from . import core
+from . import instrument
+from .signing import Signer
+
+
+class WsRequest(object):
+    """
+    One request for send_many.
+
+    Arguments:
+        url         -- the web service url
+        httpMethod  -- the http method (default "GET")
+        requestBody -- the body to sign and send, a string or a streamed body (default None)
+        contentType -- Content-Type of the body, signed and sent (default None)
+        actor       -- netId of the actor to sign as (default "")
+        headers     -- other headers to send (default None)
+        tag         -- anything, handed back on the WsResult (default None)
+    """
+    __slots__ = ("url", "httpMethod", "requestBody", "contentType", "actor", "headers", "tag")
+
+    def __init__(self, url, httpMethod=core.HTTP_METHOD_GET, requestBody=None, contentType=None, actor="",
+                 headers=None, tag=None):
+        self.url = url
+        self.httpMethod = httpMethod
+        self.requestBody = requestBody
+        self.contentType = contentType
+        self.actor = actor
+        self.headers = headers
+        self.tag = tag
+
+    def __repr__(self):
+        return "<WsRequest %s %s>" % (self.httpMethod, self.url)
+
+
+def as_request(spec):
+    """
+    Returns spec as a WsRequest. spec may be a WsRequest, a dict of its
+    arguments, a url, or a tuple (url, httpMethod, requestBody, contentType,
+    actor) with trailing items left off.
+    """
+    if isinstance(spec, WsRequest):
+        return spec
+    if isinstance(spec, dict):
+        return WsRequest(**spec)
+    if isinstance(spec, str):
+        return WsRequest(spec)
+    return WsRequest(*spec)
+
+
+class WsResult(object):
+    """
+    The outcome of one request sent by send_many.
+
+    request     -- the WsRequest
+    index       -- position of the request in the iterable given to send_many
+    content     -- the response body, or None when it was streamed or the request failed
+    status_code -- the response status code, or None when the request failed
+    headers     -- the response headers, or None when the request failed
+    response    -- the response object, or None when the request failed
+    error       -- the exception raised while signing or sending, or None
+    duration    -- seconds spent signing and sending
+    """
+    __slots__ = ("request", "index", "content", "status_code", "headers", "response", "error", "duration")
+
+    def __init__(self, request, index, content=None, status_code=None, headers=None, response=None, error=None,
+                 duration=0):
+        self.request = request
+        self.index = index
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers
+        self.response = response
+        self.error = error
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.error is None and self.status_code < 400
+
+    def __repr__(self):
+        if self.error is not None:
+            return "<WsResult #%d %r>" % (self.index, self.error)
+        return "<WsResult #%d %s>" % (self.index, self.status_code)
+
+
+class _Scheduler(object):
+    """
+    Decides which requests may start, given the overall and per-host limits.
+
+    Requests for a host that is at its limit wait in a queue of at most
+    `concurrency` entries; while it is full no more requests are read.
+    """
+
+    def __init__(self, requests, concurrency, perHost):
+        if concurrency < 1:
+            raise Exception("concurrency must be at least 1")
+        self._requests = enumerate(requests)
+        self.concurrency = concurrency
+        self.perHost = perHost
+        self.inFlight = 0
+        self._active = collections.defaultdict(int)
+        self._waiting = collections.deque()
+        self._exhausted = False
+
+    def _has_room(self, host):
+        return not self.perHost or self._active[host] < self.perHost
+
+    def _take_waiting(self):
+        for i, item in enumerate(self._waiting):
+            if self._has_room(item[2]):
+                del self._waiting[i]
+                return item
+        return None
+
+    def ready(self):
+        """
+        Returns the (index, request, host) items that can start now and
+        counts them as in flight.
+        """
+        started = []
+        while self.inFlight < self.concurrency:
+            item = self._take_waiting()
+            if item is None:
+                if self._exhausted or len(self._waiting) >= self.concurrency:
+                    break
+                try:
+                    index, spec = next(self._requests)
+                except StopIteration:
+                    self._exhausted = True
+                    break
+                request = as_request(spec)
+                item = (index, request, urlsplit(request.url).netloc)
+                if not self._has_room(item[2]):
+                    self._waiting.append(item)
+                    continue
+            self._active[item[2]] += 1
+            self.inFlight += 1
+            started.append(item)
+        return started
+
+    def finished(self, host):
+        self.inFlight -= 1
+        self._active[host] -= 1
+
+    @property
+    def done(self):
+        return self._exhausted and not self._waiting and not self.inFlight
+
+
+def _sign(signer, request, encodingType, actorInHash, take_nonce):
+    if encodingType == core.ENCODING_NONCE:
+        return signer.nonce_header(take_nonce(signer.apiKey, request.actor))
+    return signer.url_header(request.url, request.requestBody, request.actor, request.contentType,
+                             request.httpMethod, actorInHash)
+
+
+def _request_headers(request):
+    headers = dict(request.headers or {})
+    if request.contentType and "Content-Type" not in headers:
+        headers["Content-Type"] = request.contentType
+    return headers
+
+
+def _send_one(client, signer, encodingType, actorInHash, stream, kwargs, index, request):
+    started = instrument.clock()
+    try:
+        # signed for every attempt, so a retry does not resend a used nonce
+        response = client._send(request.url, request.httpMethod, request.requestBody,
+                                lambda url, httpMethod: _sign(signer, request, encodingType, actorInHash,
+                                                              client.take_nonce),
+                                headers=_request_headers(request), stream=stream, **kwargs)
+    except Exception as e:
+        return WsResult(request, index, error=e, duration=instrument.clock() - started)
+    content = None if stream else response.content
+    return WsResult(request, index, content, response.status_code, response.headers, response,
+                    duration=instrument.clock() - started)
+
+
+def send_many(requests, apiKey, sharedSecret, keyType=core.KEY_TYPE_API, encodingType=core.ENCODING_URL,
+              concurrency=10, perHost=None, actorInHash=False, stream=False, client=None, **kwargs):
+    """
+    Sign and send an iterable of requests on a thread pool, yielding a
+    WsResult for each as it completes (not in the order given).
+
+    A request that fails is yielded with its error set rather than raised,
+    so one bad request does not stop the run.
+
+    Arguments:
+        requests     -- an iterable of WsRequest, or specs accepted by as_request
+        apiKey       -- the apiKey or wsId to sign with
+        sharedSecret -- the matching shared secret
+        keyType      -- core.KEY_TYPE_API or core.KEY_TYPE_WSSESSION (default KEY_TYPE_API)
+        encodingType -- core.ENCODING_URL or core.ENCODING_NONCE (default ENCODING_URL)
+        concurrency  -- requests in flight at once; keep it at most the client's
+                        poolMaxSize so connections are reused (default 10)
+        perHost      -- requests in flight at once against one host (default None, no limit)
+        actorInHash  -- sign the actor as part of the hash (default False)
+        stream       -- leave response bodies unread; read them with result.response.iter_content
+                        and close each response when done (default False)
+        client       -- the WsClient to send with (default client.get_default_client())
+        kwargs       -- passed on to every request, e.g. timeout
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    if client is None:
+        from .client import get_default_client
+        client = get_default_client()
+    signer = Signer(apiKey, sharedSecret, keyType)
+    scheduler = _Scheduler(requests, concurrency, perHost)
+    executor = ThreadPoolExecutor(concurrency)
+    pending = {}
+    try:
+        while True:
+            for index, request, host in scheduler.ready():
+                future = executor.submit(_send_one, client, signer, encodingType, actorInHash, stream, kwargs,
+                                         index, request)
+                pending[future] = host
+            if scheduler.done:
+                return
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                scheduler.finished(pending.pop(future))
+                yield future.result()
+    finally:
+        # the caller stopped early: drop what has not started and close what
+        # finished but was never yielded
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for future in pending:
+            if not future.cancelled() and future.result().response is not None:
+                future.result().response.close()
@@ -0,0 +1,379 @@
+"""
+A client side cache of GET responses for send_ws_request.
+
+Responses are cached per url and actor for as long as their Cache-Control
+max-age (or Expires) allows. After that, a response that came with an ETag
+or Last-Modified header is revalidated with a conditional GET, signed afresh
+like any other request, so that an unchanged resource costs a 304 with no
+body instead of the whole response again. Requests that say Cache-Control:
+no-store, and responses that do, are never cached; no-cache responses are
+revalidated on every use.
+
+Entries live in a backend: MemoryCache keeps them in an LRU dict and
+DiskCache in files under a directory, both evicting the least recently used
+once they hold more than `maxBytes`.
+"""
+import collections
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+
+# headers a 304 may carry that replace the stored ones
+_REFRESHED_HEADERS = ("cache-control", "date", "etag", "expires", "last-modified", "vary")
+# headers that describe the body as it was sent, not as it is stored
+_TRANSFER_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def cache_control(value):
+    """
+    Returns the directives of a Cache-Control header value as a dict, with
+    None for directives that have no argument.
+    """
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def _header(headers, name):
+    # request headers are a plain dict, so look the name up in any case
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _http_date(value):
+    parsed = email.utils.parsedate_tz(value) if value else None
+    return email.utils.mktime_tz(parsed) if parsed else None
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def fresh_until(headers, now):
+    """
+    Returns the time until which a response with these headers may be used
+    without revalidating, or None when it must not be stored at all.
+    """
+    directives = cache_control(_header(headers, "cache-control"))
+    if "no-store" in directives or (_header(headers, "vary") or "").strip() == "*":
+        return None
+    if "no-cache" in directives:
+        return now
+    maxAge = _seconds(directives.get("max-age"))
+    if maxAge is not None:
+        return now + maxAge - (_seconds(_header(headers, "age")) or 0)
+    expires = _http_date(_header(headers, "expires"))
+    if expires is not None:
+        date = _http_date(_header(headers, "date"))
+        return now + expires - (date if date is not None else now)
+    return now
+
+
+class CacheEntry(object):
+    """
+    One cached response.
+
+    Arguments:
+        url        -- the url it was fetched from
+        headers    -- its headers, a dict
+        content    -- its body, bytes
+        freshUntil -- time until which it is used without revalidating
+    """
+
+    def __init__(self, url, headers, content, freshUntil):
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self.freshUntil = freshUntil
+
+    @property
+    def etag(self):
+        return _header(self.headers, "etag")
+
+    @property
+    def lastModified(self):
+        return _header(self.headers, "last-modified")
+
+    @property
+    def size(self):
+        return len(self.content) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+    def response(self):
+        """
+        Returns a requests.Response for the cached status 200 response.
+        """
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+
+class MemoryCache(object):
+    """
+    A thread-safe LRU dict of cache entries.
+
+    Arguments:
+        maxBytes -- most bytes of bodies and headers kept (default 64 MiB)
+    """
+
+    def __init__(self, maxBytes=64 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry  # most recently used goes last
+            return entry
+
+    def set(self, key, entry):
+        size = entry.size
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if size > self.maxBytes:
+                return
+            self._entries[key] = entry
+            self.size += size
+            while self.size > self.maxBytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskCache(object):
+    """
+    Cache entries kept as files in a directory, one per key, so they outlive
+    the process. Each file is a line of JSON with the url, headers and
+    freshness followed by the raw body. Files are replaced atomically; the
+    least recently used (by modification time, which reads touch) are
+    removed once the directory holds more than `maxBytes`.
+
+    Arguments:
+        directory -- where to keep the files; created when missing
+        maxBytes  -- most bytes of files kept (default 256 MiB)
+    """
+
+    SUFFIX = ".wscache"
+
+    def __init__(self, directory, maxBytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.size = 0
+        self.evictions = 0
+        self._files = collections.OrderedDict()  # name -> size, least recently used first
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        found = []
+        for name in os.listdir(directory):
+            if name.endswith(self.SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self.size += size
+
+    def __len__(self):
+        return len(self._files)
+
+    def _name(self, key):
+        return hashlib.sha256(key.encode("utf-8")).hexdigest() + self.SUFFIX
+
+    def get(self, key):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline().decode("utf-8"))
+                content = f.read()
+        except (OSError, IOError, ValueError):
+            return None
+        if meta.get("key") != key:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            if name in self._files:
+                self._files[name] = self._files.pop(name)
+        return CacheEntry(meta["url"], meta["headers"], content, meta["freshUntil"])
+
+    def set(self, key, entry):
+        name = self._name(key)
+        meta = json.dumps({"key": key, "url": entry.url, "headers": entry.headers,
+                           "freshUntil": entry.freshUntil}).encode("utf-8")
+        size = len(meta) + 1 + len(entry.content)
+        if size > self.maxBytes:
+            self.delete(key)
+            return
+        path = os.path.join(self.directory, name)
+        temp = "%s.%d.%d.tmp" % (path, os.getpid(), threading.current_thread().ident)
+        with open(temp, "wb") as f:
+            f.write(meta + b"\n")
+            f.write(entry.content)
+        os.replace(temp, path)
+        evicted = []
+        with self._lock:
+            self.size += size - self._files.pop(name, 0)
+            self._files[name] = size
+            while self.size > self.maxBytes:
+                stale, staleSize = self._files.popitem(last=False)
+                self.size -= staleSize
+                self.evictions += 1
+                evicted.append(stale)
+        for stale in evicted:
+            self._remove(stale)
+
+    def delete(self, key):
+        name = self._name(key)
+        with self._lock:
+            self.size -= self._files.pop(name, 0)
+        self._remove(name)
+
+    def clear(self):
+        with self._lock:
+            names = list(self._files)
+            self._files.clear()
+            self.size = 0
+        for name in names:
+            self._remove(name)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+
+class ResponseCache(object):
+    """
+    Caches GET responses for WsClient.send_ws_request.
+
+    Arguments:
+        backend -- a MemoryCache or DiskCache, or anything with get(key), set(key, entry),
+                   delete(key) and clear() (default MemoryCache())
+    """
+
+    def __init__(self, backend=None, clock=time.time):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.notModified = 0
+        self.bytesSaved = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "revalidations": self.revalidations,
+                "not_modified": self.notModified, "bytes_saved": self.bytesSaved,
+                "entries": len(self.backend), "size": getattr(self.backend, "size", None),
+                "evictions": getattr(self.backend, "evictions", None)}
+
+    @staticmethod
+    def key(url, actor=""):
+        return url + "\n" + actor if actor else url
+
+    def fetch(self, url, actor, headers, send):
+        """
+        Returns the response for a GET of url on behalf of actor, from the
+        cache when it is fresh there. Otherwise send(conditionalHeaders) is
+        called to fetch or revalidate it, and must return a requests.Response.
+        """
+        directives = cache_control(_header(headers, "cache-control"))
+        if "no-store" in directives or _header(headers, "if-none-match") or _header(headers, "if-modified-since"):
+            return send({})  # the caller manages caching of this request itself
+        key = self.key(url, actor)
+        entry = self.backend.get(key)
+        if entry is not None and "no-cache" not in directives and self.clock() < entry.freshUntil:
+            with self._lock:
+                self.hits += 1
+                self.bytesSaved += len(entry.content)
+            return entry.response()
+        conditional = {}
+        if entry is not None:
+            if entry.etag:
+                conditional["If-None-Match"] = entry.etag
+            if entry.lastModified:
+                conditional["If-Modified-Since"] = entry.lastModified
+        with self._lock:
+            if conditional:
+                self.revalidations += 1
+            else:
+                self.misses += 1
+        response = send(conditional)
+        if response.status_code == 304 and conditional:
+            stored = dict(entry.headers)
+            for name, value in response.headers.items():
+                if name.lower() in _REFRESHED_HEADERS:
+                    for old in [k for k in stored if k.lower() == name.lower()]:
+                        del stored[old]
+                    stored[name] = value
+            with self._lock:
+                self.notModified += 1
+                self.bytesSaved += len(entry.content)
+            entry = CacheEntry(entry.url, stored, entry.content, entry.freshUntil)
+            self._store(key, entry)
+            return entry.response()
+        if response.status_code == 200:
+            content = response.content
+            stored = dict((k, v) for k, v in response.headers.items() if k.lower() not in _TRANSFER_HEADERS)
+            stored["Content-Length"] = str(len(content))
+            self._store(key, CacheEntry(url, stored, content, None))
+        elif entry is not None and response.status_code < 500:
+            self.backend.delete(key)
+        return response
+
+    def _store(self, key, entry):
+        now = self.clock()
+        freshUntil = fresh_until(entry.headers, now)
+        if freshUntil is None or (freshUntil <= now and not (entry.etag or entry.lastModified)):
+            self.backend.delete(key)
+            return
+        entry.freshUntil = freshUntil
+        self.backend.set(key, entry)
+
+    def clear(self):
+        self.backend.clear()
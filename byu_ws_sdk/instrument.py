@@ -0,0 +1,161 @@
+"""
+Hooks for timing and counting SDK network calls and signing.
+
+Register any callable with add_hook and it is called with an Event after
+every nonce fetch, WsSession fetch, validation, web service request and
+header signing. With no hooks registered nothing is timed, so the cost is a
+single list check per call. HistogramCollector is a ready made hook that
+keeps latencies in memory and reports percentiles; exporters for
+Prometheus, StatsD and the like are hooks that forward each Event.
+"""
+import collections
+import threading
+import time
+
+EVENT_NONCE_FETCH = "nonce_fetch"
+EVENT_SESSION_FETCH = "session_fetch"
+EVENT_VALIDATE = "validate"
+EVENT_REQUEST = "request"
+EVENT_SIGN = "sign"
+
+clock = time.perf_counter
+
+
+class Event(object):
+    """
+    One timed SDK operation.
+
+    name          -- one of the EVENT_* constants
+    duration      -- seconds the operation took
+    status        -- HTTP status code of the final response, or None
+    error         -- the exception raised, or None
+    retries       -- retries the transport made
+    bytesSent     -- size of the request body when known, or None
+    bytesReceived -- size of the response body when known, or None
+    method, url   -- the HTTP request, when there was one
+    response      -- the requests.Response, when there was one
+    """
+    __slots__ = ("name", "duration", "status", "error", "retries", "bytesSent", "bytesReceived", "method", "url",
+                 "response")
+
+    def __init__(self, name, duration, status=None, error=None, retries=0, bytesSent=None, bytesReceived=None,
+                 method=None, url=None, response=None):
+        self.name = name
+        self.duration = duration
+        self.status = status
+        self.error = error
+        self.retries = retries
+        self.bytesSent = bytesSent
+        self.bytesReceived = bytesReceived
+        self.method = method
+        self.url = url
+        self.response = response
+
+    def __repr__(self):
+        return "<Event %s %.6fs status=%s retries=%s>" % (self.name, self.duration, self.status, self.retries)
+
+
+class Instrumentation(object):
+    """
+    A set of hooks that Events are sent to.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        with self._lock:
+            self.hooks = self.hooks + [hook]  # copy on write, emit never takes the lock
+        return hook
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self.hooks = [h for h in self.hooks if h is not hook]
+
+    def emit(self, event):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                pass  # a broken exporter must not break the call it measures
+
+
+default = Instrumentation()
+
+
+def add_hook(hook):
+    """
+    Register hook(event) with the default instrumentation used by the
+    module level functions and by clients created without their own.
+    """
+    return default.add_hook(hook)
+
+
+def remove_hook(hook):
+    default.remove_hook(hook)
+
+
+def body_size(body):
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        return None
+
+
+class HistogramCollector(object):
+    """
+    A hook that keeps the latest `maxSamples` durations per event name and
+    counts calls, errors, retries and bytes.
+    """
+
+    def __init__(self, maxSamples=10000):
+        self.maxSamples = maxSamples
+        self._samples = {}
+        self._counts = collections.defaultdict(lambda: {"count": 0, "errors": 0, "retries": 0,
+                                                        "bytes_sent": 0, "bytes_received": 0})
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            samples = self._samples.get(event.name)
+            if samples is None:
+                samples = self._samples[event.name] = collections.deque(maxlen=self.maxSamples)
+            samples.append(event.duration)
+            counts = self._counts[event.name]
+            counts["count"] += 1
+            counts["retries"] += event.retries
+            if event.error is not None or (event.status or 0) >= 500:
+                counts["errors"] += 1
+            counts["bytes_sent"] += event.bytesSent or 0
+            counts["bytes_received"] += event.bytesReceived or 0
+
+    def percentile(self, name, p):
+        """
+        Returns the p-th percentile (0 to 100) of the durations for name, or None.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self):
+        """
+        Returns {name: {count, errors, retries, bytes_sent, bytes_received, p50, p99}}.
+        """
+        with self._lock:
+            names = list(self._counts)
+            result = dict((name, dict(self._counts[name])) for name in names)
+        for name in names:
+            result[name]["p50"] = self.percentile(name, 50)
+            result[name]["p99"] = self.percentile(name, 99)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
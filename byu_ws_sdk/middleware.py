@@ -0,0 +1,327 @@
+"""
+WSGI and ASGI middleware that only lets BYU authenticated requests through.
+
+The middleware reads the Authorization header and rebuilds the url that was
+signed. Headers the client's LocalVerifier knows are checked locally, and
+results already in the client's ValidationCache are taken from it. Anything
+else goes to the validate service through authorize_request, which means a
+nonce fetch (from the client's nonce pool when it has one) and a POST.
+
+Identical validations running at the same moment share one upstream call,
+and at most `maxInFlight` upstream validations run at once. A request that
+waits longer than `queueTimeout` for a slot, or whose validation fails for
+reasons other than the header being invalid, gets a 503. Invalid or missing
+headers get a 401. Requests that pass are handed on with the personId in
+environ[PERSON_ID_KEY] (WSGI) or scope[PERSON_ID_KEY] (ASGI).
+"""
+import asyncio
+import io
+import json
+import threading
+from urllib.parse import quote
+
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .streaming import FileBody
+from .validation import validation_key
+
+PERSON_ID_KEY = "byu_ws_sdk.personId"
+
+
+def _error_body(status, message):
+    return json.dumps({"status": status, "message": message}).encode("utf-8")
+
+
+class _Rejected(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class _AuthMiddleware(object):
+    # what the WSGI and ASGI middleware share
+
+    def __init__(self, app, apiKey, sharedSecret, client, actor, maxInFlight, queueTimeout, required, singleFlight):
+        if maxInFlight < 1:
+            raise Exception("maxInFlight must be at least 1")
+        self.app = app
+        self.apiKey = apiKey
+        self.sharedSecret = sharedSecret
+        self.client = client
+        self.actor = actor
+        self.maxInFlight = maxInFlight
+        self.queueTimeout = queueTimeout
+        self.required = required
+        self.singleFlight = singleFlight
+        self.validations = 0
+        self.rejected = 0
+
+    @property
+    def coalesced(self):
+        return self.singleFlight.collapsed
+
+    @property
+    def stats(self):
+        return {"validations": self.validations, "coalesced": self.coalesced, "rejected": self.rejected,
+                "in_flight": len(self.singleFlight)}
+
+    def _local(self, url, authHeader, requestBody, contentType, httpMethod):
+        """
+        Returns (True, personId) when the header could be checked without an
+        upstream call, else (False, flight key).
+        """
+        verifier = self.client.localVerifier
+        if verifier is not None and verifier.knows(authHeader):
+            try:
+                return True, verifier.verify(url, authHeader, requestBody, contentType, httpMethod)
+            except UnicodeError:  # a form body that is not ASCII cannot have been signed
+                return True, None
+        try:
+            wsId, messageDigest, timestamp = authHeader.split(",")
+            wsId = wsId.split(" ")[1]
+        except (ValueError, IndexError):
+            return True, None
+        key = validation_key(wsId, messageDigest, timestamp, url)
+        cache = self.client.validationCache
+        if cache is not None:
+            cached, personId = cache.lookup(key)
+            if cached:
+                return True, personId
+        return False, key
+
+    def _needs_body(self, authHeader):
+        verifier = self.client.localVerifier
+        return verifier is not None and verifier.knows(authHeader)
+
+
+class WsgiAuthMiddleware(_AuthMiddleware):
+    """
+    WSGI middleware that validates the BYU Authorization header of every
+    request.
+
+    Arguments:
+        app          -- the WSGI application to protect
+        apiKey       -- the api key used to call the validate service
+        sharedSecret -- its shared secret
+        client       -- the WsClient to validate with; give it a validationCache, localVerifier
+                        or noncePoolSize to use them (default client.get_default_client())
+        actor        -- actor for the validation nonces (default '')
+        maxInFlight  -- most upstream validations running at once (default 10)
+        queueTimeout -- seconds a request may wait for an upstream slot before a 503,
+                        None waits forever (default 5)
+        required     -- reject requests without an Authorization header; when False they are
+                        passed on with no personId (default True)
+        urlFor       -- callable(environ) returning the url the client signed, for apps behind a
+                        proxy that rewrites it (default wsgiref.util.request_uri)
+    """
+
+    def __init__(self, app, apiKey, sharedSecret, client=None, actor="", maxInFlight=10, queueTimeout=5,
+                 required=True, urlFor=None):
+        if client is None:
+            from .client import get_default_client
+            client = get_default_client()
+        _AuthMiddleware.__init__(self, app, apiKey, sharedSecret, client, actor, maxInFlight, queueTimeout,
+                                 required, SingleFlight())
+        if urlFor is None:
+            from wsgiref.util import request_uri
+            urlFor = request_uri
+        self.urlFor = urlFor
+        self._slots = threading.BoundedSemaphore(maxInFlight)
+
+    def __call__(self, environ, start_response):
+        authHeader = environ.get("HTTP_AUTHORIZATION")
+        if not authHeader:
+            if self.required:
+                return self._reject(start_response, 401, "An Authorization header is required")
+            return self.app(environ, start_response)
+        try:
+            personId = self.authorize(environ, authHeader)
+        except _Rejected as e:
+            return self._reject(start_response, e.status, str(e))
+        if personId is None:
+            return self._reject(start_response, 401, "The Authorization header is not valid")
+        environ[PERSON_ID_KEY] = personId
+        return self.app(environ, start_response)
+
+    def authorize(self, environ, authHeader):
+        """
+        Returns the personId for the request in environ, or None when its
+        header is not valid.
+        """
+        url = self.urlFor(environ)
+        method = environ.get("REQUEST_METHOD")
+        contentType = environ.get("CONTENT_TYPE")
+        body = None
+        if self._needs_body(authHeader):
+            body = _read_wsgi_body(environ)
+        local, key = self._local(url, authHeader, body, contentType, method)
+        if local:
+            return key
+        return self.singleFlight.do(key, self._validate, url, authHeader, body, contentType, method)
+
+    def _validate(self, url, authHeader, body, contentType, method):
+        if not self._slots.acquire(timeout=self.queueTimeout):
+            self.rejected += 1
+            raise _Rejected(503, "Too many validations in progress")
+        try:
+            self.validations += 1
+            return self.client.authorize_request(url, authHeader, self.apiKey, self.sharedSecret, self.actor, body,
+                                                 contentType, method)
+        except Exception as e:
+            raise _Rejected(503, "The request could not be validated: %s" % e)
+        finally:
+            self._slots.release()
+
+    def _reject(self, start_response, status, message):
+        body = _error_body(status, message)
+        reason = "401 Unauthorized" if status == 401 else "503 Service Unavailable"
+        headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+        if status == 401:
+            headers.append(("WWW-Authenticate", "URL-Encoded-API-Key"))
+        start_response(reason, headers)
+        return [body]
+
+
+def _read_wsgi_body(environ):
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    body = environ["wsgi.input"].read(length) if length > 0 else b""
+    environ["wsgi.input"] = io.BytesIO(body)  # let the app read it again
+    return FileBody(io.BytesIO(body))  # signed as raw bytes, whatever their encoding
+
+
+class AsgiAuthMiddleware(_AuthMiddleware):
+    """
+    ASGI middleware that validates the BYU Authorization header of every
+    http request. Other scope types are passed through.
+
+    Arguments:
+        app          -- the ASGI application to protect
+        apiKey, sharedSecret, actor, maxInFlight, queueTimeout, required
+                     -- as for WsgiAuthMiddleware
+        client       -- the aio.AsyncWsClient to validate with (required)
+        urlFor       -- callable(scope) returning the url the client signed (default request_url)
+    """
+
+    def __init__(self, app, apiKey, sharedSecret, client, actor="", maxInFlight=10, queueTimeout=5, required=True,
+                 urlFor=None):
+        _AuthMiddleware.__init__(self, app, apiKey, sharedSecret, client, actor, maxInFlight, queueTimeout,
+                                 required, AsyncSingleFlight())
+        self.urlFor = urlFor or request_url
+        self._slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        authHeader = _scope_header(scope, b"authorization")
+        if not authHeader:
+            if self.required:
+                return await self._reject(send, 401, "An Authorization header is required")
+            return await self.app(scope, receive, send)
+        body = None
+        if self._needs_body(authHeader):
+            body, receive = await _buffer_asgi_body(receive)
+        try:
+            personId = await self.authorize(scope, authHeader, body)
+        except _Rejected as e:
+            return await self._reject(send, e.status, str(e))
+        if personId is None:
+            return await self._reject(send, 401, "The Authorization header is not valid")
+        scope = dict(scope)
+        scope[PERSON_ID_KEY] = personId
+        return await self.app(scope, receive, send)
+
+    async def authorize(self, scope, authHeader, body=None):
+        """
+        Returns the personId for the request in scope, or None when its
+        header is not valid. body is the request body, bytes, which headers
+        for keys the client's LocalVerifier knows are checked against.
+        """
+        url = self.urlFor(scope)
+        method = scope.get("method")
+        contentType = _scope_header(scope, b"content-type")
+        requestBody = FileBody(io.BytesIO(body)) if body is not None else None
+        local, key = self._local(url, authHeader, requestBody, contentType, method)
+        if local:
+            return key
+        return await self.singleFlight.do(key, self._validate, url, authHeader, contentType, method)
+
+    async def _validate(self, url, authHeader, contentType, method):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.maxInFlight)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queueTimeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise _Rejected(503, "Too many validations in progress")
+        try:
+            self.validations += 1
+            return await self.client.authorize_request(url, authHeader, self.apiKey, self.sharedSecret, self.actor,
+                                                       None, contentType, method)
+        except Exception as e:
+            raise _Rejected(503, "The request could not be validated: %s" % e)
+        finally:
+            self._slots.release()
+
+    async def _reject(self, send, status, message):
+        body = _error_body(status, message)
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))]
+        if status == 401:
+            headers.append((b"www-authenticate", b"URL-Encoded-API-Key"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def _buffer_asgi_body(receive):
+    """
+    Reads the whole request body from receive. Returns it with a receive
+    callable that hands it to the app again before passing on to the
+    original receive.
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break  # the client went away
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    body = b"".join(chunks)
+    replayed = []
+
+    async def replay():
+        if not replayed:
+            replayed.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return body, replay
+
+
+def _scope_header(scope, name):
+    for key, value in scope.get("headers", ()):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def request_url(scope):
+    """
+    Returns the full url of an ASGI http request, quoted the way
+    wsgiref.util.request_uri quotes WSGI urls.
+    """
+    host = _scope_header(scope, b"host")
+    scheme = scope.get("scheme", "http")
+    if host is None:
+        server = scope.get("server")
+        if server is None:
+            host = "localhost"
+        else:
+            host, port = server
+            if (scheme, port) not in (("http", 80), ("https", 443)):
+                host = "%s:%s" % (host, port)
+    url = "%s://%s%s" % (scheme, host, quote(scope.get("root_path", "") + scope.get("path", "/"), safe="/;=,"))
+    query = scope.get("query_string", b"")
+    if query:
+        url += "?" + query.decode("latin-1")
+    return url
@@ -0,0 +1,190 @@
+"""
+Prefetching pools of nonces for Nonce-encoded headers and authorize_request.
+
+A nonce can only be used once and lives about five minutes, so a pool fetches
+a few ahead of time in a background thread and hands them out without a
+network round trip.
+"""
+import collections
+import threading
+import time
+
+NONCE_LIFETIME = 300  # seconds, see core.get_nonce
+_clock = time.monotonic
+
+
+class NoncePool(object):
+    """
+    Keeps up to `size` unused nonces for one (apiKey, actor) pair.
+
+    Arguments:
+        fetch       -- callable(apiKey, actor) returning a nonce dict, e.g. WsClient.get_nonce
+        apiKey      -- the api key the nonces are for
+        actor       -- the actor the nonces are for (default '')
+        size        -- number of nonces to keep ready (default 4)
+        lowWater    -- refill when fewer than this many are left (default size // 2, at least 1)
+        lifetime    -- seconds a nonce is valid for (default NONCE_LIFETIME)
+        margin      -- drop nonces this many seconds before they expire (default 30)
+        retryDelay  -- seconds to wait before refilling again after a failed fetch (default 5)
+    """
+
+    def __init__(self, fetch, apiKey, actor="", size=4, lowWater=None, lifetime=NONCE_LIFETIME, margin=30,
+                 retryDelay=5, clock=_clock):
+        self.fetch = fetch
+        self.apiKey = apiKey
+        self.actor = actor
+        self.size = size
+        self.lowWater = max(1, size // 2) if lowWater is None else lowWater
+        self.maxAge = lifetime - margin
+        self.retryDelay = retryDelay
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.errors = 0
+        self._nonces = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._thread = None
+        self._retryAt = None  # while a failed refill backs off, takes do not wake the thread
+
+    def __len__(self):
+        return len(self._nonces)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "expired": self.expired,
+                "errors": self.errors, "available": len(self._nonces)}
+
+    def _drop_expired(self, now):
+        while self._nonces and now - self._nonces[0][0] > self.maxAge:
+            self._nonces.popleft()
+            self.expired += 1
+
+    def take(self):
+        """
+        Returns a nonce dict, from the pool if one is ready or else fetched
+        directly. Either way the pool is topped up in the background.
+        """
+        with self._cond:
+            self._drop_expired(self.clock())
+            nonce = self._nonces.popleft()[1] if self._nonces else None
+            if nonce is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if len(self._nonces) < self.lowWater or nonce is None:
+                self._wake()
+        if nonce is None:
+            nonce = self.fetch(self.apiKey, self.actor)
+        return nonce
+
+    def prefetch(self):
+        """
+        Start filling the pool without waiting for the first take().
+        """
+        with self._cond:
+            self._wake()
+
+    def _wake(self):
+        # must hold self._cond
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._refill_loop, name="nonce-pool-%s" % self.apiKey)
+            self._thread.daemon = True
+            self._thread.start()
+        if self._retryAt is None or self.clock() >= self._retryAt:
+            self._cond.notify()
+
+    def _refill_loop(self):
+        while True:
+            with self._cond:
+                self._drop_expired(self.clock())
+                while not self._closed and len(self._nonces) >= self.lowWater:
+                    self._cond.wait()
+                    self._drop_expired(self.clock())
+                if self._closed:
+                    return
+                wanted = self.size - len(self._nonces)
+            for _ in range(wanted):
+                try:
+                    nonce = self.fetch(self.apiKey, self.actor)
+                except Exception:
+                    with self._cond:
+                        self.errors += 1
+                        self._retryAt = self.clock() + self.retryDelay
+                        self._cond.wait(self.retryDelay)
+                    break
+                with self._cond:
+                    if self._closed:
+                        return
+                    self._retryAt = None
+                    self._nonces.append((self.clock(), nonce))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._nonces.clear()
+            self._cond.notify_all()
+
+
+class NoncePools(object):
+    """
+    Lazily creates one NoncePool per (apiKey, actor) pair, keeping the
+    `maxPools` most recently used. Older pools are closed, which ends their
+    refill threads; their pairs get a fresh pool when used again.
+
+    Arguments:
+        fetch    -- callable(apiKey, actor) returning a nonce dict
+        maxPools -- most pools, and so refill threads, kept at once (default 64)
+
+    Extra keyword arguments are passed to every NoncePool.
+    """
+
+    def __init__(self, fetch, maxPools=64, **poolKwargs):
+        self.fetch = fetch
+        self.maxPools = maxPools
+        self.poolKwargs = poolKwargs
+        self.evictions = 0
+        self._pools = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pools)
+
+    def pool(self, apiKey, actor=""):
+        key = (apiKey, actor or "")
+        evicted = None
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is not None:
+                self._pools.move_to_end(key)
+            else:
+                pool = self._pools[key] = NoncePool(self.fetch, apiKey, actor or "", **self.poolKwargs)
+                if len(self._pools) > self.maxPools:
+                    _, evicted = self._pools.popitem(last=False)
+                    self.evictions += 1
+        if evicted is not None:
+            evicted.close()  # anyone still holding it gets nonces fetched on demand
+        return pool
+
+    def take(self, apiKey, actor=""):
+        return self.pool(apiKey, actor).take()
+
+    @property
+    def hits(self):
+        return sum(pool.hits for pool in list(self._pools.values()))
+
+    @property
+    def misses(self):
+        return sum(pool.misses for pool in list(self._pools.values()))
+
+    @property
+    def stats(self):
+        return dict(("%s/%s" % key if key[1] else key[0], pool.stats)
+                    for key, pool in list(self._pools.items()))
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), collections.OrderedDict()
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,121 @@
+"""
+A web service response whose body is read only when asked for.
+
+open_ws_request returns a WsResponse over a streamed requests.Response:
+nothing past the headers is read until the body is iterated, saved or
+parsed, so large downloads can be written out in constant memory. JSON and
+XML are parsed, and XML pretty-printed, on first use only.
+"""
+import simplejson
+
+from . import core
+
+CHUNK_SIZE = 64 * 1024
+
+
+class WsResponse(object):
+    """
+    A streamed web service response.
+
+    Either iterate the body (iter_content, iter_lines, save) or read it whole
+    (content, text, json, xml, formatted); a body that has been iterated
+    cannot be read whole afterwards. Close the response, or use it as a
+    context manager, when the body is not read to the end.
+
+    Arguments:
+        response -- the requests.Response, sent with stream=True
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = response.url
+        self._json = None
+        self._xml = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.response.close()
+
+    @property
+    def contentType(self):
+        return self.headers.get("Content-Type", "").split(";", 1)[0].strip()
+
+    def iter_content(self, chunkSize=CHUNK_SIZE):
+        """
+        Yields the body in chunks of up to chunkSize bytes.
+        """
+        return self.response.iter_content(chunkSize)
+
+    def __iter__(self):
+        return self.iter_content()
+
+    def iter_lines(self, chunkSize=CHUNK_SIZE):
+        """
+        Yields the body line by line, as bytes without the line endings.
+        """
+        return self.response.iter_lines(chunkSize)
+
+    def save(self, fileobj_or_path, chunkSize=CHUNK_SIZE):
+        """
+        Writes the body to a binary file object or a path, a chunk at a
+        time, closes the response and returns the number of bytes written.
+        """
+        if isinstance(fileobj_or_path, str):
+            with open(fileobj_or_path, "wb") as f:
+                return self.save(f, chunkSize)
+        written = 0
+        try:
+            for chunk in self.iter_content(chunkSize):
+                fileobj_or_path.write(chunk)
+                written += len(chunk)
+        finally:
+            self.close()
+        return written
+
+    @property
+    def content(self):
+        return self.response.content
+
+    @property
+    def text(self):
+        return self.response.text
+
+    def json(self):
+        """
+        Returns the body parsed as JSON, parsing it on the first call.
+        """
+        if self._json is None:
+            self._json = simplejson.loads(self.content)
+        return self._json
+
+    def xml(self):
+        """
+        Returns the body as an xml.dom.minidom Document, parsing it on the
+        first call.
+        """
+        if self._xml is None:
+            import xml.dom.minidom
+            self._xml = xml.dom.minidom.parseString(self.content)
+        return self._xml
+
+    def formatted(self):
+        """
+        Returns the body as text, pretty-printed when it is XML.
+        See core.get_formatted_response.
+        """
+        if self._xml is not None:
+            return self._xml.toprettyxml()
+        return core.get_formatted_response(self.headers, self.text)
+
+    def raise_for_status(self):
+        self.response.raise_for_status()
+
+    def __repr__(self):
+        return "<WsResponse [%s]>" % self.status_code
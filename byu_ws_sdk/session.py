@@ -0,0 +1,175 @@
+"""
+Caching and proactive renewal of WsSession keys.
+
+get_ws_session logs in to CAS for a keypair that expires at its expireDate.
+WsSessionManager keeps that keypair, renews it in the background shortly
+before it expires and makes sure concurrent callers that find it expired
+share a single renewal request.
+"""
+import threading
+import time
+
+from . import core
+from .validation import parse_timestamp
+
+MIN_REFRESH_INTERVAL = 1  # seconds the background thread waits after a renewal, whatever the margin
+
+
+class WsSessionManager(object):
+    """
+    Holds a WsSession keypair and keeps it fresh.
+
+    Arguments:
+        casNetId      -- the NetId to log in with
+        casPassword   -- its password
+        casTimeout    -- lifetime of each WsSession in minutes, 1 to 480 (default 60)
+        client        -- the WsClient used to call the session service (default client.get_default_client())
+        refreshMargin -- renew this many seconds before the session expires, at most half its
+                         lifetime (default 60)
+        retryDelay    -- seconds between background renewal attempts after a failure (default 5)
+        background    -- renew in a background thread instead of only on demand (default True)
+
+    Also accepts any number of other keyword arguments that are passed to
+    get_ws_session.
+    """
+
+    def __init__(self, casNetId, casPassword, casTimeout=60, client=None, refreshMargin=60, retryDelay=5,
+                 background=True, clock=time.time, **kwargs):
+        self.casNetId = casNetId
+        self.casPassword = casPassword
+        self.casTimeout = casTimeout
+        self.client = client
+        self.refreshMargin = refreshMargin
+        self.retryDelay = retryDelay
+        self.background = background
+        self.clock = clock
+        self.kwargs = kwargs
+        self.refreshes = 0
+        self.failures = 0
+        self.lastRefreshLatency = None
+        self.totalRefreshLatency = 0.0
+        self.lastError = None
+        self._session = None
+        self._expires = 0
+        self._generation = 0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def stats(self):
+        return {"refreshes": self.refreshes, "failures": self.failures,
+                "last_refresh_latency": self.lastRefreshLatency,
+                "mean_refresh_latency": self.totalRefreshLatency / self.refreshes if self.refreshes else None,
+                "expires_in": self._expires - self.clock() if self._session else None}
+
+    def _margin(self):
+        # a margin as long as the session would have it renewed on every use
+        return min(self.refreshMargin, self.casTimeout * 60 / 2.0)
+
+    def _fresh(self, now):
+        return self._session is not None and now < self._expires - self._margin()
+
+    def get(self):
+        """
+        Returns the current session dict ({'apiKey': ..., 'sharedSecret': ..., ...}),
+        renewing it first when it is missing or about to expire.
+        """
+        if self._fresh(self.clock()):
+            return self._session
+        return self.refresh(force=False)
+
+    @property
+    def apiKey(self):
+        return self.get()["apiKey"]
+
+    @property
+    def sharedSecret(self):
+        return self.get()["sharedSecret"]
+
+    def refresh(self, force=True):
+        """
+        Renew the session and return it. Only one renewal runs at a time;
+        callers that queued behind it share its result or its error.
+        """
+        generation = self._generation
+        with self._refresh_lock:
+            if self._generation != generation:
+                # another thread renewed (or failed to) while we waited
+                if self._session is not None and self.clock() < self._expires:
+                    return self._session
+                if self.lastError is not None:
+                    raise self.lastError
+            elif not force and self._fresh(self.clock()):
+                return self._session
+            return self._renew()
+
+    def _client(self):
+        if self.client is None:
+            from .client import get_default_client
+            return get_default_client()
+        return self.client
+
+    def _renew(self):
+        # must hold self._refresh_lock
+        client = self._client()
+        started = self.clock()
+        try:
+            session = client.get_ws_session(self.casNetId, self.casPassword, self.casTimeout, **self.kwargs)
+        except Exception as e:
+            self.failures += 1
+            self.lastError = e
+            self._generation += 1
+            raise
+        now = self.clock()
+        self.lastRefreshLatency = now - started
+        self.totalRefreshLatency += self.lastRefreshLatency
+        self.refreshes += 1
+        self.lastError = None
+        self._expires = self._expiry(session, now)
+        self._session = session
+        self._generation += 1
+        self._start_background()
+        return session
+
+    def _expiry(self, session, now):
+        expires = now + self.casTimeout * 60
+        expire_date = parse_timestamp(session.get("expireDate", ""))
+        if expire_date is not None and now < expire_date < expires:
+            expires = expire_date
+        return expires
+
+    def _start_background(self):
+        if self.background and self._thread is None and not self._stop.is_set():
+            self._thread = threading.Thread(target=self._refresh_loop, name="ws-session-%s" % self.casNetId)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            delay = self._expires - self._margin() - self.clock()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            try:
+                self.refresh()
+            except Exception:
+                self._stop.wait(self.retryDelay)
+            else:
+                self._stop.wait(MIN_REFRESH_INTERVAL)
+
+    def get_http_authorization_header(self, encodingType, url="", requestBody=None, actor="", contentType=None,
+                                      httpMethod=None, actorInHash=False):
+        """
+        Sign a request with the current WsSession keypair.
+
+        See core.get_http_authorization_header.
+        """
+        session = self.get()
+        client = self._client()
+        return client.get_http_authorization_header(session["apiKey"], session["sharedSecret"],
+                                                    core.KEY_TYPE_WSSESSION, encodingType, url, requestBody, actor,
+                                                    contentType, httpMethod, actorInHash=actorInHash)
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,320 @@
+"""
+Caches shared by all the worker processes of a pre-fork server on one host.
+
+A SharedStore is a file of fixed-size slots mapped into every process that
+opens it, best kept on a tmpfs such as /dev/shm. Reads take no lock: each
+slot carries a sequence number that writers make odd while they change the
+slot and even again when they are done, and a reader that sees it odd or
+changed while it copied the slot reads again (a seqlock). Writers take an
+flock on a lock file next to the store, so they are serialized across
+processes; the store is a cache, and a key whose slots are all taken evicts
+the entry that expires first.
+
+On top of it:
+
+SharedValidationCache is a ValidationCache whose results every worker sees,
+so a header validated by one worker is not validated again by the others.
+
+SharedWsSession is a WsSessionManager whose keypair is kept in the store.
+Renewals are done by whichever worker wins an flock on the session's lock
+file; the others wait for it and use the keypair it stored, so the whole
+host logs in once per renewal instead of once per worker.
+
+Nonces are not shared: every nonce can be used only once.
+
+Locks are taken through files opened by each process itself, so stores
+opened before a fork keep working in the forked workers. Needs fcntl, so
+POSIX only.
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .session import WsSessionManager
+from .validation import ValidationCache
+
+_MAGIC = b"BYUWSSC1"
+_HEADER = struct.Struct("<8sII")  # magic, slots, slotSize
+_SLOT = struct.Struct("<QdHH")  # sequence, expires, key length, value length
+_PROBES = 4  # slots a key may live in
+_READ_TRIES = 100
+
+
+class SharedStore(object):
+    """
+    A fixed-size, mmap-backed key/value store shared between processes.
+
+    Every process opening the same path with the same slots and slotSize
+    sees the same entries. Keys are strings and values bytes; a key and its
+    value must fit in slotSize - 20 bytes.
+
+    Arguments:
+        path     -- the file to map, created when missing, e.g. under /dev/shm
+        slots    -- number of entries it holds (default 4096)
+        slotSize -- bytes per entry (default 512)
+    """
+
+    def __init__(self, path, slots=4096, slotSize=512, clock=time.time):
+        if slotSize <= _SLOT.size + 1:
+            raise Exception("slotSize must be more than %d bytes" % (_SLOT.size + 1))
+        self.path = path
+        self.slots = slots
+        self.slotSize = slotSize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.retries = 0
+        self._lockFiles = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        size = _HEADER.size + slots * slotSize
+        with self.locked("write"):
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _HEADER.pack(_MAGIC, slots, slotSize), 0)
+                self._mm = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+        magic, existingSlots, existingSize = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or (existingSlots, existingSize) != (slots, slotSize):
+            self._mm.close()
+            raise Exception("%s is not a store with %d slots of %d bytes" % (path, slots, slotSize))
+
+    def __len__(self):
+        now = self.clock()
+        return len([i for i in range(self.slots) if self._live(self._read(i), now)])
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "retries": self.retries,
+                "entries": len(self)}
+
+    @contextlib.contextmanager
+    def locked(self, name):
+        """
+        Holds an exclusive flock on the lock file `<path>.<name>.lock` for the
+        duration of the with block, also excluding other threads.
+        """
+        with self._lock:
+            if self._pid != os.getpid():  # forked: the inherited files share their locks with the parent
+                self._lockFiles = {}
+                self._pid = os.getpid()
+            entry = self._lockFiles.get(name)
+            if entry is None:
+                fd = os.open("%s.%s.lock" % (self.path, name), os.O_RDWR | os.O_CREAT, 0o600)
+                entry = self._lockFiles[name] = (fd, threading.Lock())
+        fd, threadLock = entry
+        with threadLock:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _slots(self, key):
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        first = struct.unpack("<Q", digest)[0] % self.slots
+        return [(first + i) % self.slots for i in range(_PROBES)]
+
+    def _read(self, index):
+        # returns a consistent copy of the slot, or None when writers kept changing it
+        mm = self._mm
+        start = _HEADER.size + index * self.slotSize
+        for _ in range(_READ_TRIES):
+            sequence = struct.unpack_from("<Q", mm, start)[0]
+            if not sequence & 1:
+                raw = mm[start:start + self.slotSize]
+                if struct.unpack_from("<Q", mm, start)[0] == sequence:
+                    return raw
+            self.retries += 1
+        return None
+
+    @staticmethod
+    def _live(raw, now):
+        return raw is not None and _SLOT.unpack_from(raw)[1] > now
+
+    @staticmethod
+    def _entry(raw):
+        _, expires, keyLength, valueLength = _SLOT.unpack_from(raw)
+        start = _SLOT.size
+        return expires, raw[start:start + keyLength], raw[start + keyLength:start + keyLength + valueLength]
+
+    def get(self, key):
+        """
+        Returns the value stored under key, or None when there is none or it
+        has expired. Takes no lock.
+        """
+        key = key.encode("utf-8")
+        now = self.clock()
+        for index in self._slots(key):
+            raw = self._read(index)
+            if raw is None:
+                continue
+            expires, slotKey, value = self._entry(raw)
+            if slotKey == key and expires > now:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value, expires):
+        """
+        Store value under key until expires (seconds since the epoch).
+        Returns False when the key and value do not fit in a slot.
+        """
+        key = key.encode("utf-8")
+        if _SLOT.size + len(key) + len(value) > self.slotSize:
+            return False
+        with self.locked("write"):
+            now = self.clock()
+            target = None
+            soonest = None
+            for index in self._slots(key):
+                slotExpires, slotKey, _ = self._entry(self._read(index))
+                if slotKey == key or slotExpires <= now:
+                    target = index
+                    break
+                if soonest is None or slotExpires < soonest[0]:
+                    soonest = (slotExpires, index)
+            if target is None:
+                target = soonest[1]
+            self._write(target, _SLOT.pack(0, expires, len(key), len(value))[8:] + key + value)
+            self.writes += 1
+        return True
+
+    def delete(self, key):
+        key = key.encode("utf-8")
+        with self.locked("write"):
+            for index in self._slots(key):
+                if self._entry(self._read(index))[1] == key:
+                    self._write(index, _SLOT.pack(0, 0, 0, 0)[8:])
+
+    def clear(self):
+        with self.locked("write"):
+            for index in range(self.slots):
+                self._write(index, _SLOT.pack(0, 0, 0, 0)[8:])
+
+    def _write(self, index, body):
+        # must hold the write lock; body is the slot without its sequence number
+        mm = self._mm
+        start = _HEADER.size + index * self.slotSize
+        sequence = struct.unpack_from("<Q", mm, start)[0]
+        struct.pack_into("<Q", mm, start, sequence + 1)
+        mm[start + 8:start + 8 + len(body)] = body
+        struct.pack_into("<Q", mm, start, sequence + 2)
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for fd, _ in self._lockFiles.values():
+                    os.close(fd)
+            self._lockFiles = {}
+        self._mm.close()
+
+
+class SharedValidationCache(ValidationCache):
+    """
+    A ValidationCache kept in a SharedStore, for WsClient(validationCache=...)
+    in every worker.
+
+    Arguments:
+        store       -- the SharedStore
+        maxAge      -- seconds after the header timestamp an entry stays valid (default 300)
+        negativeTtl -- seconds to remember failed validations, 0 disables (default 0)
+    """
+
+    PREFIX = "v:"
+
+    def __init__(self, store, maxAge=300, negativeTtl=0, clock=time.time):
+        ValidationCache.__init__(self, maxAge=maxAge, negativeTtl=negativeTtl, clock=clock)
+        self.sharedStore = store
+
+    def __len__(self):
+        return len(self.sharedStore)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "hit_rate": self.hit_rate}
+
+    def lookup(self, key):
+        value = self.sharedStore.get(self.PREFIX + key)
+        if value is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, value[1:].decode("utf-8") if value[:1] == b"+" else None
+
+    def store(self, key, personId, timestamp):
+        expires = self.expires(personId, timestamp, self.clock())
+        if expires is not None:
+            value = b"-" if personId is None else b"+" + personId.encode("utf-8")
+            self.sharedStore.set(self.PREFIX + key, value, expires)
+
+    def clear(self):
+        self.sharedStore.clear()
+
+
+class SharedWsSession(WsSessionManager):
+    """
+    A WsSessionManager whose keypair is shared through a SharedStore, so
+    one renewal serves every worker on the host.
+
+    Arguments:
+        casNetId, casPassword, casTimeout, client, refreshMargin, retryDelay, background
+                -- as for WsSessionManager
+        store   -- the SharedStore
+
+    Also accepts any number of other keyword arguments that are passed to
+    get_ws_session.
+    """
+
+    def __init__(self, casNetId, casPassword, store, casTimeout=60, client=None, refreshMargin=60, retryDelay=5,
+                 background=True, clock=time.time, **kwargs):
+        WsSessionManager.__init__(self, casNetId, casPassword, casTimeout, client, refreshMargin, retryDelay,
+                                  background, clock, **kwargs)
+        self.sharedStore = store
+        digest = hashlib.sha256(("%s\n%s" % (casNetId, casTimeout)).encode("utf-8")).hexdigest()[:32]
+        self.key = "s:" + digest
+        self.lockName = "session-" + digest
+        self.adopted = 0
+
+    def get(self):
+        if self._fresh(self.clock()):
+            return self._session
+        self._load()  # another worker may have renewed it already
+        if self._fresh(self.clock()):
+            return self._session
+        return self.refresh(force=False)
+
+    def _load(self):
+        value = self.sharedStore.get(self.key)
+        if value is None:
+            return False
+        stored = json.loads(value.decode("utf-8"))
+        if self._session is not None and stored["session"]["apiKey"] == self._session["apiKey"]:
+            return False
+        self._session = stored["session"]
+        self._expires = stored["expires"]
+        self.adopted += 1
+        return True
+
+    def _renew(self):
+        # must hold self._refresh_lock; the flock elects one worker to log in
+        with self.sharedStore.locked(self.lockName):
+            if self._load() and self._fresh(self.clock()):  # the worker before us renewed it
+                self._start_background()
+                return self._session
+            session = WsSessionManager._renew(self)
+            value = json.dumps({"session": session, "expires": self._expires}).encode("utf-8")
+            if not self.sharedStore.set(self.key, value, self._expires):
+                raise Exception("The WsSession does not fit in a slot of %s" % self.sharedStore.path)
+            return session
@@ -0,0 +1,136 @@
+"""
+Precomputed signing for callers that sign many requests with one key.
+
+A Signer keys the HMAC once for its shared secret and copies that state for
+every message, and builds its header prefixes once. sign_many uses a Signer
+per batch, takes timestamps from core.timestamps and can spread the work
+over a process pool. The headers are the same as
+get_http_authorization_header returns.
+"""
+import base64
+import collections
+import hashlib
+import hmac
+
+from . import core
+
+
+def _keyed_hmac(sharedSecret):
+    if not isinstance(sharedSecret, bytes):
+        sharedSecret = sharedSecret.encode("utf-8")
+    return hmac.new(sharedSecret, digestmod=hashlib.sha512)
+
+
+class Signer(object):
+    """
+    Signs requests for one (apiKey, sharedSecret, keyType).
+
+    url_encode and nonce_encode return the same digests as the functions of
+    the same name in core; url_header and nonce_header return the same values
+    as get_http_authorization_header.
+    """
+
+    def __init__(self, apiKey, sharedSecret, keyType=core.KEY_TYPE_API):
+        if not core.valid_key_type(keyType):
+            raise Exception("keyType must be one of %s" % " or ".join(core.VALID_KEY_TYPES))
+        self.apiKey = apiKey
+        self.keyType = keyType
+        self._keyed = _keyed_hmac(sharedSecret)
+        self._url_prefix = "%s-Encoded-%s-Key %s," % (core.ENCODING_URL, keyType, apiKey)
+        self._nonce_prefix = "%s-Encoded-%s-Key %s," % (core.ENCODING_NONCE, keyType, apiKey)
+
+    def sign(self, message):
+        """
+        Returns the base64 encoded HMAC-SHA512 of message (bytes).
+        """
+        mac = self._keyed.copy()
+        mac.update(message)
+        return base64.b64encode(mac.digest())
+
+    def url_encode(self, current_timestamp, url, requestBody="", contentType=None, httpMethod=None, actor=None,
+                   actorInHash=False):
+        if core._is_stream(requestBody):
+            from .streaming import message_chunks
+            mac = self._keyed.copy()
+            for chunk in message_chunks(url, requestBody, contentType, httpMethod, actor, current_timestamp,
+                                        actorInHash):
+                mac.update(chunk)
+            return base64.b64encode(mac.digest())
+        return self.sign(core._url_encode_message(url, requestBody, contentType, httpMethod, actor,
+                                                  current_timestamp, actorInHash))
+
+    def nonce_encode(self, nonceValue):
+        if not isinstance(nonceValue, bytes):
+            nonceValue = nonceValue.encode("utf-8")
+        return self.sign(nonceValue)
+
+    def url_header(self, url="", requestBody=None, actor="", contentType=None, httpMethod=None, actorInHash=False,
+                   timestamp=None):
+        """
+        Returns the URL-Encoded Authorization header value for a request,
+        signed at timestamp (default now).
+        """
+        if timestamp is None:
+            timestamp = core.timestamps()
+        digest = self.url_encode(timestamp, url, requestBody, contentType, httpMethod, actor,
+                                 actorInHash).decode("ascii")
+        if actor:
+            return self._url_prefix + digest + "," + timestamp + "," + actor
+        return self._url_prefix + digest + "," + timestamp
+
+    def nonce_header(self, nonce):
+        """
+        Returns the Nonce-Encoded Authorization header value for a nonce dict
+        as returned by get_nonce.
+        """
+        digest = self.nonce_encode(nonce["nonceValue"]).decode("ascii")
+        return self._nonce_prefix + "%s,%s" % (nonce["nonceKey"], digest)
+
+
+def _sign_chunk(apiKey, sharedSecret, keyType, actorInHash, chunk):
+    return list(_sign_iter(Signer(apiKey, sharedSecret, keyType), actorInHash, chunk))
+
+
+def _sign_iter(signer, actorInHash, requests):
+    timestamps = core.timestamps
+    for request in requests:
+        url, requestBody, contentType, httpMethod, actor = (tuple(request) + (None,) * 4)[:5]
+        yield signer.url_header(url, requestBody, actor, contentType, httpMethod, actorInHash, timestamps())
+
+
+def sign_many(requests, apiKey, sharedSecret, keyType=core.KEY_TYPE_API, actorInHash=False, processes=None,
+              chunkSize=500):
+    """
+    Sign an iterable of requests with URL encoding, yielding one
+    Authorization header value per request, in order.
+
+    Each request is a tuple (url, requestBody, contentType, httpMethod, actor);
+    trailing items may be left off.
+
+    Arguments:
+        processes  -- sign on a pool of this many worker processes (default None, sign in this process)
+        chunkSize  -- number of requests sent to a worker at a time (default 500)
+    """
+    signer = Signer(apiKey, sharedSecret, keyType)
+    if not processes:
+        for header in _sign_iter(signer, actorInHash, requests):
+            yield header
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(processes) as executor:
+        pending = collections.deque()
+        chunk = []
+        for request in requests:
+            chunk.append(request)
+            if len(chunk) == chunkSize:
+                pending.append(executor.submit(_sign_chunk, apiKey, sharedSecret, keyType, actorInHash, chunk))
+                chunk = []
+                if len(pending) >= processes * 2:
+                    for header in pending.popleft().result():
+                        yield header
+        if chunk:
+            pending.append(executor.submit(_sign_chunk, apiKey, sharedSecret, keyType, actorInHash, chunk))
+        while pending:
+            for header in pending.popleft().result():
+                yield header
@@ -0,0 +1,111 @@
+"""
+Collapsing identical concurrent calls into one.
+
+When several threads (or tasks) make the same idempotent call at the same
+moment, such as validating one Authorization header or logging in to the
+same WsSession, SingleFlight lets the first one run and hands its result, or
+its exception, to the others. Calls that start after it finished run again;
+nothing is cached.
+
+Nonce fetches must never be collapsed: every caller needs a nonce of its own.
+"""
+import threading
+
+
+class _Call(object):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self, done):
+        self.done = done
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time across threads.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    @property
+    def stats(self):
+        return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": len(self._calls)}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Returns fn(*args, **kwargs), sharing the outcome with every other
+        caller that asks for the same key while it runs.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(threading.Event())
+                self.calls += 1
+            else:
+                self.collapsed += 1
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class AsyncSingleFlight(object):
+    """
+    Runs at most one call per key at a time across the tasks of one event
+    loop. fn is a coroutine function.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    @property
+    def stats(self):
+        return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": len(self._calls)}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Returns await fn(*args, **kwargs), sharing the outcome with every
+        other task that asks for the same key while it runs.
+
+        The call runs in a task of its own, so cancelling any of the tasks
+        waiting for it, the first one included, cancels only that task.
+        """
+        import asyncio
+        task = self._calls.get(key)
+        if task is not None and not task.done():
+            self.collapsed += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn(*args, **kwargs))
+            self.calls += 1
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even when every caller was cancelled, so it is not logged as lost
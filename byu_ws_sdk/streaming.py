@@ -0,0 +1,133 @@
+"""
+Signing and sending large request bodies without loading them into memory.
+
+Wrap a body in a FileBody (or let as_body do it) and pass the same object to
+get_http_authorization_header / Signer.url_header and then to
+send_ws_request. Generators and other one-shot iterables must go through
+as_body first; the signers refuse them rather than use them up. The signer feeds the HMAC chunk by chunk and rewinds the
+body afterwards, so requests can stream it from the start with the right
+Content-Length.
+"""
+import itertools
+
+from . import core
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+
+class FileBody(object):
+    """
+    A rewindable, length-aware view of a binary file object, mmap or
+    io.BytesIO from its current position to its end.
+
+    Arguments:
+        fileobj               -- the object to read, opened in binary mode
+        stripTrailingNewlines -- leave trailing b"\\n" bytes out, as get_body_from_file does (default False)
+        chunkSize             -- bytes read at a time when signing or iterating (default CHUNK_SIZE)
+    """
+
+    def __init__(self, fileobj, stripTrailingNewlines=False, chunkSize=CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunkSize = chunkSize
+        self.start = fileobj.tell()
+        fileobj.seek(0, 2)
+        end = fileobj.tell()
+        if stripTrailingNewlines:
+            end = self._strip_newlines(end)
+        self.length = end - self.start
+        self.rewind()
+
+    def _strip_newlines(self, end):
+        while end > self.start:
+            size = min(self.chunkSize, end - self.start)
+            self.fileobj.seek(end - size)
+            block = self.fileobj.read(size)
+            stripped = block.rstrip(b"\n")
+            end -= len(block) - len(stripped)
+            if stripped:
+                break
+        return end
+
+    def rewind(self):
+        self.fileobj.seek(self.start)
+        self._remaining = self.length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self.fileobj.read(size) if size else b""
+        self._remaining -= len(data)
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunkSize), b"")
+
+    def close(self):
+        self.fileobj.close()
+
+
+def open_body(file_name, stripTrailingNewlines=True):
+    """
+    The streaming counterpart of get_body_from_file: returns a FileBody for
+    the file without reading it, with trailing newlines left out.
+    """
+    return FileBody(open(file_name, "rb"), stripTrailingNewlines)
+
+
+def as_body(requestBody):
+    """
+    Returns requestBody as a FileBody.
+
+    File objects and mmaps are wrapped in place. Other iterables of byte
+    chunks are read once into a temporary file that stays in memory up to
+    SPOOL_SIZE bytes and spills to disk beyond that; pass the returned body
+    to both the signer and send_ws_request.
+    """
+    if isinstance(requestBody, FileBody):
+        return requestBody
+    if hasattr(requestBody, "read") and hasattr(requestBody, "seek"):
+        return FileBody(requestBody)
+    import tempfile  # only bodies that need spooling pay for importing it
+    spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    for chunk in requestBody:
+        spool.write(chunk)
+    spool.seek(0)
+    return FileBody(spool)
+
+
+def message_chunks(url, requestBody, contentType, httpMethod, actor, current_timestamp, actorInHash):
+    """
+    Yields the bytes url_encode signs for a streamed requestBody, in chunks.
+
+    Raises TypeError for bodies that cannot be rewound, such as generators:
+    signing would use them up before they are sent.
+    """
+    if not isinstance(requestBody, FileBody) and not (hasattr(requestBody, "read") and hasattr(requestBody, "seek")):
+        raise TypeError("A %s request body cannot be signed without using it up; sign and send the FileBody "
+                        "that streaming.as_body() returns for it instead" % type(requestBody).__name__)
+    body = as_body(requestBody)
+    body.rewind()
+    try:
+        chunk = body.read(body.chunkSize)
+        if not chunk:
+            yield core._url_encode_message(url, "", contentType, httpMethod, actor, current_timestamp, actorInHash)
+            return
+        end_str = current_timestamp
+        if actorInHash and actor:
+            end_str += actor
+        if contentType == core.FORM_CONTENT_TYPE:
+            # the parameters are sorted before signing, so they are gathered first
+            chunks = itertools.chain([chunk], iter(lambda: body.read(body.chunkSize), b""))
+            sorted_params = core._sort_params_stream(chunk.decode("ascii") for chunk in chunks)
+            yield (core._form_message(url, httpMethod, sorted_params) + end_str).encode("ascii")
+            return
+        while chunk:
+            yield chunk
+            chunk = body.read(body.chunkSize)
+        yield end_str.encode("ascii")
+    finally:
+        body.rewind()
@@ -0,0 +1,193 @@
+"""
+A local stand-in for the ws.byu.edu authentication endpoints, used by the
+tests, the benchmarks and `byu-ws-sdk bench`.
+
+The stub answers the nonce, WsSession and validate services under the same
+paths as the real service, serves /download/<size> bytes, a small /xml
+document and a /cached resource with an ETag, answers /empty/<status> with
+that status and no body, and echoes every other request back as JSON.
+"""
+import base64
+import json
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+AUTH_PATH = "/authentication/services/rest/v1"
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status, payload, content_type="application/json", headers=()):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _download(self, size):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        block = b"x" * 65536
+        while size > 0:
+            self.wfile.write(block[:size])
+            size -= len(block)
+
+    def _handle(self):
+        stub = self.server.stub
+        body = self._read_body()
+        path = self.path.split("?", 1)[0]
+        with stub.lock:
+            stub.requests += 1
+            if stub.record:
+                stub.calls.append((self.command, path))
+                stub.headers.append(dict(self.headers))
+            stub.connections.add(self.client_address)
+            delay = stub.delays.pop(0) if stub.delays else stub.delay
+            status = stub.failures.pop(0) if stub.failures else None
+            stub.active += 1
+            stub.peak = max(stub.peak, stub.active)
+        try:
+            self._answer(stub, path, body, delay, status)
+        finally:
+            with stub.lock:
+                stub.active -= 1
+
+    def _answer(self, stub, path, body, delay, status):
+        if delay:
+            time.sleep(delay)
+        if status:
+            self._reply(status, {"error": "injected failure"})
+        elif path.startswith(AUTH_PATH + "/hmac/nonce/"):
+            self._reply(200, stub.next_nonce())
+        elif path == AUTH_PATH + "/ws/session":
+            self._reply(200, stub.session)
+        elif path == AUTH_PATH + "/provider/URL-Encoded-API-Key/validate":
+            if stub.personId:
+                self._reply(200, {"personId": stub.personId})
+            else:
+                self._reply(401, {"error": "invalid"})
+        elif path.startswith("/download/"):
+            self._download(int(path.rsplit("/", 1)[1]))
+        elif path == "/xml":
+            self._reply(200, b"<a><b>1</b></a>", "text/xml; charset=utf-8")
+        elif path == "/cached":
+            self._cached(stub)
+        elif path.startswith("/empty/"):
+            self.send_response(int(path.rsplit("/", 1)[1]))
+            self.end_headers()
+        else:
+            self._reply(200, {"method": self.command, "path": self.path,
+                              "authorization": self.headers.get("Authorization"),
+                              "body": body.decode("utf-8", "replace")})
+
+    def _cached(self, stub):
+        etag = '"v%d"' % stub.version
+        headers = [("ETag", etag), ("Cache-Control", stub.cacheControl)]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+        else:
+            self._reply(200, {"version": stub.version, "padding": "x" * 1000}, headers=headers)
+
+    do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+
+class StubServer(object):
+    """
+    Runs the stub on a random local port in a background thread.
+
+    Use it as a context manager; `url` is the base url of the server and
+    `authBaseUrl` the base url of its authentication services. `delay` slows
+    every response down; `delays` and `failures` are consumed one per request
+    to slow down or fail (with that status code) the next few requests.
+    `peak` is the most requests the stub has been answering at once, and
+    `headers` the request headers of every call, in order. /cached serves
+    `version` with an ETag and the Cache-Control header `cacheControl`.
+    It listens on `port` of `host`, by default a free port on 127.0.0.1.
+    Pass record=False for long runs to only count `requests` rather than
+    keep every call.
+    """
+
+    def __init__(self, personId=None, delay=0, host="127.0.0.1", port=0, record=True):
+        self.personId = personId
+        self.delay = delay
+        self.delays = []
+        self.failures = []
+        self.session = {"personId": "123456789", "apiKey": "stub-ws-session-key",
+                        "expireDate": "2099-01-01 00:00:00", "sharedSecret": "stub-shared-secret"}
+        self.record = record
+        self.requests = 0
+        self.calls = []
+        self.headers = []
+        self.version = 1
+        self.cacheControl = "max-age=0"
+        self.connections = set()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self._nonce_counter = 0
+        self._server = _ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    @property
+    def authBaseUrl(self):
+        return self.url + AUTH_PATH
+
+    def next_nonce(self):
+        with self.lock:
+            self._nonce_counter += 1
+            key = str(self._nonce_counter)
+        value = base64.b64encode(os.urandom(64)).decode("ascii")
+        return {"nonceKey": key, "nonceValue": value}
+
+    def count(self, fragment):
+        with self.lock:
+            return len([path for _, path in self.calls if fragment in path])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestAsyncWsClient(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def run_client(self, coro_fn, **kwargs):
+        async def main():
+            kwargs.setdefault('timeout', 5)
+            async with oit.AsyncWsClient(authBaseUrl=self.stub.authBaseUrl, **kwargs) as client:
+                return await coro_fn(client)
+        return asyncio.run(main())
+
+    def test_get_nonce_and_session(self):
+        async def calls(client):
+            return await client.get_nonce(self.apiKey, 'actor'), await client.get_ws_session('netid', 'pw')
+        nonce, session = self.run_client(calls)
+        self.assertTrue('nonceValue' in nonce)
+        self.assertEqual(session['apiKey'], 'stub-ws-session-key')
+        self.assertEqual(self.stub.count('/hmac/nonce/%s/actor' % self.apiKey), 1)
+
+    def test_url_header_matches_sync(self):
+        async def sign(client):
+            return await client.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                              oit.ENCODING_URL, 'http://www.byu.edu/', 'p=1&a=2',
+                                                              'pd123', 'application/x-www-form-urlencoded',
+                                                              'POST', actorInHash=True)
+        seconds = time.mktime(time.strptime('2016-01-01 12:00:00', oit.TIMESTAMP_FORMAT))
+        with mock.patch('byu_ws_sdk.core.timestamps', oit.TimestampCache(clock=lambda: seconds)):
+            async_header = self.run_client(sign)
+            sync_header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                            oit.ENCODING_URL, 'http://www.byu.edu/', 'p=1&a=2',
+                                                            'pd123', 'application/x-www-form-urlencoded',
+                                                            'POST', actorInHash=True)
+        self.assertEqual(async_header, sync_header)
+
+    def test_nonce_header(self):
+        async def sign(client):
+            return await client.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                              oit.ENCODING_NONCE)
+        self.assertTrue(self.run_client(sign).startswith('Nonce-Encoded-API-Key %s,1,' % self.apiKey))
+
+    def test_send_ws_request_reuses_connections(self):
+        async def send(client):
+            results = await asyncio.gather(*[client.send_ws_request(self.stub.url + '/echo?x=%d' % i, 'POST', 'b')
+                                             for i in range(4)])
+            for i in range(4):
+                results.append(await client.send_ws_request(self.stub.url + '/echo', 'GET'))
+            return results
+        results = self.run_client(send, transport=oit.AsyncioTransport(limit=2))
+        self.assertEqual([status for _, status, _, _ in results], [200] * 8)
+        self.assertTrue(b'"POST"' in results[0][0])
+        self.assertEqual(len(self.stub.connections), 2)
+
+    def test_responses_without_a_body(self):
+        async def send(client):
+            results = [await client.send_ws_request(self.stub.url + '/empty/204', 'DELETE')]
+            results.append(await client.send_ws_request(self.stub.url + '/cached', 'GET'))
+            etag = results[-1][2]['ETag']
+            results.append(await client.send_ws_request(self.stub.url + '/cached', 'GET',
+                                                        headers={'If-None-Match': etag}))
+            results.append(await client.send_ws_request(self.stub.url + '/echo', 'GET'))
+            return results
+        results = self.run_client(send, transport=oit.AsyncioTransport(), timeout=2)
+        self.assertEqual([status for _, status, _, _ in results], [204, 200, 304, 200])
+        self.assertEqual(results[0][0], b'')
+        self.assertEqual(results[2][0], b'')
+        self.assertEqual(len(self.stub.connections), 1)
+
+    def test_default_timeout(self):
+        self.assertEqual(oit.AsyncWsClient().timeout, oit.aio.DEFAULT_TIMEOUT)
+
+    def test_nonce_errors_raise(self):
+        async def nonce(client):
+            return await client.get_nonce(self.apiKey)
+        self.stub.failures = [500]
+        self.assertRaises(oit.WebServiceError, self.run_client, nonce)
+
+    def test_authorize_request(self):
+        header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                   oit.ENCODING_URL, 'http://www.byu.edu/', '')
+        cache = oit.ValidationCache()
+
+        async def authorize(client):
+            return [await client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+                    for _ in range(2)]
+        self.assertEqual(self.run_client(authorize, validationCache=cache), ['123456789'] * 2)
+        self.assertEqual(self.stub.count('/validate'), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
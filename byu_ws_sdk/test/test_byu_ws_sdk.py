@@ -1,6 +1,8 @@
+import time
 import unittest
+from unittest import mock
 import byu_ws_sdk as oit
-from byu_ws_sdk.core import _split_url, _sort_params
+from byu_ws_sdk.core import _split_url, _sort_params, _sort_params_stream
 
 
 class TestOITWebServicesLibrary(unittest.TestCase):
@@ -43,6 +45,18 @@ class TestOITWebServicesLibrary(unittest.TestCase):
         self.assertTrue(rv == "done=true&i=paul")
         rv = _sort_params("done=true")
         self.assertTrue(rv == "done=true")
+        rv = _sort_params("b=2&&a=1&")
+        self.assertTrue(rv == "a=1&b=2")
+        rv = _sort_params("flag&a=1&a=")
+        self.assertTrue(rv == "a=1,&flag=")
+
+    def test__sort_params_stream(self):
+        body = "p=1&a=9&a=0&done=true&&i=paul&flag"
+        for size in (1, 2, 3, 5, len(body)):
+            chunks = [body[i:i + size] for i in range(0, len(body), size)]
+            self.assertEqual(_sort_params_stream(chunks), _sort_params(body))
+        self.assertEqual(_sort_params_stream(["don", "e=tr", "ue"]), "done=true")
+        self.assertEqual(_sort_params_stream([]), "")
 
     def test_nonce_encode(self):
         nonceValue = u's9dg3yRQx1rAeH7Tkvd8bn8yi6ZN8G0mKYq5LzhQE5acr4g2Z4x6qpDmcA3owf3DmsozwUtqch/F2bBG6uJNjA=='
@@ -61,6 +75,31 @@ class TestOITWebServicesLibrary(unittest.TestCase):
         self.assertTrue(headerValue2)
         self.assertTrue(headerValue1 != headerValue2)
 
+    def test_get_http_authorization_header_format(self):
+        apiKey = 'YF4i2Qdx2WuSj-G8583M'
+        sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+        seconds = time.mktime(time.strptime('2016-01-01 12:00:00', oit.TIMESTAMP_FORMAT))
+        with mock.patch('byu_ws_sdk.core.timestamps', oit.TimestampCache(clock=lambda: seconds)):
+            header = oit.get_http_authorization_header(apiKey, sharedSecret, "WsSession", "URL",
+                                                       "http://www.byu.edu/", "", "pd123")
+        digest = oit.url_encode(sharedSecret, '2016-01-01 12:00:00', "http://www.byu.edu/").decode('ascii')
+        self.assertEqual(header, 'URL-Encoded-WsSession-Key %s,%s,2016-01-01 12:00:00,pd123' % (apiKey, digest))
+        self.assertRaises(Exception, oit.get_http_authorization_header, apiKey, sharedSecret, "Bogus", "URL")
+        self.assertRaises(Exception, oit.get_http_authorization_header, apiKey, sharedSecret, "API", "Bogus")
+
+    def test_timestamp_cache_formats_once_per_second(self):
+        now = [1451674800.2]
+        timestamps = oit.TimestampCache(clock=lambda: now[0])
+        with mock.patch('byu_ws_sdk.core.time.strftime', wraps=time.strftime) as strftime:
+            first = timestamps()
+            now[0] = 1451674800.9
+            self.assertEqual(timestamps(), first)
+            now[0] = 1451674801.0
+            second = timestamps()
+        self.assertEqual(strftime.call_count, 2)
+        self.assertEqual(first, time.strftime(oit.TIMESTAMP_FORMAT, time.localtime(1451674800)))
+        self.assertEqual(second, time.strftime(oit.TIMESTAMP_FORMAT, time.localtime(1451674801)))
+
     def test_get_nonce(self):
         apiKey = 'YF4i2Qdx2WuSj-G8583M'
         nonce = oit.get_nonce(apiKey, verify=False)
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk import cli
+from byu_ws_sdk.stub import StubServer
+
+
+class TestBench(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.output)
+
+    def bench(self, *args):
+        self.assertEqual(cli.main(['bench', '-o', self.output] + list(args)), 0)
+        with open(self.output) as f:
+            return json.load(f)
+
+    def test_mix_against_the_bundled_stub(self):
+        report = self.bench('--mix', 'url=3,nonce=1', '--body-sizes', '0,300', '--form', '--actors', ',pd123',
+                            '--requests', '80', '--concurrency', '4')
+        self.assertEqual((report['requests'], report['errors'], report['statuses']), (80, 0, {'200': 80}))
+        self.assertTrue(report['config']['stub'])
+        self.assertEqual(sum(kind['requests'] for kind in report['kinds'].values()), 80)
+        self.assertTrue('nonce/pd123/300/form' in report['kinds'])
+        for field in ('p50', 'p90', 'p95', 'p99', 'mean', 'max'):
+            self.assertTrue(report['latency_ms'][field] >= report['sign_ms'][field] >= 0)
+
+    def test_sign_only_and_rate(self):
+        report = self.bench('--sign-only', '--mix', 'nonce', '--requests', '50')
+        self.assertEqual((report['requests'], report['statuses']), (50, {}))
+        report = self.bench('--rate', '100', '--duration', '0.3', '--concurrency', '2')
+        self.assertTrue(20 <= report['requests'] <= 31, report['requests'])
+
+    def test_errors_are_counted(self):
+        with StubServer() as stub:
+            stub.failures = [500] * 3
+            report = self.bench('--url', stub.url + '/x', '--auth-base-url', stub.authBaseUrl, '--requests', '10',
+                                '--concurrency', '1')
+        self.assertEqual((report['errors'], report['error_rate']), (3, 0.3))
+        self.assertFalse(report['config']['stub'])
+
+    def test_request_kinds(self):
+        self.assertEqual(cli._mix('url=3,nonce'), [(oit.ENCODING_URL, 3), (oit.ENCODING_NONCE, 1)])
+        kinds = cli.request_kinds([(oit.ENCODING_URL, 2)], [0, 100], True, ['', 'a'])
+        self.assertEqual(len(kinds), 8)
+        form = [k for k in kinds if k.bodySize == 100][0]
+        self.assertEqual((form.httpMethod, form.contentType), (oit.HTTP_METHOD_POST, oit.FORM_CONTENT_TYPE))
+        self.assertTrue(len(form.body) <= 100 and '&' in form.body)
+        self.assertEqual(kinds[0].httpMethod, oit.HTTP_METHOD_GET)
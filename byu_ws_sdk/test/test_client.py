@@ -0,0 +1,73 @@
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestWsClient(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+        self.client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_get_nonce(self):
+        nonce = self.client.get_nonce(self.apiKey, 'actor1')
+        self.assertTrue('nonceKey' in nonce)
+        self.assertTrue('nonceValue' in nonce)
+        self.assertEqual(self.stub.count('/hmac/nonce/%s/actor1' % self.apiKey), 1)
+
+    def test_get_ws_session(self):
+        res = self.client.get_ws_session('netid', 'password')
+        self.assertEqual(res['apiKey'], 'stub-ws-session-key')
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.client.send_ws_request(self.stub.url + '/echo', 'GET')
+        self.assertEqual(len(self.stub.connections), 1)
+
+    def test_no_keep_alive(self):
+        client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, keepAlive=False)
+        for _ in range(3):
+            client.send_ws_request(self.stub.url + '/echo', 'GET')
+        client.close()
+        self.assertEqual(len(self.stub.connections), 3)
+
+    def test_nonce_header(self):
+        header = self.client.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                           oit.ENCODING_NONCE)
+        self.assertTrue(header.startswith('Nonce-Encoded-API-Key %s,1,' % self.apiKey))
+
+    def test_send_ws_request(self):
+        content, status, _, _ = self.client.send_ws_request(self.stub.url + '/echo', 'put', 'a body')
+        self.assertEqual(status, 200)
+        self.assertTrue(b'"PUT"' in content)
+
+    def test_send_ws_request_invalid_method(self):
+        self.assertRaises(Exception, self.client.send_ws_request, self.stub.url, 'PATCH')
+
+    def test_authorize_request(self):
+        header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                   oit.ENCODING_URL, "http://www.byu.edu/", "")
+        res = self.client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+        self.assertEqual(res, '123456789')
+        self.stub.personId = None
+        res = self.client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+        self.assertTrue(res is None)
+
+    def test_module_functions_use_default_client(self):
+        previous = oit.set_default_client(self.client)
+        try:
+            nonce = oit.get_nonce(self.apiKey)
+            self.assertTrue('nonceValue' in nonce)
+            self.assertTrue(oit.get_default_client() is self.client)
+        finally:
+            oit.set_default_client(previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+from unittest import mock
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestCredentialRegistry(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+        self.client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5)
+        self.now = 1000.0
+        self.registry = oit.CredentialRegistry(self.client, maxActive=2, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.registry.close()
+        self.client.close()
+        self.stub.stop()
+
+    def test_api_key_headers_match_core(self):
+        self.registry.add_api_key('app', self.apiKey, self.sharedSecret)
+        seconds = time.mktime(time.strptime('2016-01-01 12:00:00', oit.TIMESTAMP_FORMAT))
+        with mock.patch('byu_ws_sdk.core.timestamps', oit.TimestampCache(clock=lambda: seconds)):
+            header = self.registry.get_http_authorization_header('app', oit.ENCODING_URL, 'http://www.byu.edu/',
+                                                                 actor='pd123')
+            expected = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                         oit.ENCODING_URL, 'http://www.byu.edu/', actor='pd123')
+        self.assertEqual(header, expected)
+        self.assertTrue(self.registry.get('app') is self.registry.get('app'))
+        self.assertRaises(KeyError, self.registry.get, 'unknown')
+
+    def test_nonce_headers(self):
+        self.registry.add_api_key('app', self.apiKey, self.sharedSecret)
+        header = self.registry.get_http_authorization_header('app', oit.ENCODING_NONCE, actor='actor1')
+        self.assertTrue(header.startswith('Nonce-Encoded-API-Key %s,1,' % self.apiKey))
+        self.assertEqual(self.stub.count('/hmac/nonce/%s/actor1' % self.apiKey), 1)
+
+    def test_ws_session_is_fetched_on_first_use(self):
+        self.registry.add_ws_session('gateway', 'netid', 'pw', background=False)
+        self.assertEqual(self.stub.count('/ws/session'), 0)
+        header = self.registry.get_http_authorization_header('gateway', url='http://www.byu.edu/')
+        self.assertTrue(header.startswith('URL-Encoded-WsSession-Key stub-ws-session-key,'))
+        self.registry.get_http_authorization_header('gateway', url='http://www.byu.edu/')
+        self.assertEqual(self.stub.count('/ws/session'), 1)
+
+    def test_least_recently_used_are_evicted(self):
+        for name in ('a', 'b', 'c'):
+            self.registry.add_api_key(name, 'key-' + name, 'secret-' + name)
+        a = self.registry.get('a')
+        self.now += 1
+        self.registry.get('b')
+        self.now += 1
+        self.registry.get('a')
+        self.now += 1
+        with mock.patch.object(oit.Credential, 'close') as close:
+            self.registry.get('c')
+        self.assertEqual(close.call_count, 1)
+        self.assertEqual(sorted(self.registry._active), ['a', 'c'])
+        self.assertTrue(self.registry.get('a') is a)
+        self.assertEqual(self.registry.get('b').apiKey, 'key-b')  # rebuilt from its registration
+        self.assertEqual(self.registry.stats['evictions'], 2)
+        self.assertEqual(len(self.registry), 3)
+
+    def test_replace_and_remove(self):
+        self.registry.add_api_key('app', 'old-key', 'old-secret')
+        self.assertEqual(self.registry.get('app').apiKey, 'old-key')
+        self.registry.add_api_key('app', 'new-key', 'new-secret')
+        self.assertEqual(self.registry.get('app').apiKey, 'new-key')
+        self.registry.remove('app')
+        self.assertFalse('app' in self.registry)
+        self.assertRaises(KeyError, self.registry.get, 'app')
+
+    def test_concurrent_lookups_share_one_state(self):
+        self.registry.add_api_key('app', self.apiKey, self.sharedSecret)
+        seen = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            for _ in range(200):
+                seen.append(self.registry.get('app'))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(map(id, seen))), 1)
+        self.assertEqual(self.registry.created, 1)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestSendMany(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+        self.client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5, poolMaxSize=8)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_signs_and_sends_every_request(self):
+        url = self.stub.url + '/person/%d'
+        requests = [url % i for i in range(10)]
+        requests.append(oit.WsRequest(self.stub.url + '/form', 'POST', 'p=1&a=2',
+                                      'application/x-www-form-urlencoded', 'pd123', tag='form'))
+        seconds = time.mktime(time.strptime('2016-01-01 12:00:00', oit.TIMESTAMP_FORMAT))
+        with mock.patch('byu_ws_sdk.core.timestamps', oit.TimestampCache(clock=lambda: seconds)):
+            results = list(self.client.send_many(requests, self.apiKey, self.sharedSecret, concurrency=4))
+            form_header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                            oit.ENCODING_URL, self.stub.url + '/form', 'p=1&a=2',
+                                                            'pd123', 'application/x-www-form-urlencoded', 'POST')
+        self.assertEqual(sorted(result.index for result in results), list(range(11)))
+        self.assertTrue(all(result.ok for result in results))
+        for result in results:
+            echo = json.loads(result.content.decode('utf-8'))
+            if result.request.tag == 'form':
+                self.assertEqual(echo['authorization'], form_header)
+                self.assertEqual(echo['body'], 'p=1&a=2')
+            else:
+                self.assertEqual(echo['path'], '/person/%d' % result.index)
+                self.assertTrue(echo['authorization'].startswith('URL-Encoded-API-Key %s,' % self.apiKey))
+
+    def test_concurrency_and_per_host_limits(self):
+        self.stub.delay = 0.05
+        requests = [self.stub.url + '/a'] * 6
+        list(self.client.send_many(requests, self.apiKey, self.sharedSecret, concurrency=3))
+        self.assertEqual(self.stub.peak, 3)
+
+        self.stub.peak = 0
+        other = self.stub.url.replace('127.0.0.1', 'localhost')
+        requests = [self.stub.url + '/a', other + '/b'] * 4
+        results = list(self.client.send_many(requests, self.apiKey, self.sharedSecret, concurrency=8, perHost=1))
+        self.assertEqual(len(results), 8)
+        self.assertEqual(self.stub.peak, 2)
+
+    def test_failures_are_results(self):
+        results = list(self.client.send_many(['http://127.0.0.1:1/closed', self.stub.url + '/ok'],
+                                             self.apiKey, self.sharedSecret, timeout=1))
+        by_index = dict((result.index, result) for result in results)
+        self.assertTrue(by_index[0].error is not None)
+        self.assertFalse(by_index[0].ok)
+        self.assertTrue(by_index[1].ok)
+
+    def test_reads_requests_lazily(self):
+        pulled = []
+
+        def requests():
+            for i in range(100):
+                pulled.append(i)
+                yield self.stub.url + '/%d' % i
+
+        results = self.client.send_many(requests(), self.apiKey, self.sharedSecret, concurrency=2)
+        next(results)
+        results.close()
+        self.assertTrue(len(pulled) <= 4)
+
+    def test_streamed_bodies_and_nonce_encoding(self):
+        results = list(self.client.send_many([self.stub.url + '/s'], self.apiKey, self.sharedSecret,
+                                             encodingType=oit.ENCODING_NONCE, stream=True))
+        self.assertEqual(results[0].content, None)
+        echo = json.loads(b''.join(results[0].response.iter_content(1024)).decode('utf-8'))
+        results[0].response.close()
+        self.assertTrue(echo['authorization'].startswith('Nonce-Encoded-API-Key %s,1,' % self.apiKey))
+
+    def test_retries_are_signed_afresh(self):
+        client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5, backoffFactor=0.001)
+        self.stub.failures = [None, 503]  # the nonce succeeds, the first GET fails
+        try:
+            results = list(client.send_many([self.stub.url + '/r'], self.apiKey, self.sharedSecret,
+                                            encodingType=oit.ENCODING_NONCE))
+        finally:
+            client.close()
+        self.assertTrue(results[0].ok)
+        sent = [headers['Authorization'] for (_, path), headers in zip(self.stub.calls, self.stub.headers)
+                if path == '/r']
+        self.assertEqual(len(sent), 2)
+        self.assertTrue(sent[0].startswith('Nonce-Encoded-API-Key %s,1,' % self.apiKey))
+        self.assertTrue(sent[1].startswith('Nonce-Encoded-API-Key %s,2,' % self.apiKey))
+
+    def test_async_send_many(self):
+        async def main():
+            async with oit.AsyncWsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5) as client:
+                return [result async for result in client.send_many(
+                    [self.stub.url + '/%d' % i for i in range(6)], self.apiKey, self.sharedSecret,
+                    concurrency=2)]
+        self.stub.delay = 0.02
+        results = asyncio.run(main())
+        self.assertEqual(sorted(result.index for result in results), list(range(6)))
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.stub.peak, 2)
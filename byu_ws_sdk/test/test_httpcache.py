@@ -0,0 +1,132 @@
+import json
+import shutil
+import tempfile
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.httpcache import CacheEntry, fresh_until
+from byu_ws_sdk.stub import StubServer
+
+
+class TestFreshness(unittest.TestCase):
+
+    def test_cache_control_and_expires(self):
+        self.assertEqual(fresh_until({'cache-control': 'max-age=60'}, 1000), 1060)
+        self.assertEqual(fresh_until({'Cache-Control': 'public, max-age=60', 'Age': '10'}, 1000), 1050)
+        self.assertEqual(fresh_until({'Cache-Control': 'no-cache, max-age=60'}, 1000), 1000)
+        self.assertEqual(fresh_until({'Cache-Control': 'no-store'}, 1000), None)
+        self.assertEqual(fresh_until({'Vary': '*'}, 1000), None)
+        self.assertEqual(fresh_until({'Date': 'Sun, 06 Nov 1994 08:49:37 GMT',
+                                      'Expires': 'Sun, 06 Nov 1994 08:50:37 GMT'}, 1000), 1060)
+        self.assertEqual(fresh_until({}, 1000), 1000)
+
+
+class TestBackends(unittest.TestCase):
+
+    def entry(self, size, url='http://x/'):
+        return CacheEntry(url, {'ETag': '"1"'}, b'x' * size, 0)
+
+    def test_memory_lru_eviction(self):
+        cache = oit.MemoryCache(maxBytes=250)
+        cache.set('a', self.entry(100))
+        cache.set('b', self.entry(100))
+        cache.get('a')
+        cache.set('c', self.entry(100))
+        self.assertEqual((cache.get('b'), len(cache), cache.evictions), (None, 2, 1))
+        self.assertTrue(cache.get('a') is not None)
+        cache.set('huge', self.entry(1000))
+        self.assertEqual(cache.get('huge'), None)
+        cache.delete('a')
+        cache.delete('c')
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_disk_round_trip_and_eviction(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = oit.DiskCache(directory, maxBytes=400)
+            cache.set('a', CacheEntry('http://x/a', {'ETag': '"1"'}, b'\x00body', 12.5))
+            entry = cache.get('a')
+            self.assertEqual((entry.url, entry.headers, entry.content, entry.freshUntil),
+                             ('http://x/a', {'ETag': '"1"'}, b'\x00body', 12.5))
+            cache.set('b', self.entry(200))
+            cache.get('a')
+            cache.set('c', self.entry(200))
+            self.assertEqual(cache.get('b'), None)
+            self.assertEqual(cache.evictions, 1)
+
+            reopened = oit.DiskCache(directory, maxBytes=400)  # entries outlive the process
+            self.assertEqual(len(reopened), 2)
+            self.assertEqual(reopened.get('a').content, b'\x00body')
+            reopened.clear()
+            self.assertEqual(len(reopened), 0)
+            self.assertEqual(reopened.get('a'), None)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestResponseCache(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer().start()
+        self.now = 1000.0
+        self.cache = oit.ResponseCache(clock=lambda: self.now)
+        self.client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5, responseCache=self.cache)
+        self.url = self.stub.url + '/cached'
+        self.signed = 0
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def sign(self, url, httpMethod):
+        self.signed += 1
+        return oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                                 url, actor='pd123')
+
+    def get(self, **kwargs):
+        content, status, headers, _ = self.client.send_ws_request(self.url, oit.HTTP_METHOD_GET, sign=self.sign,
+                                                                  **kwargs)
+        return status, json.loads(content.decode('utf-8'))['version']
+
+    def test_fresh_responses_are_served_without_signing(self):
+        self.stub.cacheControl = 'max-age=60'
+        self.assertEqual(self.get(), (200, 1))
+        self.stub.version = 2
+        self.assertEqual(self.get(), (200, 1))
+        self.assertEqual((self.stub.count('/cached'), self.signed), (1, 1))
+        self.now += 61
+        self.assertEqual(self.get(), (200, 2))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_stale_responses_are_revalidated_with_a_fresh_signature(self):
+        self.assertEqual(self.get(), (200, 1))
+        self.assertEqual(self.get(), (200, 1))
+        self.assertEqual(self.stub.headers[-1]['If-None-Match'], '"v1"')
+        self.assertTrue(self.stub.headers[-1]['Authorization'].endswith(',pd123'))
+        self.assertEqual(self.signed, 2)
+        self.stub.version = 2
+        self.assertEqual(self.get(), (200, 2))
+        stats = self.cache.stats
+        self.assertEqual((stats['misses'], stats['revalidations'], stats['not_modified']), (1, 2, 1))
+        self.assertTrue(stats['bytes_saved'] > 1000)
+
+    def test_actors_and_no_store_are_kept_apart(self):
+        self.stub.cacheControl = 'max-age=60'
+        self.get(actor='a')
+        self.get(actor='b')
+        self.get(actor='a')
+        self.assertEqual(self.stub.count('/cached'), 2)
+        self.get(actor='a', headers={'Cache-Control': 'no-store'})
+        self.assertEqual(self.stub.count('/cached'), 3)
+        self.stub.cacheControl = 'no-store'
+        self.get(actor='c')
+        self.get(actor='c')
+        self.assertEqual(self.stub.count('/cached'), 5)
+
+    def test_other_methods_are_not_cached(self):
+        self.stub.cacheControl = 'max-age=60'
+        self.client.send_ws_request(self.url, oit.HTTP_METHOD_POST, 'a=1')
+        self.client.send_ws_request(self.url, oit.HTTP_METHOD_POST, 'a=1')
+        self.assertEqual(self.stub.count('/cached'), 2)
+        self.assertEqual(len(self.cache.backend), 0)
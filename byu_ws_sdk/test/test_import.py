@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import byu_ws_sdk as oit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def loaded_after(code):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', code + '\nimport sys\nprint(" ".join(sys.modules))'],
+                                     env=env, universal_newlines=True)
+    return set(output.split())
+
+
+class TestLazyImport(unittest.TestCase):
+
+    def test_signing_does_not_load_http_dependencies(self):
+        modules = loaded_after("import byu_ws_sdk as sdk\n"
+                               "sdk.get_http_authorization_header('k', 's', sdk.KEY_TYPE_API, sdk.ENCODING_URL, 'x')")
+        for name in ('requests', 'simplejson', 'xml.dom.minidom', 'asyncio', 'byu_ws_sdk.client'):
+            self.assertFalse(name in modules, name)
+
+    def test_lazy_names_load_on_first_use(self):
+        modules = loaded_after("from byu_ws_sdk import WsClient")
+        self.assertTrue('requests' in modules)
+        self.assertTrue(oit.WsClient is oit.client.WsClient)
+        self.assertTrue(oit.Transport is oit.transport.Transport)
+        self.assertTrue('WsgiAuthMiddleware' in dir(oit))
+        self.assertTrue(oit.xml.dom.minidom.parseString)
+        self.assertRaises(AttributeError, getattr, oit, 'no_such_name')
+
+    def test_get_body_from_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as body_file:
+            body_file.write('a=1&b=2\n\n')
+        try:
+            self.assertEqual(oit.get_body_from_file(body_file.name), 'a=1&b=2')
+        finally:
+            os.remove(body_file.name)
+        self.assertEqual(oit.get_body_from_file(body_file.name), '')
+        self.assertEqual(oit.get_body_from_file(None), '')
+
+    def test_get_body_from_file_keeps_line_endings(self):
+        with tempfile.NamedTemporaryFile('wb', suffix='.txt', delete=False) as body_file:
+            body_file.write(b'line one\r\nline two\r\n\n')
+        try:
+            self.assertEqual(oit.get_body_from_file(body_file.name), 'line one\r\nline two\r')
+            streamed = oit.open_body(body_file.name)
+            try:
+                self.assertEqual(oit.url_encode('secret', '2016-01-01 12:00:00', 'http://x/', streamed),
+                                 oit.url_encode('secret', '2016-01-01 12:00:00', 'http://x/',
+                                                oit.get_body_from_file(body_file.name)))
+            finally:
+                streamed.close()
+        finally:
+            os.remove(body_file.name)
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk import instrument
+from byu_ws_sdk.stub import StubServer
+
+
+class TestInstrumentation(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+        self.instrumentation = oit.Instrumentation()
+        self.events = []
+        self.instrumentation.add_hook(self.events.append)
+        self.client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, backoffFactor=0.001,
+                                   instrumentation=self.instrumentation)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def names(self):
+        return [event.name for event in self.events]
+
+    def test_network_events(self):
+        self.client.get_ws_session('netid', 'pw')
+        self.client.get_nonce(self.apiKey)
+        self.stub.failures = [503]
+        self.client.send_ws_request(self.stub.url + '/echo', 'PUT', 'twelve bytes')
+        self.assertEqual(self.names(), [instrument.EVENT_SESSION_FETCH, instrument.EVENT_NONCE_FETCH,
+                                        instrument.EVENT_REQUEST])
+        request = self.events[-1]
+        self.assertEqual((request.status, request.retries, request.bytesSent), (200, 1, 12))
+        self.assertTrue(request.bytesReceived > 0 and request.duration > 0)
+
+    def test_sign_and_validate_events(self):
+        header = self.client.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                           oit.ENCODING_URL, 'http://www.byu.edu/', '')
+        self.client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+        self.assertEqual(self.names(), [instrument.EVENT_SIGN, instrument.EVENT_NONCE_FETCH,
+                                        instrument.EVENT_VALIDATE])
+
+    def test_async_client_events(self):
+        async def main():
+            async with oit.AsyncWsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5,
+                                         instrumentation=self.instrumentation) as client:
+                await client.get_ws_session('netid', 'pw')
+                header = await client.get_http_authorization_header(self.apiKey, self.sharedSecret,
+                                                                    oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                                                    'http://www.byu.edu/')
+                await client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+                await client.send_ws_request(self.stub.url + '/echo', 'PUT', 'twelve bytes')
+        asyncio.run(main())
+        self.assertEqual(self.names(), [instrument.EVENT_SESSION_FETCH, instrument.EVENT_SIGN,
+                                        instrument.EVENT_NONCE_FETCH, instrument.EVENT_VALIDATE,
+                                        instrument.EVENT_REQUEST])
+        request = self.events[-1]
+        self.assertEqual((request.status, request.bytesSent, request.method), (200, 12, 'PUT'))
+        self.assertTrue(request.bytesReceived > 0 and request.duration > 0)
+
+    def test_errors_are_reported_and_hooks_cannot_break_calls(self):
+        self.instrumentation.add_hook(lambda event: 1 / 0)
+        client = oit.WsClient(authBaseUrl='http://127.0.0.1:1', maxRetries=0, instrumentation=self.instrumentation)
+        self.assertRaises(Exception, client.send_ws_request, 'http://127.0.0.1:1/', 'GET')
+        self.assertTrue(self.events[-1].error is not None)
+        self.client.get_nonce(self.apiKey)
+        self.assertEqual(self.events[-1].status, 200)
+
+    def test_histogram_collector(self):
+        collector = oit.HistogramCollector()
+        self.instrumentation.add_hook(collector)
+        for _ in range(10):
+            self.client.get_nonce(self.apiKey)
+        summary = collector.summary()[instrument.EVENT_NONCE_FETCH]
+        self.assertEqual(summary['count'], 10)
+        self.assertTrue(0 < summary['p50'] <= summary['p99'])
+        self.assertTrue(collector.percentile('unknown', 50) is None)
+
+    def test_default_hooks(self):
+        events = []
+        hook = oit.add_hook(events.append)
+        try:
+            oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                              'http://www.byu.edu/')
+        finally:
+            oit.remove_hook(hook)
+        oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                          'http://www.byu.edu/')
+        self.assertEqual([event.name for event in events], [instrument.EVENT_SIGN])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import asyncio
+import io
+import json
+import threading
+import unittest
+from wsgiref.util import setup_testing_defaults
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+def wsgi_app(environ, start_response):
+    body = json.dumps({'personId': environ.get(oit.PERSON_ID_KEY),
+                       'body': environ['wsgi.input'].read().decode('utf-8')}).encode('utf-8')
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [body]
+
+
+class TestWsgiAuthMiddleware(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+    url = 'http://www.byu.edu/protected?x=1'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+        self.client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def call(self, app, authHeader=None, method='GET', body=b'', contentType=None):
+        environ = {'REQUEST_METHOD': method, 'HTTP_HOST': 'www.byu.edu', 'PATH_INFO': '/protected',
+                   'QUERY_STRING': 'x=1', 'wsgi.input': io.BytesIO(body), 'CONTENT_LENGTH': str(len(body))}
+        setup_testing_defaults(environ)
+        if authHeader:
+            environ['HTTP_AUTHORIZATION'] = authHeader
+        if contentType:
+            environ['CONTENT_TYPE'] = contentType
+        statuses = []
+        result = b''.join(app(environ, lambda status, headers: statuses.append(status)))
+        return statuses[0], json.loads(result.decode('utf-8'))
+
+    def header(self, url=None, body=None, contentType=None, method=None):
+        return oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                                 url or self.url, body, contentType=contentType, httpMethod=method)
+
+    def test_valid_header_passes_person_id(self):
+        app = oit.WsgiAuthMiddleware(wsgi_app, self.apiKey, self.sharedSecret, self.client)
+        status, body = self.call(app, self.header())
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body['personId'], '123456789')
+
+    def test_missing_and_invalid_headers(self):
+        app = oit.WsgiAuthMiddleware(wsgi_app, self.apiKey, self.sharedSecret, self.client)
+        self.assertEqual(self.call(app)[0], '401 Unauthorized')
+        self.assertEqual(self.call(app, 'garbage')[0], '401 Unauthorized')
+        self.stub.personId = None
+        self.assertEqual(self.call(app, self.header())[0], '401 Unauthorized')
+        optional = oit.WsgiAuthMiddleware(wsgi_app, self.apiKey, self.sharedSecret, self.client, required=False)
+        status, body = self.call(optional)
+        self.assertEqual((status, body['personId']), ('200 OK', None))
+
+    def test_identical_validations_share_one_call(self):
+        app = oit.WsgiAuthMiddleware(wsgi_app, self.apiKey, self.sharedSecret, self.client)
+        self.stub.delay = 0.1
+        header = self.header()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.call(app, header))) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([status for status, _ in results], ['200 OK'] * 6)
+        self.assertEqual(self.stub.count('/validate'), 1)
+        self.assertEqual(app.stats['coalesced'], 5)
+
+    def test_in_flight_cap(self):
+        app = oit.WsgiAuthMiddleware(wsgi_app, self.apiKey, self.sharedSecret, self.client, maxInFlight=1,
+                                     queueTimeout=0.05)
+        self.stub.delay = 0.2
+        results = []
+        headers = [self.header(self.url), self.header('http://www.byu.edu/other')]
+        threads = [threading.Thread(target=lambda h=h: results.append(self.call(app, h)[0])) for h in headers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), ['200 OK', '503 Service Unavailable'])
+        self.assertEqual(self.stub.peak, 1)
+        self.assertEqual(app.stats['rejected'], 1)
+
+    def test_cache_and_local_verifier_skip_upstream(self):
+        client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5, validationCache=oit.ValidationCache(),
+                              localVerifier=oit.LocalVerifier())
+        client.localVerifier.add_key('local-key', 'local-secret', personId='555')
+        try:
+            app = oit.WsgiAuthMiddleware(wsgi_app, self.apiKey, self.sharedSecret, client)
+            header = self.header()
+            self.assertEqual(self.call(app, header)[1]['personId'], '123456789')
+            self.assertEqual(self.call(app, header)[1]['personId'], '123456789')
+            self.assertEqual(self.stub.count('/validate'), 1)
+
+            local = oit.get_http_authorization_header('local-key', 'local-secret', oit.KEY_TYPE_API,
+                                                      oit.ENCODING_URL, self.url, 'a=1&b=2',
+                                                      contentType='application/x-www-form-urlencoded',
+                                                      httpMethod='POST')
+            status, body = self.call(app, local, 'POST', b'a=1&b=2', 'application/x-www-form-urlencoded')
+            self.assertEqual((status, body['personId'], body['body']), ('200 OK', '555', 'a=1&b=2'))
+            self.assertEqual(self.stub.count('/validate'), 1)
+        finally:
+            client.close()
+
+    def test_local_verifier_with_binary_bodies(self):
+        client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5, localVerifier=oit.LocalVerifier())
+        client.localVerifier.add_key('local-key', 'local-secret', personId='555')
+
+        def person_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json')])
+            return [json.dumps({'personId': environ.get(oit.PERSON_ID_KEY)}).encode('utf-8')]
+        try:
+            app = oit.WsgiAuthMiddleware(person_app, self.apiKey, self.sharedSecret, client)
+            body = b'\xff\xfe\x00binary'
+            local = oit.get_http_authorization_header('local-key', 'local-secret', oit.KEY_TYPE_API,
+                                                      oit.ENCODING_URL, self.url, oit.FileBody(io.BytesIO(body)),
+                                                      contentType='application/octet-stream', httpMethod='POST')
+            self.assertEqual(self.call(app, local, 'POST', body, 'application/octet-stream'),
+                             ('200 OK', {'personId': '555'}))
+            form = 'application/x-www-form-urlencoded'
+            status, _ = self.call(app, local, 'POST', b'a=\xff', form)
+            self.assertEqual(status, '401 Unauthorized')
+        finally:
+            client.close()
+
+
+class TestAsgiAuthMiddleware(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_validates_and_coalesces(self):
+        async def app(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': scope[oit.PERSON_ID_KEY].encode('ascii')})
+
+        async def call(middleware, authHeader):
+            scope = {'type': 'http', 'method': 'GET', 'scheme': 'http', 'path': '/protected',
+                     'query_string': b'x=1', 'root_path': '',
+                     'headers': [(b'host', b'www.byu.edu')]}
+            if authHeader:
+                scope['headers'].append((b'authorization', authHeader.encode('ascii')))
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+            await middleware(scope, None, send)
+            return messages[0]['status'], messages[1]['body']
+
+        async def main():
+            async with oit.AsyncWsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5) as client:
+                middleware = oit.AsgiAuthMiddleware(app, self.apiKey, self.sharedSecret, client)
+                header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                           oit.ENCODING_URL, 'http://www.byu.edu/protected?x=1')
+                results = await asyncio.gather(*[call(middleware, header) for _ in range(4)])
+                missing = await call(middleware, None)
+                return results, missing, middleware.stats
+
+        self.stub.delay = 0.05
+        results, missing, stats = asyncio.run(main())
+        self.assertEqual(results, [(200, b'123456789')] * 4)
+        self.assertEqual(missing[0], 401)
+        self.assertEqual(self.stub.count('/validate'), 1)
+        self.assertEqual(stats['coalesced'], 3)
+
+    def test_local_verifier_with_a_body(self):
+        async def app(scope, receive, send):
+            message = await receive()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': scope[oit.PERSON_ID_KEY].encode('ascii') + b':' +
+                        message['body']})
+
+        chunks = [b'a=1', b'&b=2']
+        header = oit.get_http_authorization_header('local-key', 'local-secret', oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                                   'http://www.byu.edu/protected', b''.join(chunks).decode('ascii'),
+                                                   contentType='application/x-www-form-urlencoded',
+                                                   httpMethod='POST')
+
+        async def main():
+            async with oit.AsyncWsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5,
+                                         localVerifier=oit.LocalVerifier()) as client:
+                client.localVerifier.add_key('local-key', 'local-secret', personId='555')
+                middleware = oit.AsgiAuthMiddleware(app, self.apiKey, self.sharedSecret, client)
+                scope = {'type': 'http', 'method': 'POST', 'scheme': 'http', 'path': '/protected',
+                         'query_string': b'', 'root_path': '',
+                         'headers': [(b'host', b'www.byu.edu'), (b'authorization', header.encode('ascii')),
+                                     (b'content-type', b'application/x-www-form-urlencoded')]}
+                incoming = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                            for i, chunk in enumerate(chunks)]
+
+                async def receive():
+                    return incoming.pop(0)
+                messages = []
+
+                async def send(message):
+                    messages.append(message)
+                await middleware(scope, receive, send)
+                return messages[0]['status'], messages[1]['body']
+
+        self.assertEqual(asyncio.run(main()), (200, b'555:a=1&b=2'))
+        self.assertEqual(self.stub.count('/validate'), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
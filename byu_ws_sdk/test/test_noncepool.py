@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class TestNoncePool(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def fetch(self, apiKey, actor):
+        with self.lock:
+            self.fetched.append((apiKey, actor))
+            return {'nonceKey': str(len(self.fetched)), 'nonceValue': 'value'}
+
+    def test_miss_then_hits(self):
+        pool = oit.NoncePool(self.fetch, 'key', size=4)
+        try:
+            self.assertEqual(pool.take()['nonceKey'], '1')
+            self.assertEqual(pool.misses, 1)
+            wait_for(lambda: len(pool) == 4)
+            keys = set(pool.take()['nonceKey'] for _ in range(3))
+            self.assertEqual(len(keys), 3)
+            self.assertEqual(pool.hits, 3)
+        finally:
+            pool.close()
+
+    def test_prefetch_and_expiry(self):
+        clock = FakeClock()
+        pool = oit.NoncePool(self.fetch, 'key', 'actor', size=2, lifetime=300, margin=30, clock=clock)
+        try:
+            pool.prefetch()
+            wait_for(lambda: len(pool) == 2)
+            self.assertEqual(self.fetched[0], ('key', 'actor'))
+            clock.now += 271
+            pool.take()
+            self.assertEqual(pool.expired, 2)
+            self.assertEqual(pool.misses, 1)
+        finally:
+            pool.close()
+
+    def test_fetch_errors_are_counted(self):
+        def failing_fetch(apiKey, actor):
+            raise IOError("down")
+        pool = oit.NoncePool(failing_fetch, 'key', retryDelay=0.01)
+        try:
+            pool.prefetch()
+            wait_for(lambda: pool.errors >= 2)
+            self.assertRaises(IOError, pool.take)
+        finally:
+            pool.close()
+
+    def test_failed_refills_back_off_under_load(self):
+        calls = []
+
+        def failing_fetch(apiKey, actor):
+            calls.append(threading.current_thread().name)
+            raise IOError("down")
+        pool = oit.NoncePool(failing_fetch, 'key', retryDelay=5)
+        try:
+            pool.prefetch()
+            wait_for(lambda: pool.errors >= 1)
+            for _ in range(20):
+                self.assertRaises(IOError, pool.take)
+            time.sleep(0.05)
+            self.assertEqual(pool.errors, 1)
+            self.assertEqual(len(calls), 21)
+        finally:
+            pool.close()
+
+    def test_pools_after_close(self):
+        pools = oit.NoncePools(self.fetch, size=2)
+        pools.pool('key', 'a')
+        pools.close()
+        self.assertTrue(pools.pool('key', 'a') is pools.pool('key', 'a'))
+        pools.close()
+
+    def test_pools_are_per_key_and_actor(self):
+        pools = oit.NoncePools(self.fetch, size=1)
+        try:
+            self.assertTrue(pools.pool('key', 'a') is pools.pool('key', 'a'))
+            self.assertTrue(pools.pool('key', 'a') is not pools.pool('key', 'b'))
+            self.assertTrue(pools.pool('key') is pools.pool('key', None))
+        finally:
+            pools.close()
+
+    def test_least_recently_used_pools_are_closed(self):
+        pools = oit.NoncePools(self.fetch, maxPools=2, size=2)
+        try:
+            first = pools.pool('key', 'a')
+            second = pools.pool('key', 'b')
+            second.prefetch()
+            wait_for(lambda: len(second) == 2)
+            pools.pool('key', 'a')
+            pools.pool('key', 'c')  # b is now the least recently used
+            self.assertEqual(len(pools), 2)
+            self.assertEqual(pools.evictions, 1)
+            self.assertTrue(pools.pool('key', 'a') is first)
+            wait_for(lambda: not second._thread.is_alive())
+            self.assertEqual(len(second), 0)
+            self.assertTrue('nonceKey' in second.take())
+            self.assertTrue(pools.pool('key', 'b') is not second)
+        finally:
+            pools.close()
+
+    def test_client_uses_pool(self):
+        apiKey = 'YF4i2Qdx2WuSj-G8583M'
+        sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+        with StubServer() as stub:
+            with oit.WsClient(authBaseUrl=stub.authBaseUrl, noncePoolSize=3) as client:
+                client.noncePools.pool(apiKey).prefetch()
+                wait_for(lambda: len(client.noncePools.pool(apiKey)) == 3)
+                header = client.get_http_authorization_header(apiKey, sharedSecret, oit.KEY_TYPE_API,
+                                                              oit.ENCODING_NONCE)
+                self.assertTrue(header.startswith('Nonce-Encoded-API-Key'))
+                self.assertEqual(client.noncePools.hits, 1)
+                self.assertEqual(client.noncePools.misses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
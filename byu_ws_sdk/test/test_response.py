@@ -0,0 +1,64 @@
+import io
+import os
+import tracemalloc
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestWsResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubServer().start()
+        self.client = oit.WsClient(timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_download_runs_in_constant_memory(self):
+        size = 8 * 1024 * 1024
+        out = open(os.devnull, 'wb')
+        tracemalloc.start()
+        try:
+            with self.client.open_ws_request(self.stub.url + '/download/%d' % size, 'GET') as res:
+                self.assertEqual(res.status_code, 200)
+                written = res.save(out)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        out.close()
+        self.assertEqual(written, size)
+        self.assertTrue(peak < size // 8, peak)
+
+    def test_body_is_parsed_on_demand(self):
+        with self.client.open_ws_request(self.stub.url + '/echo', 'POST', 'a body') as res:
+            self.assertFalse(res.response._content_consumed)
+            self.assertEqual(res.json()['body'], 'a body')
+            self.assertTrue(res.json() is res.json())
+
+        res = self.client.open_ws_request(self.stub.url + '/xml', 'GET')
+        self.assertEqual(res.contentType, 'text/xml')
+        self.assertEqual(res.xml().documentElement.tagName, 'a')
+        self.assertTrue('<b>1</b>' in res.formatted())
+        res.close()
+
+    def test_save_to_path_and_iterate(self):
+        out = io.BytesIO()
+        with self.client.open_ws_request(self.stub.url + '/download/100000', 'GET') as res:
+            for chunk in res.iter_content(4096):
+                self.assertTrue(len(chunk) <= 4096)
+                out.write(chunk)
+        self.assertEqual(out.getvalue(), b'x' * 100000)
+
+
+class TestGetFormattedResponse(unittest.TestCase):
+
+    def test_xml_is_pretty_printed(self):
+        formatted = oit.get_formatted_response({'Content-Type': 'text/xml; charset=utf-8'}, '<a><b>1</b></a>')
+        self.assertEqual(formatted, '<?xml version="1.0" ?>\n<a>\n\t<b>1</b>\n</a>\n')
+
+    def test_other_bodies_are_unchanged(self):
+        self.assertEqual(oit.get_formatted_response({'Content-Type': 'application/xml'}, '<a>'), '<a>')
+        self.assertEqual(oit.get_formatted_response({'Content-Type': 'application/json'}, '{}'), '{}')
+        self.assertEqual(oit.get_formatted_response({}, 'text'), 'text')
@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+from unittest import mock
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class FakeSessionClient(object):
+    def __init__(self, delay=0, fail=False, expiresIn=None):
+        self.delay = delay
+        self.fail = fail
+        self.expiresIn = expiresIn
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_ws_session(self, casNetId, casPassword, casTimeout=1, **kwargs):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise IOError("CAS is down")
+        expireDate = '2099-01-01 00:00:00'
+        if self.expiresIn is not None:
+            expireDate = time.strftime(oit.TIMESTAMP_FORMAT, time.localtime(time.time() + self.expiresIn))
+        return {'personId': '123', 'apiKey': 'key%d' % calls, 'sharedSecret': 'secret', 'expireDate': expireDate}
+
+
+class TestWsSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+
+    def clock(self):
+        return self.now
+
+    def test_cached_until_refresh_margin(self):
+        client = FakeSessionClient()
+        manager = oit.WsSessionManager('netid', 'pw', casTimeout=10, client=client, refreshMargin=60,
+                                       background=False, clock=self.clock)
+        self.assertEqual(manager.apiKey, 'key1')
+        self.now += 539
+        self.assertEqual(manager.apiKey, 'key1')
+        self.now += 2
+        self.assertEqual(manager.apiKey, 'key2')
+        self.assertEqual(manager.stats['refreshes'], 2)
+
+    def test_margin_longer_than_the_session(self):
+        client = FakeSessionClient()
+        manager = oit.WsSessionManager('netid', 'pw', casTimeout=1, client=client, background=False,
+                                       clock=self.clock)
+        self.assertEqual(manager.apiKey, 'key1')
+        self.now += 29
+        self.assertEqual(manager.apiKey, 'key1')
+        self.now += 2
+        self.assertEqual(manager.apiKey, 'key2')
+        self.assertEqual(client.calls, 2)
+
+    def test_background_renewal_with_a_short_session(self):
+        client = FakeSessionClient()
+        manager = oit.WsSessionManager('netid', 'pw', casTimeout=1, client=client)
+        try:
+            manager.get()
+            time.sleep(0.2)
+            self.assertEqual(client.calls, 1)
+        finally:
+            manager.close()
+
+    def test_single_flight_renewal(self):
+        client = FakeSessionClient(delay=0.1)
+        manager = oit.WsSessionManager('netid', 'pw', client=client, background=False)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.apiKey)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(results, ['key1'] * 10)
+        self.assertTrue(manager.lastRefreshLatency >= 0.1)
+
+    def test_failures_are_shared_and_counted(self):
+        client = FakeSessionClient(delay=0.1, fail=True)
+        manager = oit.WsSessionManager('netid', 'pw', client=client, background=False)
+        errors = []
+
+        def get():
+            try:
+                manager.get()
+            except IOError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(manager.failures, 1)
+
+    @mock.patch('byu_ws_sdk.session.MIN_REFRESH_INTERVAL', 0.05)
+    def test_background_refresh(self):
+        client = FakeSessionClient(expiresIn=2)  # well inside the margin, so it is renewed right away
+        manager = oit.WsSessionManager('netid', 'pw', casTimeout=1, client=client)
+        try:
+            manager.get()
+            deadline = time.time() + 5
+            while client.calls < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(client.calls >= 3)
+        finally:
+            manager.close()
+        self.assertTrue(client.calls < 10)
+
+    def test_signs_with_session_keys(self):
+        with StubServer() as stub:
+            with oit.WsClient(authBaseUrl=stub.authBaseUrl) as client:
+                manager = oit.WsSessionManager('netid', 'pw', client=client, background=False)
+                header = manager.get_http_authorization_header(oit.ENCODING_URL, 'http://www.byu.edu/')
+        self.assertTrue(header.startswith('URL-Encoded-WsSession-Key stub-ws-session-key,'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+# forked like the workers of a pre-fork server
+fork = multiprocessing.get_context('fork')
+
+
+def run_workers(count, target, *args):
+    results = fork.Queue()
+    workers = [fork.Process(target=_worker, args=(results, target) + args) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    outcomes = [results.get(timeout=5) for _ in workers]
+    errors = [outcome for outcome in outcomes if isinstance(outcome, str) and outcome.startswith('error:')]
+    if errors:
+        raise AssertionError(errors[0])
+    return outcomes
+
+
+def _worker(results, target, *args):
+    try:
+        results.put(target(*args))
+    except Exception as e:
+        results.put('error: %r' % (e,))
+
+
+def _get_session(path, authBaseUrl, barrier):
+    store = oit.SharedStore(path, slots=64)
+    client = oit.WsClient(authBaseUrl=authBaseUrl, timeout=5)
+    session = oit.SharedWsSession('netid', 'pw', store, client=client, background=False)
+    barrier.wait()
+    return session.get()['apiKey']
+
+
+def _authorize(path, authBaseUrl, header, url, apiKey, sharedSecret):
+    store = oit.SharedStore(path, slots=64)
+    client = oit.WsClient(authBaseUrl=authBaseUrl, timeout=5, validationCache=oit.SharedValidationCache(store))
+    return client.authorize_request(url, header, apiKey, sharedSecret)
+
+
+def _write_patterns(path, rounds):
+    store = oit.SharedStore(path, slots=8, slotSize=512)
+    for i in range(rounds):
+        store.set('key', bytes([i % 256]) * (100 + i % 300), 2 ** 40)
+    return 'written'
+
+
+def _read_patterns(path, rounds):
+    store = oit.SharedStore(path, slots=8, slotSize=512)
+    seen = 0
+    for _ in range(rounds):
+        value = store.get('key')
+        if value is not None:
+            if value != value[:1] * len(value):
+                return 'error: torn read %r' % value[:20]
+            seen += 1
+    return seen
+
+
+class TestSharedStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'store')
+        self.now = 1000.0
+        self.store = oit.SharedStore(self.path, slots=16, slotSize=128, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_set_get_expire_delete(self):
+        self.assertTrue(self.store.set('a', b'1', 1010))
+        self.assertEqual(self.store.get('a'), b'1')
+        self.assertEqual(len(self.store), 1)
+        other = oit.SharedStore(self.path, slots=16, slotSize=128, clock=lambda: self.now)
+        self.assertEqual(other.get('a'), b'1')
+        other.close()
+        self.now = 1011
+        self.assertEqual(self.store.get('a'), None)
+        self.store.set('b', b'2', 2000)
+        self.store.delete('b')
+        self.assertEqual(self.store.get('b'), None)
+        self.assertFalse(self.store.set('big', b'x' * 200, 2000))
+
+    def test_full_slots_evict_the_soonest_to_expire(self):
+        for i in range(40):
+            self.store.set('k%d' % i, b'v', 2000 + i)
+        self.assertEqual(self.store.get('k39'), b'v')
+        self.assertEqual(len(self.store), 16)
+
+    def test_layout_mismatch(self):
+        self.assertRaises(Exception, oit.SharedStore, self.path, slots=32, slotSize=128)
+
+    def test_reads_are_never_torn_across_processes(self):
+        path = os.path.join(self.directory, 'patterns')
+        oit.SharedStore(path, slots=8, slotSize=512).close()
+        results = fork.Queue()
+        processes = [fork.Process(target=_worker, args=(results, _write_patterns, path, 5000))]
+        processes += [fork.Process(target=_worker, args=(results, _read_patterns, path, 20000)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        outcomes = [results.get(timeout=5) for _ in processes]
+        self.assertEqual([o for o in outcomes if isinstance(o, str) and o.startswith('error')], [])
+        self.assertTrue('written' in outcomes)
+
+
+class TestSharedCaches(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'store')
+        self.stub = StubServer(personId='123456789').start()
+
+    def tearDown(self):
+        self.stub.stop()
+        shutil.rmtree(self.directory)
+
+    def test_workers_log_in_once(self):
+        self.stub.delay = 0.2
+        barrier = fork.Barrier(6)
+        keys = run_workers(6, _get_session, self.path, self.stub.authBaseUrl, barrier)
+        self.assertEqual(keys, ['stub-ws-session-key'] * 6)
+        self.assertEqual(self.stub.count('/ws/session'), 1)
+
+    def test_expired_session_is_renewed_once_and_adopted(self):
+        now = [1000.0]
+        store = oit.SharedStore(self.path, slots=64, clock=lambda: now[0])
+        client = oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5)
+        first = oit.SharedWsSession('netid', 'pw', store, casTimeout=5, client=client, background=False,
+                                    clock=lambda: now[0])
+        second = oit.SharedWsSession('netid', 'pw', store, casTimeout=5, client=client, background=False,
+                                     clock=lambda: now[0])
+        self.assertEqual(first.get()['apiKey'], 'stub-ws-session-key')
+        self.assertEqual(second.get()['apiKey'], 'stub-ws-session-key')
+        self.assertEqual((self.stub.count('/ws/session'), second.adopted), (1, 1))
+        now[0] += 5 * 60
+        self.stub.session = dict(self.stub.session, apiKey='renewed-key')
+        self.assertEqual(second.get()['apiKey'], 'renewed-key')
+        self.assertEqual(first.get()['apiKey'], 'renewed-key')
+        self.assertEqual(self.stub.count('/ws/session'), 2)
+        client.close()
+        store.close()
+
+    def test_validations_are_shared_between_workers(self):
+        url = 'http://www.byu.edu/'
+        header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                   oit.ENCODING_URL, url)
+        args = (self.path, self.stub.authBaseUrl, header, url, self.apiKey, self.sharedSecret)
+        self.assertEqual(run_workers(1, _authorize, *args), ['123456789'])
+        self.assertEqual(run_workers(4, _authorize, *args), ['123456789'] * 4)
+        self.assertEqual(self.stub.count('/validate'), 1)
+
+        cache = oit.SharedValidationCache(oit.SharedStore(self.path, slots=64), negativeTtl=60)
+        cache.store('bad', None, '')
+        self.assertEqual(cache.lookup('bad'), (True, None))
+        self.assertEqual(cache.lookup('unknown'), (False, None))
+        self.assertEqual(cache.stats['size'], 2)
@@ -0,0 +1,85 @@
+import time
+import unittest
+from unittest import mock
+import byu_ws_sdk as oit
+
+
+class TestSigner(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+    timestamp = '2016-01-01 12:00:00'
+
+    def setUp(self):
+        self.signer = oit.Signer(self.apiKey, self.sharedSecret)
+
+    def test_url_encode_matches_core(self):
+        cases = [('http://www.byu.edu/', ''),
+                 ('http://www.byu.edu/', 'test body content'),
+                 ('http://www.byu.edu/', 'sar=2&pau=1&sar=6', 'application/x-www-form-urlencoded', 'PUT'),
+                 ('http://www.byu.edu/', None, None, 'GET', 'pd123', True)]
+        for case in cases:
+            self.assertEqual(self.signer.url_encode(self.timestamp, *case),
+                             oit.url_encode(self.sharedSecret, self.timestamp, *(case[:4] + case[4:5] +
+                                                                                  (False,) + case[5:])))
+
+    def test_nonce_encode_matches_core(self):
+        nonceValue = u's9dg3yRQx1rAeH7Tkvd8bn8yi6ZN8G0mKYq5LzhQE5acr4g2Z4x6qpDmcA3owf3DmsozwUtqch/F2bBG6uJNjA=='
+        self.assertEqual(self.signer.nonce_encode(nonceValue), oit.nonce_encode(self.sharedSecret, nonceValue))
+
+    def test_headers_match_core(self):
+        seconds = time.mktime(time.strptime(self.timestamp, oit.TIMESTAMP_FORMAT))
+        with mock.patch('byu_ws_sdk.core.timestamps', oit.TimestampCache(clock=lambda: seconds)):
+            expected = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                         oit.ENCODING_URL, 'http://www.byu.edu/', None, 'pd123')
+            self.assertEqual(self.signer.url_header('http://www.byu.edu/', actor='pd123'), expected)
+        nonce = {'nonceKey': '57921', 'nonceValue': 'G4qPJr5L3xI3KjXPw0g1mgWY8bzInQts7uctUfTAINm5ov3W'}
+        expected = oit.core._build_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                        oit.ENCODING_NONCE, '', None, '', None, None, False,
+                                                        False, lambda apiKey, actor: nonce)
+        self.assertEqual(self.signer.nonce_header(nonce), expected)
+
+    def test_invalid_key_type(self):
+        self.assertRaises(Exception, oit.Signer, self.apiKey, self.sharedSecret, 'Bogus')
+
+
+class TestSignMany(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+    requests = [
+        ('http://www.byu.edu/',),
+        ('http://www.byu.edu/a?b=1', 'test body', 'text/plain', 'PUT'),
+        ('https://www.byu.edu:8443/form', 'p=1&a=9&a=0', 'application/x-www-form-urlencoded', 'post', 'pd123'),
+        ('http://www.byu.edu/actor', None, None, 'GET', 'pd123'),
+    ]
+
+    def expected(self, actorInHash=False):
+        headers = []
+        for request in self.requests:
+            url, body, ct, method, actor = (request + (None,) * 4)[:5]
+            headers.append(oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                             oit.ENCODING_URL, url, body, actor, ct, method,
+                                                             actorInHash=actorInHash))
+        return headers
+
+    @mock.patch('time.time', return_value=1451674800.0)
+    def test_matches_get_http_authorization_header(self, _):
+        expected = self.expected()
+        expected_in_hash = self.expected(actorInHash=True)
+        self.assertEqual(list(oit.sign_many(self.requests, self.apiKey, self.sharedSecret)), expected)
+        self.assertEqual(list(oit.sign_many(self.requests, self.apiKey, self.sharedSecret, actorInHash=True)),
+                         expected_in_hash)
+
+    def test_process_pool_keeps_order(self):
+        requests = [('http://www.byu.edu/%d' % i,) for i in range(50)]
+        pooled = list(oit.sign_many(requests, self.apiKey, self.sharedSecret, processes=2, chunkSize=7))
+        self.assertEqual(len(pooled), 50)
+        for (url,), header in zip(requests, pooled):
+            _, digest, timestamp = header.split(',')
+            self.assertEqual(digest.encode('ascii'), oit.url_encode(self.sharedSecret, timestamp, url))
+
+    def test_invalid_key_type(self):
+        self.assertRaises(Exception, list, oit.sign_many(self.requests, self.apiKey, self.sharedSecret, 'Bogus'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+def run_together(count, target):
+    results = []
+    barrier = threading.Barrier(count)
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(target())
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = oit.SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'answer'
+
+        results = run_together(5, lambda: flight.do('key', slow))
+        self.assertEqual(results, ['answer'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats, {'calls': 1, 'collapsed': 4, 'in_flight': 0})
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')  # nothing is cached
+
+    def test_concurrent_calls_share_one_exception(self):
+        flight = oit.SingleFlight()
+
+        def failing():
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        results = run_together(3, lambda: flight.do('key', failing))
+        self.assertEqual([type(r) for r in results], [ValueError] * 3)
+        self.assertEqual(len(flight), 0)
+
+    def test_different_keys_run_separately(self):
+        flight = oit.SingleFlight()
+        keys = iter(range(4))
+        lock = threading.Lock()
+
+        def next_key():
+            with lock:
+                return next(keys)
+
+        results = run_together(4, lambda: flight.do(next_key(), time.sleep, 0.05))
+        self.assertEqual(results, [None] * 4)
+        self.assertEqual(flight.stats['calls'], 4)
+        self.assertEqual(flight.collapsed, 0)
+
+    def test_async_calls_share_one_result(self):
+        flight = oit.AsyncSingleFlight()
+        calls = []
+
+        async def slow(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ValueError('boom')
+
+        async def main():
+            results = await asyncio.gather(*[flight.do('key', slow, 'answer') for _ in range(4)])
+            errors = await asyncio.gather(*[flight.do('bad', failing) for _ in range(2)], return_exceptions=True)
+            return results, errors
+
+        results, errors = asyncio.run(main())
+        self.assertEqual(results, ['answer'] * 4)
+        self.assertEqual(calls, ['answer'])
+        self.assertEqual([type(e) for e in errors], [ValueError] * 2)
+        self.assertEqual(flight.stats, {'calls': 2, 'collapsed': 4, 'in_flight': 0})
+
+    def test_async_cancelling_the_first_caller(self):
+        flight = oit.AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do('key', slow))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do('key', slow))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await asyncio.gather(leader, follower, return_exceptions=True)
+
+        leader, follower = asyncio.run(main())
+        self.assertTrue(isinstance(leader, asyncio.CancelledError))
+        self.assertEqual(follower, 'answer')
+        self.assertEqual(flight.stats, {'calls': 1, 'collapsed': 1, 'in_flight': 0})
+
+
+class TestClientCoalescing(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+    url = 'http://www.byu.edu/'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789', delay=0.1).start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def header(self):
+        return oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                                 self.url)
+
+    def test_identical_session_and_validate_calls_share_one_request(self):
+        with oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5) as client:
+            sessions = run_together(4, lambda: client.get_ws_session('netid', 'pw'))
+            self.assertEqual([s['apiKey'] for s in sessions], ['stub-ws-session-key'] * 4)
+            self.assertEqual(self.stub.count('/ws/session'), 1)
+
+            header = self.header()
+            people = run_together(4, lambda: client.authorize_request(self.url, header, self.apiKey,
+                                                                      self.sharedSecret))
+            self.assertEqual(people, ['123456789'] * 4)
+            self.assertEqual(self.stub.count('/validate'), 1)
+            self.assertEqual(self.stub.count('/hmac/nonce/%s' % self.apiKey), 1)
+            self.assertEqual(client.transport.stats['coalesced'], 6)
+
+    def test_coalescing_can_be_turned_off(self):
+        with oit.WsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5, coalesce=False) as client:
+            run_together(3, lambda: client.get_ws_session('netid', 'pw'))
+            self.assertEqual(self.stub.count('/ws/session'), 3)
+            self.assertEqual(client.transport.stats['coalesced'], 0)
+
+    def test_async_client(self):
+        async def main():
+            async with oit.AsyncWsClient(authBaseUrl=self.stub.authBaseUrl, timeout=5) as client:
+                header = self.header()
+                people = await asyncio.gather(*[client.authorize_request(self.url, header, self.apiKey,
+                                                                         self.sharedSecret) for _ in range(3)])
+                sessions = await asyncio.gather(*[client.get_ws_session('netid', 'pw') for _ in range(3)])
+                return people, sessions, client.singleFlight.stats
+
+        people, sessions, stats = asyncio.run(main())
+        self.assertEqual(people, ['123456789'] * 3)
+        self.assertEqual(len(sessions), 3)
+        self.assertEqual(self.stub.count('/validate'), 1)
+        self.assertEqual(self.stub.count('/hmac/nonce/%s' % self.apiKey), 1)
+        self.assertEqual(self.stub.count('/ws/session'), 1)
+        self.assertEqual(stats['collapsed'], 4)
@@ -0,0 +1,93 @@
+import io
+import json
+import mmap
+import os
+import tempfile
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestStreamingBodies(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+    timestamp = '2016-01-01 12:00:00'
+    url = 'http://www.byu.edu/upload'
+
+    def setUp(self):
+        self.data = b'<xml>' + b'x' * 200000 + b'</xml>'
+        handle, self.path = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.data + b'\n\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def expected(self, body=None, **kwargs):
+        body = self.data.decode('ascii') if body is None else body
+        return oit.url_encode(self.sharedSecret, self.timestamp, self.url, body, **kwargs)
+
+    def test_open_body_strips_trailing_newlines(self):
+        body = oit.open_body(self.path)
+        try:
+            self.assertEqual(len(body), len(self.data))
+            self.assertEqual(b''.join(body), self.data)
+            self.assertEqual(oit.url_encode(self.sharedSecret, self.timestamp, self.url, body), self.expected())
+            self.assertEqual(body.read(), self.data)  # rewound after signing
+        finally:
+            body.close()
+
+    def test_file_object_and_mmap(self):
+        with open(self.path, 'rb') as f:
+            signed = oit.url_encode(self.sharedSecret, self.timestamp, self.url, f, actor='pd123',
+                                   actorInHash=True)
+            self.assertEqual(f.tell(), 0)
+            self.assertEqual(signed, self.expected(self.data.decode('ascii') + '\n\n', actor='pd123',
+                                                   actorInHash=True))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                signer = oit.Signer(self.apiKey, self.sharedSecret)
+                self.assertEqual(signer.url_encode(self.timestamp, self.url, oit.FileBody(mapped, True)),
+                                 self.expected())
+            finally:
+                mapped.close()
+
+    def test_iterator_and_form_and_empty_bodies(self):
+        chunks = [self.data[i:i + 1000] for i in range(0, len(self.data), 1000)]
+        body = oit.as_body(iter(chunks))
+        self.assertEqual(oit.url_encode(self.sharedSecret, self.timestamp, self.url, body), self.expected())
+        form = oit.as_body(io.BytesIO(b'p=1&a=9&a=0'))
+        ct = 'application/x-www-form-urlencoded'
+        self.assertEqual(oit.url_encode(self.sharedSecret, self.timestamp, self.url, form, ct, 'POST'),
+                         self.expected('p=1&a=9&a=0', contentType=ct, http_method='POST'))
+        self.assertEqual(oit.url_encode(self.sharedSecret, self.timestamp, self.url, io.BytesIO(b'')),
+                         self.expected(''))
+
+    def test_one_shot_iterables_are_refused(self):
+        chunks = (chunk for chunk in [b'a', b'b'])
+        self.assertRaises(TypeError, oit.url_encode, self.sharedSecret, self.timestamp, self.url, chunks)
+        signer = oit.Signer(self.apiKey, self.sharedSecret)
+        self.assertRaises(TypeError, signer.url_encode, self.timestamp, self.url, chunks)
+        self.assertRaises(TypeError, oit.get_http_authorization_header, self.apiKey, self.sharedSecret,
+                          oit.KEY_TYPE_API, oit.ENCODING_URL, self.url, chunks)
+        self.assertEqual(list(chunks), [b'a', b'b'])
+
+    def test_sign_then_send_same_body(self):
+        body = oit.open_body(self.path)
+        try:
+            header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                       oit.ENCODING_URL, self.url, body)
+            with StubServer() as stub:
+                with oit.WsClient(authBaseUrl=stub.authBaseUrl) as client:
+                    content, status, _, _ = client.send_ws_request(stub.url + '/upload', 'PUT', body,
+                                                                   headers={'Authorization': header})
+        finally:
+            body.close()
+        echoed = json.loads(content.decode('utf-8'))
+        self.assertEqual(status, 200)
+        self.assertEqual(echoed['body'], self.data.decode('ascii'))
+        self.assertEqual(echoed['authorization'], header)
+
+
+if __name__ == "__main__":
+    unittest.main()
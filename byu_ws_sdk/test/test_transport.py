@@ -0,0 +1,142 @@
+import io
+import json
+import time
+import unittest
+import requests
+import byu_ws_sdk as oit
+from byu_ws_sdk.stub import StubServer
+
+
+class TestTransport(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+
+    def setUp(self):
+        self.stub = StubServer(personId='123456789').start()
+        self.client = self.make_client()
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def make_client(self, **kwargs):
+        kwargs.setdefault('backoffFactor', 0.001)
+        return oit.WsClient(authBaseUrl=self.stub.authBaseUrl, **kwargs)
+
+    def test_idempotent_requests_are_retried(self):
+        self.stub.failures = [503, 502]
+        _, status, _, _ = self.client.send_ws_request(self.stub.url + '/echo', 'GET')
+        self.assertEqual(status, 200)
+        self.assertEqual(self.stub.count('/echo'), 3)
+        self.assertEqual(self.client.transport.retries, 2)
+
+    def test_retries_run_out(self):
+        self.stub.failures = [503] * 3
+        _, status, _, _ = self.client.send_ws_request(self.stub.url + '/echo', 'DELETE')
+        self.assertEqual(status, 503)
+
+    def test_post_is_not_retried(self):
+        self.stub.failures = [503]
+        _, status, _, _ = self.client.send_ws_request(self.stub.url + '/echo', 'POST', 'body')
+        self.assertEqual(status, 503)
+        self.assertEqual(self.stub.count('/echo'), 1)
+
+    def test_nonce_errors_raise(self):
+        self.stub.failures = [500]
+        self.assertRaises(oit.WebServiceError, self.client.get_nonce, self.apiKey)
+
+    def test_timeout(self):
+        client = self.make_client(timeout=0.2, maxRetries=0)
+        self.stub.delays = [1]
+        try:
+            self.assertRaises(requests.Timeout, client.send_ws_request, self.stub.url + '/echo', 'GET')
+        finally:
+            client.close()
+
+    def test_authorize_request_retries_with_fresh_nonce(self):
+        header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                   oit.ENCODING_URL, 'http://www.byu.edu/', '')
+        self.stub.failures = [None, 503]  # the nonce succeeds, the first validate fails
+        res = self.client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+        self.assertEqual(res, '123456789')
+        self.assertEqual(self.stub.count('/hmac/nonce/'), 2)
+        self.assertEqual(self.stub.count('/validate'), 2)
+
+    def test_circuit_breaker(self):
+        client = self.make_client(maxRetries=0, breakerThreshold=2, breakerResetTimeout=0.2)
+        try:
+            self.stub.failures = [500, 500]
+            for _ in range(2):
+                client.send_ws_request(self.stub.url + '/echo', 'GET')
+            self.assertRaises(oit.CircuitOpenError, client.send_ws_request, self.stub.url + '/echo', 'GET')
+            self.assertEqual(self.stub.count('/echo'), 2)
+            time.sleep(0.25)
+            _, status, _, _ = client.send_ws_request(self.stub.url + '/echo', 'GET')
+            self.assertEqual(status, 200)
+            self.assertEqual(client.transport.breaker(self.stub.url).state, oit.CircuitBreaker.CLOSED)
+        finally:
+            client.close()
+
+    def test_half_open_breaker_lets_the_nonce_through(self):
+        client = self.make_client(maxRetries=0, breakerThreshold=2, breakerResetTimeout=0.2)
+        header = oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                   oit.ENCODING_URL, 'http://www.byu.edu/', '')
+        try:
+            self.stub.failures = [503, 503]
+            for _ in range(2):
+                self.assertRaises(oit.WebServiceError, client.get_nonce, self.apiKey)
+            time.sleep(0.25)
+            res = client.authorize_request('http://www.byu.edu/', header, self.apiKey, self.sharedSecret)
+            self.assertEqual(res, '123456789')
+            self.assertEqual(client.transport.breaker(self.stub.url).state, oit.CircuitBreaker.CLOSED)
+        finally:
+            client.close()
+
+    def test_half_open_trial_settles_on_any_error(self):
+        client = self.make_client(maxRetries=0, breakerThreshold=1, breakerResetTimeout=0)
+        breaker = client.transport.breaker(self.stub.url)
+        breaker.record_failure()
+
+        def fail(kwargs):
+            raise ValueError("boom")
+        try:
+            client.transport.session.request = lambda *args, **kwargs: fail(kwargs)
+            self.assertRaises(ValueError, client.send_ws_request, self.stub.url + '/echo', 'GET')
+            self.assertEqual(breaker.state, oit.CircuitBreaker.OPEN)
+        finally:
+            client.close()
+
+    def test_file_bodies_are_rewound_for_retries(self):
+        self.stub.failures = [503]
+        body = oit.FileBody(io.BytesIO(b"hello world"))
+        content, status, _, _ = self.client.send_ws_request(self.stub.url + '/echo', 'PUT', body)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(content.decode("utf-8"))["body"], "hello world")
+        self.assertEqual(self.stub.count('/echo'), 2)
+
+    def test_generator_bodies_are_not_retried(self):
+        self.stub.failures = [503]
+        body = (chunk for chunk in [b"hello ", b"world"])
+        _, status, _, _ = self.client.send_ws_request(self.stub.url + '/echo', 'PUT', body)
+        self.assertEqual(status, 503)
+        self.assertEqual(self.stub.count('/echo'), 1)
+
+    def test_hedged_requests(self):
+        client = self.make_client(hedgePercentile=0.9)
+        client.transport.hedgeMinSamples = 5
+        try:
+            for _ in range(5):
+                client.send_ws_request(self.stub.url + '/echo', 'GET')
+            self.stub.delays = [0.5]
+            started = time.time()
+            _, status, _, _ = client.send_ws_request(self.stub.url + '/echo', 'GET')
+            self.assertEqual(status, 200)
+            self.assertTrue(time.time() - started < 0.4)
+            self.assertEqual(client.transport.hedges, 1)
+            self.assertEqual(client.transport.hedgeWins, 1)
+        finally:
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
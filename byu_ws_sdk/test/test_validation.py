@@ -0,0 +1,116 @@
+import unittest
+import byu_ws_sdk as oit
+from byu_ws_sdk.validation import validation_key, parse_timestamp, parse_authorization_header
+from byu_ws_sdk.stub import StubServer
+
+
+class TestValidationCache(unittest.TestCase):
+    timestamp = '2016-01-01 12:00:00'
+
+    def setUp(self):
+        self.now = parse_timestamp(self.timestamp)
+        self.cache = oit.ValidationCache(maxSize=2, maxAge=300, clock=lambda: self.now)
+
+    def test_hit_until_expiry(self):
+        self.cache.store('a', '123', self.timestamp)
+        self.assertEqual(self.cache.lookup('a'), (True, '123'))
+        self.now += 301
+        self.assertEqual(self.cache.lookup('a'), (False, None))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hit_rate, 0.5)
+
+    def test_stale_and_invalid_timestamps_are_not_cached(self):
+        self.cache.store('a', '123', '2015-01-01 12:00:00')
+        self.cache.store('b', '123', 'not a timestamp')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru_eviction(self):
+        self.cache.store('a', '1', self.timestamp)
+        self.cache.store('b', '2', self.timestamp)
+        self.cache.lookup('a')
+        self.cache.store('c', '3', self.timestamp)
+        self.assertEqual(self.cache.lookup('b'), (False, None))
+        self.assertEqual(self.cache.lookup('a'), (True, '1'))
+
+    def test_negative_caching(self):
+        self.cache.store('a', None, self.timestamp)
+        self.assertEqual(self.cache.lookup('a'), (False, None))
+        cache = oit.ValidationCache(negativeTtl=10, clock=lambda: self.now)
+        cache.store('a', None, self.timestamp)
+        self.assertEqual(cache.lookup('a'), (True, None))
+
+    def test_key_depends_on_url(self):
+        self.assertNotEqual(validation_key('w', 'd', self.timestamp, 'http://a/'),
+                            validation_key('w', 'd', self.timestamp, 'http://b/'))
+
+    def test_client_authorize_request_is_cached(self):
+        apiKey = 'YF4i2Qdx2WuSj-G8583M'
+        sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+        header = oit.get_http_authorization_header(apiKey, sharedSecret, oit.KEY_TYPE_API, oit.ENCODING_URL,
+                                                   "http://www.byu.edu/", "")
+        cache = oit.ValidationCache()
+        with StubServer(personId='123456789') as stub:
+            with oit.WsClient(authBaseUrl=stub.authBaseUrl, validationCache=cache) as client:
+                for _ in range(3):
+                    res = client.authorize_request('http://www.byu.edu/', header, apiKey, sharedSecret)
+                    self.assertEqual(res, '123456789')
+            self.assertEqual(stub.count('/validate'), 1)
+        self.assertEqual(cache.hits, 2)
+
+
+class TestLocalVerifier(unittest.TestCase):
+    apiKey = 'YF4i2Qdx2WuSj-G8583M'
+    sharedSecret = '98F8wh62cAt8OuufF2rY3B1MSelA8MArV_Zg4CJ9'
+    url = 'https://ws.byu.edu/example/v1/thing'
+
+    def setUp(self):
+        self.verifier = oit.LocalVerifier(maxSkew=60)
+        self.verifier.add_key(self.apiKey, self.sharedSecret, '123456789')
+
+    def sign(self, **kwargs):
+        return oit.get_http_authorization_header(self.apiKey, self.sharedSecret, oit.KEY_TYPE_API,
+                                                 oit.ENCODING_URL, **kwargs)
+
+    def test_parse_authorization_header(self):
+        parsed = parse_authorization_header('URL-Encoded-WsSession-Key abc,digest==,2016-01-01 12:00:00,actor')
+        self.assertEqual(parsed, ('URL', 'WsSession', 'abc', 'digest==', '2016-01-01 12:00:00', 'actor'))
+        self.assertTrue(parse_authorization_header('Nonce-Encoded-API-Key abc,1,digest') is None)
+        self.assertTrue(parse_authorization_header('Basic Zm9vOmJhcg==') is None)
+
+    def test_verify(self):
+        header = self.sign(url=self.url)
+        self.assertTrue(self.verifier.knows(header))
+        self.assertEqual(self.verifier.verify(self.url, header), '123456789')
+        self.assertTrue(self.verifier.verify(self.url + '/other', self.sign(url=self.url)) is None)
+
+    def test_verify_form_body_and_actor_in_hash(self):
+        verifier = oit.LocalVerifier(actorInHash=True)
+        verifier.add_key(self.apiKey, self.sharedSecret)
+        body = 'p=1&a=9&a=0'
+        ct = 'application/x-www-form-urlencoded'
+        header = self.sign(url=self.url, requestBody=body, contentType=ct, httpMethod='POST', actor='pd123',
+                           actorInHash=True)
+        self.assertEqual(verifier.verify(self.url, header, body, ct, 'POST'), self.apiKey)
+        self.assertTrue(verifier.verify(self.url, header.replace('pd123', 'other'), body, ct, 'POST') is None)
+
+    def test_replay_and_skew_are_rejected(self):
+        header = self.sign(url=self.url)
+        self.assertEqual(self.verifier.verify(self.url, header), '123456789')
+        self.assertTrue(self.verifier.verify(self.url, header) is None)
+        self.assertEqual(self.verifier.replays, 1)
+        old = oit.url_encode(self.sharedSecret, '2015-01-01 12:00:00', self.url)
+        old_header = 'URL-Encoded-API-Key %s,%s,2015-01-01 12:00:00' % (self.apiKey, old.decode('utf-8'))
+        self.assertTrue(self.verifier.verify(self.url, old_header) is None)
+
+    def test_client_skips_remote_validation(self):
+        header = self.sign(url=self.url)
+        with StubServer(personId='987654321') as stub:
+            with oit.WsClient(authBaseUrl=stub.authBaseUrl, localVerifier=self.verifier) as client:
+                self.assertEqual(client.authorize_request(self.url, header, self.apiKey, self.sharedSecret),
+                                 '123456789')
+            self.assertEqual(stub.count('/validate'), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
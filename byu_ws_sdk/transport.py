@@ -0,0 +1,330 @@
+"""
+The resilience layer under every WsClient call.
+
+Transport wraps a requests.Session with default timeouts, jittered
+exponential retries for idempotent operations, a circuit breaker per host
+that fails fast while a service is unhealthy, and optional hedged requests
+that send a second copy of a slow idempotent request and take whichever
+answers first. Identical concurrent calls can share one request.
+"""
+import collections
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from . import instrument
+from .singleflight import SingleFlight
+
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+_clock = time.monotonic
+
+
+class WebServiceError(Exception):
+    """
+    A BYU web service answered with something the SDK could not use.
+    """
+
+    def __init__(self, message, status_code=None, body=None):
+        Exception.__init__(self, message)
+        self.status_code = status_code
+        self.body = body
+
+
+class CircuitOpenError(WebServiceError):
+    """
+    Raised instead of calling a host whose circuit breaker is open.
+    """
+
+
+class RetryPolicy(object):
+    """
+    When and how long to wait before retrying an idempotent operation.
+
+    Arguments:
+        maxRetries  -- retries after the first attempt (default 2)
+        backoff     -- base delay in seconds, doubled on each retry (default 0.1)
+        maxBackoff  -- cap on a single delay in seconds (default 2)
+        statuses    -- response status codes worth retrying (default 502, 503, 504)
+    """
+
+    def __init__(self, maxRetries=2, backoff=0.1, maxBackoff=2, statuses=(502, 503, 504)):
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.statuses = frozenset(statuses)
+
+    def delay(self, attempt):
+        """
+        Returns the seconds to sleep before retry number `attempt` (from 0),
+        picked uniformly between 0 and the exponential cap ("full jitter").
+        """
+        return random.uniform(0, min(self.maxBackoff, self.backoff * (2 ** attempt)))
+
+
+class CircuitBreaker(object):
+    """
+    Opens after `failureThreshold` consecutive failures and then rejects
+    calls for `resetTimeout` seconds, after which a single trial call is let
+    through; its outcome closes or re-opens the breaker.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failureThreshold=5, resetTimeout=30, clock=_clock):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.resetTimeout:
+                self.state = self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failureThreshold:
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+
+class Transport(object):
+    """
+    Sends requests over a session with timeouts, retries, circuit breaking
+    and optional hedging.
+
+    Arguments:
+        session             -- the requests.Session to send with
+        timeout             -- default timeout, seconds or (connect, read) (default DEFAULT_TIMEOUT)
+        retry               -- a RetryPolicy, or None for no retries (default RetryPolicy())
+        breakerThreshold    -- consecutive failures that open a host's breaker, 0 disables (default 5)
+        breakerResetTimeout -- seconds an open breaker rejects calls (default 30)
+        hedgePercentile     -- send a second copy of an idempotent request that has taken longer
+                               than this percentile of recent latencies, e.g. 0.95 (default None)
+        hedgeMinSamples     -- latencies to observe before hedging starts (default 20)
+        coalesce            -- let concurrent calls with the same coalesceKey share one request
+                               (default True)
+        instrumentation     -- an instrument.Instrumentation to report calls to
+                               (default instrument.default)
+    """
+
+    def __init__(self, session, timeout=DEFAULT_TIMEOUT, retry=None, breakerThreshold=5, breakerResetTimeout=30,
+                 hedgePercentile=None, hedgeMinSamples=20, hedgeWorkers=8, instrumentation=None, coalesce=True):
+        self.session = session
+        self.instrumentation = instrumentation or instrument.default
+        self.timeout = timeout
+        self.retry = RetryPolicy() if retry is None else retry
+        self.breakerThreshold = breakerThreshold
+        self.breakerResetTimeout = breakerResetTimeout
+        self.hedgePercentile = hedgePercentile
+        self.hedgeMinSamples = hedgeMinSamples
+        self.hedgeWorkers = hedgeWorkers
+        self.singleFlight = SingleFlight() if coalesce else None
+        self.retries = 0
+        self.hedges = 0
+        self.hedgeWins = 0
+        self._breakers = {}
+        self._latencies = collections.deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def breaker(self, url):
+        """
+        Returns the CircuitBreaker for the host of url (None when disabled).
+        """
+        if not self.breakerThreshold:
+            return None
+        host = urlsplit(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    host, CircuitBreaker(self.breakerThreshold, self.breakerResetTimeout))
+        return breaker
+
+    def request(self, method, url, idempotent=None, beforeAttempt=None, event=instrument.EVENT_REQUEST,
+                coalesceKey=None, **kwargs):
+        """
+        Send a request and return the requests.Response.
+
+        idempotent defaults to whether the HTTP method is; only idempotent
+        requests whose body can be sent again are retried or hedged, and
+        bodies with a rewind() are rewound before every attempt.
+        beforeAttempt(kwargs), when given, is called before every attempt,
+        e.g. to sign each attempt afresh.
+        Responses with a retryable status are returned once retries run out.
+        The call is reported to the instrumentation hooks under `event`.
+
+        Concurrent calls given the same coalesceKey share one request and
+        its response (see singleflight); only give one to calls whose
+        answers are interchangeable.
+        """
+        method = method.upper()
+        if coalesceKey is not None and self.singleFlight is not None and not kwargs.get("stream"):
+            return self.singleFlight.do(coalesceKey, self._read, method, url, idempotent, beforeAttempt, event,
+                                        kwargs)
+        return self._instrumented(method, url, idempotent, beforeAttempt, event, kwargs)
+
+    def _read(self, method, url, idempotent, beforeAttempt, event, kwargs):
+        response = self._instrumented(method, url, idempotent, beforeAttempt, event, kwargs)
+        response.content  # read it once here rather than racing in every thread that shares it
+        return response
+
+    def _instrumented(self, method, url, idempotent, beforeAttempt, event, kwargs):
+        instrumentation = self.instrumentation
+        if not instrumentation.hooks:
+            return self._request(method, url, idempotent, beforeAttempt, kwargs, [0])
+        tally = [0]
+        started = instrument.clock()
+        try:
+            response = self._request(method, url, idempotent, beforeAttempt, kwargs, tally)
+        except Exception as e:
+            instrumentation.emit(instrument.Event(event, instrument.clock() - started, error=e, retries=tally[0],
+                                                  bytesSent=instrument.body_size(kwargs.get("data")),
+                                                  method=method, url=url))
+            raise
+        received = response.headers.get("Content-Length")
+        if received is None and not kwargs.get("stream"):
+            received = len(response.content)
+        instrumentation.emit(instrument.Event(event, instrument.clock() - started, response.status_code,
+                                              retries=tally[0], bytesSent=instrument.body_size(kwargs.get("data")),
+                                              bytesReceived=int(received) if received is not None else None,
+                                              method=method, url=url, response=response))
+        return response
+
+    def _request(self, method, url, idempotent, beforeAttempt, kwargs, tally):
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        breaker = self.breaker(url)
+        data = kwargs.get("data")
+        replayable = _replayable(data)
+        retries = self.retry.maxRetries if (idempotent and self.retry and replayable) else 0
+        hedge = idempotent and beforeAttempt is None and self._hedge_delay() is not None \
+            and replayable and not hasattr(data, "read")
+        attempt = 0
+        while True:
+            # signing may call other services (a nonce), possibly on this host, so it
+            # goes before the breaker lets this attempt through as a half-open trial
+            if beforeAttempt is not None:
+                beforeAttempt(kwargs)
+            if hasattr(data, "rewind"):
+                data.rewind()
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError("The circuit breaker for %s is open" % urlsplit(url).netloc)
+            try:
+                if hedge:
+                    response = self._hedged(method, url, kwargs)
+                else:
+                    response = self._send(method, url, kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if breaker is not None:
+                    breaker.record_failure()
+                if attempt >= retries:
+                    raise
+            except BaseException:
+                if breaker is not None:
+                    breaker.record_failure()  # settle a half-open trial whatever went wrong
+                raise
+            else:
+                failed = response.status_code >= 500
+                if breaker is not None:
+                    if failed:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if attempt >= retries or response.status_code not in self.retry.statuses:
+                    return response
+                response.close()
+            time.sleep(self.retry.delay(attempt))
+            attempt += 1
+            tally[0] = attempt
+            with self._lock:
+                self.retries += 1
+
+    def _send(self, method, url, kwargs):
+        started = _clock()
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code < 500:
+            self._latencies.append(_clock() - started)
+        return response
+
+    def _hedge_delay(self):
+        if self.hedgePercentile is None or len(self._latencies) < self.hedgeMinSamples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedgePercentile))]
+
+    def _hedged(self, method, url, kwargs):
+        from concurrent.futures import FIRST_COMPLETED, wait
+        delay = self._hedge_delay()
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(self.hedgeWorkers)
+        first = self._executor.submit(self._send, method, url, dict(kwargs))
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        with self._lock:
+            self.hedges += 1
+        second = self._executor.submit(self._send, method, url, dict(kwargs))
+        pending = set([first, second])
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    if future is second:
+                        with self._lock:
+                            self.hedgeWins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @property
+    def stats(self):
+        return {"retries": self.retries, "hedges": self.hedges, "hedge_wins": self.hedgeWins,
+                "coalesced": self.singleFlight.collapsed if self.singleFlight is not None else 0,
+                "breakers": dict((host, breaker.state) for host, breaker in list(self._breakers.items()))}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def _replayable(data):
+    """
+    Whether a request body can be sent again: strings, bytes, dicts and
+    lists of pairs can, and so can bodies with a rewind() such as
+    streaming.FileBody; generators and plain file objects cannot.
+    """
+    return data is None or hasattr(data, "rewind") or isinstance(data, (str, bytes, bytearray, dict, list, tuple))
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
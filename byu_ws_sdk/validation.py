@@ -0,0 +1,236 @@
+"""
+Helpers for authorize_request on the service provider side.
+
+A validated (wsId, messageDigest, timestamp, url) tuple always validates to
+the same personId, so retries and fan-out of the same signed request can be
+answered from a ValidationCache without another nonce fetch and validate
+call. Headers signed with a shared secret the provider already knows can be
+checked by a LocalVerifier without any network call at all.
+"""
+import collections
+import hashlib
+import hmac
+import threading
+import time
+
+from . import core
+
+
+def parse_timestamp(timestamp):
+    """
+    Returns the seconds since the epoch of an Authorization header timestamp
+    (local time, as written by get_http_authorization_header) or None.
+    """
+    try:
+        return time.mktime(time.strptime(timestamp.strip(), core.TIMESTAMP_FORMAT))
+    except (ValueError, OverflowError, AttributeError):
+        return None
+
+
+def parse_authorization_header(authHeader):
+    """
+    Split a URL-encoded Authorization header value such as
+    URL-Encoded-API-Key <wsId>,<digest>,<timestamp>[,<actor>]
+
+    Returns (encodingType, keyType, wsId, messageDigest, timestamp, actor),
+    with actor '' when absent, or None when the value is not a URL-encoded header.
+    """
+    try:
+        scheme, credentials = authHeader.strip().split(" ", 1)
+    except (ValueError, AttributeError):
+        return None
+    prefix = core.ENCODING_URL + "-Encoded-"
+    if not scheme.startswith(prefix) or not scheme.endswith("-Key"):
+        return None
+    keyType = scheme[len(prefix):-len("-Key")]
+    if not core.valid_key_type(keyType):
+        return None
+    parts = credentials.split(",", 3)
+    if len(parts) < 3:
+        return None
+    actor = parts[3] if len(parts) == 4 else ""
+    return core.ENCODING_URL, keyType, parts[0], parts[1], parts[2], actor
+
+
+def validation_key(wsId, messageDigest, timestamp, url):
+    """
+    Returns the digest used as the cache key for one signed request.
+    """
+    raw = "\n".join([wsId, messageDigest, timestamp, url])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ValidationCache(object):
+    """
+    A bounded, thread-safe LRU cache of authorize_request results.
+
+    Successful validations are kept until `maxAge` seconds after the header's
+    own timestamp. Failed validations are only cached when `negativeTtl` is
+    set, and then for that many seconds.
+
+    Arguments:
+        maxSize      -- maximum number of entries (default 10000)
+        maxAge       -- seconds after the header timestamp an entry stays valid (default 300)
+        negativeTtl  -- seconds to remember failed validations, 0 disables (default 0)
+    """
+
+    def __init__(self, maxSize=10000, maxAge=300, negativeTtl=0, clock=time.time):
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        self.negativeTtl = negativeTtl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "hit_rate": self.hit_rate}
+
+    def lookup(self, key):
+        """
+        Returns (True, personId) for a cached result, where personId is None for
+        a cached failure, or (False, None) when nothing usable is cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self._entries.pop(key)
+                    self._entries[key] = entry  # most recently used goes last
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def expires(self, personId, timestamp, now):
+        """
+        Returns the time until which the result of validating a header with
+        the given timestamp may be kept, or None when it must not be.
+        """
+        if personId is None:
+            if not self.negativeTtl:
+                return None
+            expires = now + self.negativeTtl
+        else:
+            signed_at = parse_timestamp(timestamp)
+            if signed_at is None:
+                return None
+            expires = signed_at + self.maxAge
+        return expires if expires > now else None
+
+    def store(self, key, personId, timestamp):
+        """
+        Remember the result of validating a header with the given timestamp.
+        """
+        expires = self.expires(personId, timestamp, self.clock())
+        if expires is None:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, personId)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LocalVerifier(object):
+    """
+    Verifies URL-Encoded-API-Key headers locally for callers whose shared
+    secret the provider already knows, instead of calling the validate service.
+
+    The signed string is rebuilt with core.url_encode, so form bodies and
+    actorInHash are handled the same way as when signing.
+
+    Arguments:
+        maxSkew      -- reject headers whose timestamp is further than this many seconds
+                        from now (default 300)
+        actorInHash  -- whether callers sign with actorInHash=True (default False)
+        replayCacheSize -- number of recently seen digests remembered to reject
+                        replays, 0 disables replay checks (default 100000)
+    """
+
+    def __init__(self, maxSkew=300, actorInHash=False, replayCacheSize=100000, clock=time.time):
+        self.maxSkew = maxSkew
+        self.actorInHash = actorInHash
+        self.replayCacheSize = replayCacheSize
+        self.clock = clock
+        self.verified = 0
+        self.rejected = 0
+        self.replays = 0
+        self._keys = {}
+        self._seen = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_key(self, wsId, sharedSecret, personId=None):
+        """
+        Register a caller's key. verify returns personId for it, or the
+        wsId itself when no personId is given.
+        """
+        self._keys[wsId] = (sharedSecret, personId or wsId)
+
+    def remove_key(self, wsId):
+        self._keys.pop(wsId, None)
+
+    def knows(self, authHeader):
+        """
+        Returns True when authHeader is a URL-Encoded-API-Key header for a registered key.
+        """
+        parsed = parse_authorization_header(authHeader)
+        return bool(parsed and parsed[1] == core.KEY_TYPE_API and parsed[2] in self._keys)
+
+    def verify(self, requestedUrl, authHeader, requestBody=None, contentType=None, httpMethod=None):
+        """
+        Returns the personId of a valid request or None.
+        """
+        parsed = parse_authorization_header(authHeader)
+        if not parsed or parsed[1] != core.KEY_TYPE_API or parsed[2] not in self._keys:
+            return self._reject()
+        _, _, wsId, messageDigest, timestamp, actor = parsed
+        sharedSecret, personId = self._keys[wsId]
+        now = self.clock()
+        signed_at = parse_timestamp(timestamp)
+        if signed_at is None or abs(now - signed_at) > self.maxSkew:
+            return self._reject()
+        expected = core.url_encode(sharedSecret, timestamp, requestedUrl, requestBody, contentType, httpMethod,
+                                   actor, actorInHash=self.actorInHash)
+        if not hmac.compare_digest(expected, messageDigest.encode("utf-8")):
+            return self._reject()
+        if self.replayCacheSize and not self._first_use(messageDigest, signed_at + self.maxSkew, now):
+            with self._lock:
+                self.replays += 1
+            return self._reject()
+        with self._lock:
+            self.verified += 1
+        return personId
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        return None
+
+    def _first_use(self, messageDigest, expires, now):
+        with self._lock:
+            while self._seen:
+                oldest = next(iter(self._seen))
+                if self._seen[oldest] > now and len(self._seen) < self.replayCacheSize:
+                    break
+                del self._seen[oldest]
+            if messageDigest in self._seen:
+                return False
+            self._seen[messageDigest] = expires
+            return True
@@ -1,14 +1,5 @@
-#!/usr/bin/env python2.7
-
-import sys
-
 from setuptools import setup, find_packages
 
-
-if sys.version_info == (2, 7,) or sys.version == (3, 3,):
-    sys.stderr.write("byu_ws_sdk currently requires Python 2.7 or .3.3\n")
-    sys.exit(-1)
-
 # we only use the subset of markdown that is also valid reStructuredText so
 # that our README.md works on both github (markdown) and pypi (reStructuredText)
 with open("README.md") as rm_file:
@@ -24,7 +15,9 @@ setup(name='byu_ws_sdk',
       packages=find_packages(),
       data_files=[('', ['README.md', 'LICENSE'])],
       test_suite="byu_ws_sdk.test",
+      entry_points={'console_scripts': ['byu-ws-sdk = byu_ws_sdk.cli:main']},
       license="MIT",
+      python_requires='>=3.7',
       install_requires=['requests', 'simplejson', 'decorator'],
       zip_safe=True
       )